@@ -1,13 +1,25 @@
 """
 Code Generation Agent - Specialized agent for code generation and analysis tasks
 """
-from typing import Any, Dict, Optional, List
+from typing import Any, AsyncIterator, Callable, Dict, Optional, List, Set, Tuple
 import asyncio
 import re
 import json
 
 from base_agent import BaseAgent, MessageType, AgentState
+from code_analysis import IncrementalAnalyzer, collapse_blank_lines, content_key
+from generation_cache import (
+    CacheLookup,
+    CachedGenerationFailure,
+    GenerationCache,
+    SharedGenerationCache,
+    SingleFlight,
+    cache_key,
+    connect_shared_backend
+)
 from logger import logger
+from process_pool import ProcessPool
+from repository_analysis import RepositoryAnalysisJob
 
 
 class CodeGenerationAgent(BaseAgent):
@@ -22,19 +34,72 @@ class CodeGenerationAgent(BaseAgent):
     - Document code
     """
     
+    DEFAULT_BATCH_CONCURRENCY = 8
+    MAX_BATCH_SIZE = 1000
+    DEFAULT_OFFLOAD_THRESHOLD = 64 * 1024  # characters
+    DEFAULT_BLOCK_CACHE_ENTRIES = 100000
+    
     def __init__(self, agent_id: str = "code_generation_agent", config: Optional[Dict[str, Any]] = None):
         super().__init__(agent_id, config)
         self.supported_languages = config.get("supported_languages", [
             "python", "javascript", "typescript", "java", "go", "rust", "c++", "c#"
         ]) if config else ["python", "javascript", "typescript", "java", "go", "rust", "c++", "c#"]
-        self.code_cache: Dict[str, str] = {}
+        self.code_cache = GenerationCache(
+            max_entries=(config or {}).get("code_cache_max_entries", GenerationCache.DEFAULT_MAX_ENTRIES),
+            max_bytes=(config or {}).get("code_cache_max_bytes", GenerationCache.DEFAULT_MAX_BYTES),
+            ttl=(config or {}).get("code_cache_ttl", GenerationCache.DEFAULT_TTL)
+        )
+        
+        # Concurrent identical requests share one generation
+        self.single_flight = SingleFlight()
+        self.batch_concurrency = (config or {}).get("batch_concurrency", self.DEFAULT_BATCH_CONCURRENCY)
+        # Shared by all batches, so concurrent batches cannot multiply the limit
+        self._batch_slots = asyncio.Semaphore(self.batch_concurrency)
+        # Generations started by streams, which outlive a consumer that goes away
+        self._stream_flights: Set[asyncio.Task] = set()
+        
+        # Optional second-level cache shared by all replicas (a Redis-style
+        # client in "l2_cache", or a Redis URL in "l2_cache_url")
+        self.l2_cache: Optional[SharedGenerationCache] = None
+        l2_backend = (config or {}).get("l2_cache")
+        if l2_backend is None and (config or {}).get("l2_cache_url"):
+            l2_backend = connect_shared_backend(config["l2_cache_url"])
+        if l2_backend is not None:
+            self.l2_cache = SharedGenerationCache(
+                l2_backend,
+                ttl=(config or {}).get("l2_cache_ttl", SharedGenerationCache.DEFAULT_TTL),
+                negative_ttl=(config or {}).get("l2_cache_negative_ttl", SharedGenerationCache.DEFAULT_NEGATIVE_TTL)
+            )
+        
+        # CPU-bound passes over large inputs run in worker processes so they
+        # do not stall the event loop; small inputs are cheaper to run inline
+        self.process_pool: Optional[ProcessPool] = None
+        if (config or {}).get("process_pool", True):
+            self.process_pool = ProcessPool(
+                max_workers=(config or {}).get("process_pool_workers"),
+                timeout=(config or {}).get("process_pool_timeout", ProcessPool.DEFAULT_TIMEOUT)
+            )
+        self.offload_threshold = (config or {}).get("offload_threshold", self.DEFAULT_OFFLOAD_THRESHOLD)
+        
+        # Analysis results by content hash: resubmitted files are not parsed again
+        self.analysis_cache = GenerationCache(
+            max_entries=(config or {}).get("analysis_cache_max_entries", GenerationCache.DEFAULT_MAX_ENTRIES),
+            max_bytes=(config or {}).get("analysis_cache_max_bytes", GenerationCache.DEFAULT_MAX_BYTES),
+            ttl=0
+        )
+        # Per-block results let an edited file reuse the analysis of its unchanged blocks
+        self.incremental_analyzer = IncrementalAnalyzer(GenerationCache(
+            max_entries=(config or {}).get("block_cache_max_entries", self.DEFAULT_BLOCK_CACHE_ENTRIES),
+            max_bytes=(config or {}).get("analysis_cache_max_bytes", GenerationCache.DEFAULT_MAX_BYTES),
+            ttl=0
+        ))
         self.generation_stats = {
             "total_requests": 0,
             "successful_generations": 0,
             "failed_generations": 0,
             "languages_used": {}
         }
-        
+    
     async def initialize(self) -> bool:
         """Initialize code generation agent"""
         try:
@@ -51,11 +116,14 @@ class CodeGenerationAgent(BaseAgent):
         
         Message format:
         {
-            "type": "generate_code" | "analyze_code" | "refactor_code" | "generate_tests",
+            "type": "generate_code" | "generate_code_batch" | "analyze_code" | "analyze_repository" | "refactor_code" | "generate_tests",
             "language": "python" | "javascript" | ...,
             "specification": "...",  # For generation
             "code": "...",  # For analysis/refactoring
-            "options": {...}  # Additional options
+            "options": {...},  # Additional options
+            "requests": [{"language": ..., "specification": ..., "options": ...}],  # For batches
+            "concurrency": 8,  # Batch generations running at once
+            "path": "..."  # Directory or zip archive for analyze_repository
         }
         """
         try:
@@ -76,12 +144,30 @@ class CodeGenerationAgent(BaseAgent):
                     specification=message.get("specification", ""),
                     options=message.get("options", {})
                 )
+            elif msg_type == "generate_code_batch":
+                results = [
+                    result async for result in self.generate_code_batch(
+                        message.get("requests", []), message.get("concurrency")
+                    )
+                ]
+                return {
+                    "status": "success",
+                    "results": results,
+                    "total": sum(len(result["indexes"]) for result in results),
+                    "unique": len(results),
+                    "failed": sum(result["status"] != "success" for result in results)
+                }
             elif msg_type == "analyze_code":
                 return await self.analyze_code(
                     language=language,
                     code=message.get("code", ""),
                     options=message.get("options", {})
                 )
+            elif msg_type == "analyze_repository":
+                return await self.analyze_repository(
+                    path=message.get("path", ""),
+                    options=message.get("options", {})
+                )
             elif msg_type == "refactor_code":
                 return await self.refactor_code(
                     language=language,
@@ -99,7 +185,7 @@ class CodeGenerationAgent(BaseAgent):
                     "status": "error",
                     "error": f"Unknown message type: {msg_type}"
                 }
-                
+        
         except Exception as e:
             self.logger.error(f"Error processing message: {e}", exc_info=True)
             self.generation_stats["failed_generations"] += 1
@@ -110,12 +196,10 @@ class CodeGenerationAgent(BaseAgent):
     
     async def execute(self) -> Any:
         """Execute periodic maintenance tasks"""
-        # Clean up old cache entries
-        if len(self.code_cache) > 1000:
-            # Keep only last 500 entries
-            keys = list(self.code_cache.keys())
-            for key in keys[:500]:
-                del self.code_cache[key]
+        # Clean up expired cache entries (size bounds are enforced on insert)
+        self.code_cache.purge_expired()
+        if self.l2_cache:
+            await self.l2_cache.flush_counters()
         
         await asyncio.sleep(60)  # Run maintenance every minute
     
@@ -132,7 +216,7 @@ class CodeGenerationAgent(BaseAgent):
             language: Programming language
             specification: Code specification/requirements
             options: Generation options (style, framework, etc.)
-            
+        
         Returns:
             Generated code and metadata
         """
@@ -143,13 +227,29 @@ class CodeGenerationAgent(BaseAgent):
             self.generation_stats["languages_used"][language] = \
                 self.generation_stats["languages_used"].get(language, 0) + 1
             
-            # Generate code based on specification
-            # In production, this would interface with an LLM or code generation model
-            generated_code = await self._generate_code_impl(language, specification, options)
-            
-            # Cache the generated code
-            cache_key = f"{language}:{hash(specification)}"
-            self.code_cache[cache_key] = generated_code
+            # Serve identical requests from the local cache; on a miss, requests
+            # already being served elsewhere in this agent are joined
+            key = cache_key(language, specification, options)
+            generated_code = self.code_cache.get(key)
+            cache_level = "l1" if generated_code is not None else None
+            coalesced = False
+            if generated_code is None:
+                try:
+                    (generated_code, cache_level), coalesced = await self.single_flight.do(
+                        key, lambda: self._fetch_or_generate(key, language, specification, options)
+                    )
+                except CachedGenerationFailure as e:
+                    # Generating this request failed moments ago (possibly on another replica)
+                    if self.l2_cache:
+                        self.l2_cache.count_lookup(hit=False)
+                    self.generation_stats["failed_generations"] += 1
+                    return {
+                        "status": "error",
+                        "error": str(e),
+                        "metadata": {"cache_key": key, "cached": True, "cache_level": "l2"}
+                    }
+            if self.l2_cache:
+                self.l2_cache.count_lookup(hit=cache_level is not None or coalesced)
             
             self.generation_stats["successful_generations"] += 1
             
@@ -159,10 +259,13 @@ class CodeGenerationAgent(BaseAgent):
                 "code": generated_code,
                 "metadata": {
                     "lines_of_code": len(generated_code.split('\n')),
-                    "cache_key": cache_key
+                    "cache_key": key,
+                    "cached": cache_level is not None,
+                    "cache_level": cache_level,
+                    "coalesced": coalesced
                 }
             }
-            
+        
         except Exception as e:
             self.logger.error(f"Code generation failed: {e}", exc_info=True)
             self.generation_stats["failed_generations"] += 1
@@ -171,6 +274,201 @@ class CodeGenerationAgent(BaseAgent):
                 "error": str(e)
             }
     
+    async def generate_code_stream(
+        self,
+        language: str,
+        specification: str,
+        options: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate code from specification, yielding it chunk by chunk as it is produced.
+        
+        The generation runs in its own task as the single-flight call for the
+        request, so requests arriving meanwhile join it and never wait for this
+        stream's consumer; chunks the consumer has not read yet are buffered.
+        A consumer that goes away leaves the generation to finish and fill the
+        caches. Cached code, and code another request is already producing,
+        is sent as a single chunk.
+        
+        Args:
+            language: Programming language
+            specification: Code specification/requirements
+            options: Generation options (style, framework, etc.)
+        
+        Yields:
+            {"type": "chunk", "data": str} frames, then one "done" frame carrying
+            the generate_code metadata, or one "error" frame
+        """
+        self.logger.info(f"Streaming {language} code from specification")
+        self.generation_stats["languages_used"][language] = \
+            self.generation_stats["languages_used"].get(language, 0) + 1
+        
+        key = cache_key(language, specification, options)
+        generated_code = self.code_cache.get(key)
+        cache_level = "l1" if generated_code is not None else None
+        coalesced = False
+        try:
+            if generated_code is not None:
+                yield {"type": "chunk", "data": generated_code}
+            else:
+                chunks: asyncio.Queue = asyncio.Queue()
+                flight = asyncio.create_task(self.single_flight.do(
+                    key, lambda: self._fetch_or_generate(key, language, specification, options, chunks.put_nowait)
+                ))
+                self._stream_flights.add(flight)
+                flight.add_done_callback(self._stream_flight_done)
+                flight.add_done_callback(lambda _: chunks.put_nowait(None))
+                
+                chunk = await chunks.get()
+                while chunk is not None:
+                    yield {"type": "chunk", "data": chunk}
+                    chunk = await chunks.get()
+                (generated_code, cache_level), coalesced = flight.result()
+                if coalesced:
+                    # Another request produced this code: send it in one chunk
+                    yield {"type": "chunk", "data": generated_code}
+            if self.l2_cache:
+                self.l2_cache.count_lookup(hit=cache_level is not None or coalesced)
+        except CachedGenerationFailure as e:
+            # Generating this request failed moments ago (possibly on another replica)
+            if self.l2_cache:
+                self.l2_cache.count_lookup(hit=False)
+            self.generation_stats["failed_generations"] += 1
+            yield {"type": "error", "error": str(e), "metadata": {"cache_key": key, "cached": True, "cache_level": "l2"}}
+            return
+        except Exception as e:
+            self.logger.error(f"Code generation failed: {e}", exc_info=True)
+            self.generation_stats["failed_generations"] += 1
+            yield {"type": "error", "error": str(e), "metadata": {"cache_key": key}}
+            return
+        
+        self.generation_stats["successful_generations"] += 1
+        yield {
+            "type": "done",
+            "language": language,
+            "metadata": {
+                "lines_of_code": len(generated_code.split('\n')),
+                "cache_key": key,
+                "cached": cache_level is not None,
+                "cache_level": cache_level,
+                "coalesced": coalesced
+            }
+        }
+    
+    def _stream_flight_done(self, flight: asyncio.Task) -> None:
+        self._stream_flights.discard(flight)
+        # The stream reports failures; this only marks them retrieved if its consumer left
+        if not flight.cancelled():
+            flight.exception()
+    
+    async def generate_code_batch(
+        self,
+        requests: List[Dict[str, Any]],
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate code for many specifications, yielding each result as soon as it is ready.
+        
+        Identical requests (same language, specification and options) are
+        generated once; every result lists the indexes of the requests it
+        answers. At most `concurrency` generations of the batch run at once,
+        and at most batch_concurrency across all batches. Closing the
+        iterator early cancels the generations still running.
+        
+        Args:
+            requests: Items with "language", "specification" and "options"
+            concurrency: Generations running at once (capped at batch_concurrency, the default)
+        
+        Yields:
+            generate_code results with an added "indexes" list
+        
+        Raises:
+            ValueError: If the batch has more than MAX_BATCH_SIZE requests or
+                concurrency is not a positive integer
+        """
+        if len(requests) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"Batch too large: {len(requests)} requests (max {self.MAX_BATCH_SIZE})")
+        if concurrency is not None and (not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1):
+            raise ValueError(f"concurrency must be a positive integer, got {concurrency!r:.20}")
+        
+        groups: Dict[str, Dict[str, Any]] = {}
+        for index, request in enumerate(requests):
+            language = request.get("language", "python") if isinstance(request, dict) else None
+            if language not in self.supported_languages:
+                yield {"status": "error", "error": f"Unsupported or invalid request: {request!r:.100}", "indexes": [index]}
+                continue
+            options = request.get("options") or {}
+            key = cache_key(language, request.get("specification", ""), options)
+            if key in groups:
+                groups[key]["indexes"].append(index)
+            else:
+                groups[key] = {"request": {**request, "language": language, "options": options}, "indexes": [index]}
+        
+        semaphore = asyncio.Semaphore(min(concurrency or self.batch_concurrency, self.batch_concurrency))
+        done: asyncio.Queue = asyncio.Queue()
+        
+        async def run(group: Dict[str, Any]) -> None:
+            async with semaphore, self._batch_slots:
+                request = group["request"]
+                result = await self.generate_code(request["language"], request.get("specification", ""), request["options"])
+            await done.put({**result, "indexes": group["indexes"]})
+        
+        tasks = [asyncio.create_task(run(group)) for group in groups.values()]
+        try:
+            for _ in tasks:
+                yield await done.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _fetch_or_generate(
+        self,
+        key: str,
+        language: str,
+        specification: str,
+        options: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Get code from the shared cache or generate it, filling both cache levels.
+        
+        Args:
+            on_chunk: Called with each generated chunk (or the cached code) as it is available
+        
+        Returns:
+            The code and the cache level it came from (None if generated)
+        
+        Raises:
+            CachedGenerationFailure: If the shared cache holds a recent failure
+        """
+        if self.l2_cache:
+            lookup, value = await self.l2_cache.get(key)
+            if lookup == CacheLookup.NEGATIVE:
+                raise CachedGenerationFailure(value)
+            if lookup == CacheLookup.HIT:
+                self.code_cache.put(key, value)
+                if on_chunk:
+                    on_chunk(value)
+                return value, "l2"
+        
+        # Generate code based on specification
+        # In production, this would interface with an LLM or code generation model
+        chunks = []
+        try:
+            async for chunk in self._generate_code_impl(language, specification, options):
+                chunks.append(chunk)
+                if on_chunk:
+                    on_chunk(chunk)
+            generated_code = "".join(chunks)
+        except Exception as e:
+            if self.l2_cache:
+                await self.l2_cache.put_failure(key, str(e))
+            raise
+        self.code_cache.put(key, generated_code)
+        if self.l2_cache:
+            await self.l2_cache.put(key, generated_code)
+        return generated_code, None
+    
     async def analyze_code(
         self,
         language: str,
@@ -184,30 +482,33 @@ class CodeGenerationAgent(BaseAgent):
             language: Programming language
             code: Code to analyze
             options: Analysis options
-            
+        
         Returns:
             Analysis results and suggestions
         """
         try:
             self.logger.info(f"Analyzing {language} code")
             
+            # Metrics and line-level issues come from a single pass over the
+            # code (plus one AST parse for Python), cached by content hash;
+            # an edited file only re-analyzes the blocks that changed
+            key = content_key(language, code)
+            scan = self.analysis_cache.get(key)
+            if scan is None:
+                scan = await self.incremental_analyzer.analyze(code, language, self._run_cpu_bound)
+                self.analysis_cache.put(key, scan, size=len(code))
+            issues = list(scan["issues"])
             analysis = {
                 "language": language,
-                "metrics": {
-                    "lines_of_code": len(code.split('\n')),
-                    "blank_lines": len([line for line in code.split('\n') if not line.strip()]),
-                    "comment_lines": self._count_comments(code, language)
-                },
-                "issues": [],
+                "metrics": scan["metrics"],
+                "issues": issues,
                 "suggestions": []
             }
-            
-            # Perform basic code analysis
-            issues = self._detect_code_issues(code, language)
-            analysis["issues"] = issues
+            if "structure" in scan:
+                analysis["structure"] = scan["structure"]
             
             # Generate improvement suggestions
-            suggestions = self._generate_suggestions(code, language, issues)
+            suggestions = self._generate_suggestions(analysis["metrics"], language, issues)
             analysis["suggestions"] = suggestions
             
             # Calculate code quality score
@@ -217,7 +518,7 @@ class CodeGenerationAgent(BaseAgent):
                 "status": "success",
                 "analysis": analysis
             }
-            
+        
         except Exception as e:
             self.logger.error(f"Code analysis failed: {e}", exc_info=True)
             return {
@@ -225,6 +526,47 @@ class CodeGenerationAgent(BaseAgent):
                 "error": str(e)
             }
     
+    async def analyze_repository(self, path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Analyze every source file of a directory tree or zip archive.
+        
+        Files are analyzed in chunks in the process pool and aggregated into
+        one report.
+        
+        Args:
+            path: Directory or zip archive
+            options: chunk_size and max_file_size overrides
+        
+        Returns:
+            Aggregated report (metrics, issue counts, worst files, most complex
+            functions, most imported modules)
+        """
+        try:
+            self.logger.info(f"Analyzing repository {path}")
+            job = RepositoryAnalysisJob(
+                path,
+                pool=self.process_pool,
+                chunk_size=options.get("chunk_size", RepositoryAnalysisJob.DEFAULT_CHUNK_SIZE),
+                max_file_size=options.get("max_file_size", RepositoryAnalysisJob.DEFAULT_MAX_FILE_SIZE)
+            )
+            async for event in job.events():
+                if event["event"] == "analysis:progress":
+                    self.logger.debug(f"Repository analysis progress: {event['data']}")
+                else:
+                    report = event["data"]
+            
+            return {
+                "status": "success",
+                "report": report
+            }
+        
+        except Exception as e:
+            self.logger.error(f"Repository analysis failed: {e}", exc_info=True)
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+    
     async def refactor_code(
         self,
         language: str,
@@ -238,7 +580,7 @@ class CodeGenerationAgent(BaseAgent):
             language: Programming language
             code: Code to refactor
             options: Refactoring options
-            
+        
         Returns:
             Refactored code and changes made
         """
@@ -261,7 +603,7 @@ class CodeGenerationAgent(BaseAgent):
                     "complexity_reduced": True  # Simplified for demo
                 }
             }
-            
+        
         except Exception as e:
             self.logger.error(f"Code refactoring failed: {e}", exc_info=True)
             return {
@@ -282,7 +624,7 @@ class CodeGenerationAgent(BaseAgent):
             language: Programming language
             code: Code to generate tests for
             options: Test generation options
-            
+        
         Returns:
             Generated test code
         """
@@ -304,7 +646,7 @@ class CodeGenerationAgent(BaseAgent):
                     "coverage_estimate": "85%"  # Simplified for demo
                 }
             }
-            
+        
         except Exception as e:
             self.logger.error(f"Test generation failed: {e}", exc_info=True)
             return {
@@ -319,11 +661,8 @@ class CodeGenerationAgent(BaseAgent):
         language: str,
         specification: str,
         options: Dict[str, Any]
-    ) -> str:
-        """Implementation of code generation (would use LLM in production)"""
-        # Simulate code generation
-        await asyncio.sleep(0.1)  # Simulate processing time
-        
+    ) -> AsyncIterator[str]:
+        """Implementation of code generation, yielding code as it is produced (would stream from an LLM in production)"""
         templates = {
             "python": f'''# Generated Python code
 # Specification: {specification[:100]}...
@@ -346,7 +685,11 @@ module.exports = {{ main }};
 '''
         }
         
-        return templates.get(language, f"// {language} code\n// {specification[:100]}...")
+        lines = templates.get(language, f"// {language} code\n// {specification[:100]}...").splitlines(keepends=True)
+        for line in lines:
+            # Simulate processing time, spread over the output as a model streams tokens
+            await asyncio.sleep(0.1 / len(lines))
+            yield line
     
     async def _refactor_code_impl(
         self,
@@ -359,17 +702,13 @@ module.exports = {{ main }};
         await asyncio.sleep(0.1)
         
         # Simple refactoring: remove excess blank lines
-        lines = code.split('\n')
-        refactored_lines = []
-        prev_blank = False
-        
-        for line in lines:
-            is_blank = not line.strip()
-            if not (is_blank and prev_blank):
-                refactored_lines.append(line)
-            prev_blank = is_blank
-        
-        return '\n'.join(refactored_lines)
+        return await self._run_cpu_bound(collapse_blank_lines, code, size=len(code))
+    
+    async def _run_cpu_bound(self, func: Callable[..., Any], *args: Any, size: int) -> Any:
+        """Run func(*args) in the process pool if its input of `size` characters is large enough, inline otherwise"""
+        if self.process_pool and size >= self.offload_threshold:
+            return await self.process_pool.run(func, *args)
+        return func(*args)
     
     async def _generate_tests_impl(
         self,
@@ -396,38 +735,9 @@ def test_edge_cases():
         else:
             return f"// {language} test code for {framework}"
     
-    def _count_comments(self, code: str, language: str) -> int:
-        """Count comment lines in code"""
-        comment_patterns = {
-            "python": r'^\s*#',
-            "javascript": r'^\s*//',
-            "java": r'^\s*//',
-        }
-        
-        pattern = comment_patterns.get(language, r'^\s*//')
-        return len([line for line in code.split('\n') if re.match(pattern, line)])
-    
-    def _detect_code_issues(self, code: str, language: str) -> List[Dict[str, Any]]:
-        """Detect potential issues in code"""
-        issues = []
-        
-        lines = code.split('\n')
-        
-        # Check for long lines
-        for i, line in enumerate(lines):
-            if len(line) > 120:
-                issues.append({
-                    "type": "style",
-                    "severity": "low",
-                    "line": i + 1,
-                    "message": "Line too long (>120 characters)"
-                })
-        
-        return issues
-    
     def _generate_suggestions(
         self,
-        code: str,
+        metrics: Dict[str, Any],
         language: str,
         issues: List[Dict[str, Any]]
     ) -> List[str]:
@@ -437,7 +747,7 @@ def test_edge_cases():
         if issues:
             suggestions.append("Consider addressing the detected code issues")
         
-        if len(code.split('\n')) > 200:
+        if metrics["lines_of_code"] > 200:
             suggestions.append("Consider breaking down into smaller, more manageable functions")
         
         return suggestions
@@ -455,7 +765,14 @@ def test_edge_cases():
             else:
                 base_score -= 2
         
-        return max(0.0, min(100.0, base_score))
+        # Structural signals below the issue thresholds still cost points
+        structure = analysis.get("structure")
+        if structure and not structure["syntax_error"]:
+            base_score -= 2 * max(0.0, structure["average_complexity"] - 5)
+            base_score -= 2 * max(0, structure["max_nesting"] - 3)
+            base_score -= 10 * (1 - structure["documented_ratio"])
+        
+        return round(max(0.0, min(100.0, base_score)), 2)
     
     def _detect_changes(self, original: str, refactored: str) -> List[Dict[str, Any]]:
         """Detect changes between original and refactored code"""
@@ -488,9 +805,26 @@ def test_edge_cases():
         return {
             "agent_id": self.agent_id,
             "stats": self.generation_stats,
-            "cache_size": len(self.code_cache)
+            "cache_size": len(self.code_cache),
+            "cache": self.code_cache.get_statistics(),
+            "l2_cache": self.l2_cache.get_statistics() if self.l2_cache else None,
+            "single_flight": {**self.single_flight.stats, "in_flight": self.single_flight.in_flight},
+            "analysis_cache": self.analysis_cache.get_statistics(),
+            "incremental_analysis": {
+                **self.incremental_analyzer.get_statistics(),
+                "cache": self.incremental_analyzer.cache.get_statistics()
+            },
+            "process_pool": self.process_pool.get_statistics() if self.process_pool else None
         }
     
+    async def cleanup(self) -> None:
+        """Clean up resources"""
+        await super().cleanup()
+        for flight in list(self._stream_flights):
+            flight.cancel()
+        if self.process_pool:
+            self.process_pool.shutdown()
+    
     async def get_checkpoint_state(self) -> Dict[str, Any]:
         """Save custom state for checkpointing"""
         return {
@@ -1,17 +1,33 @@
 """
 Communication Agent - Handles inter-agent messaging with NATS JetStream support
 """
-from typing import Any, Dict, Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List, Union
 import asyncio
-import json
+import os
+import re
+import time
+import uuid
 from datetime import datetime, timezone
 
 from base_agent import BaseAgent, MessageType
+from batching import BATCH_COUNT_HEADER, AIMDController, MicroBatcher
+from blob_store import BLOB_REFS_FIELD, BlobStore, ClaimCheck
+from circuit_breaker import CircuitBreaker
+from compression import PayloadCompressor
+from dead_letter import LATE, DeadLetterQueue
+from fair_queue import FairQueue, TenantQuotaExceeded
 from logger import logger
+from message_store import MessageWriteBehind, SQLMessageWriter
+from ordering import SEQUENCE_FIELD, ReorderBuffer, SequenceStamper
+from outbox import DurableOutbox
+from shm_transport import SharedMemoryRing, SharedMemoryTransport
+from traffic_stats import TrafficStats
+from serialization import CONTENT_TYPE_HEADER, get_codec, get_codec_for_content_type
 
 try:
     import nats
     from nats.js import JetStreamContext
+    from nats.js.api import ConsumerConfig, DeliverPolicy
     NATS_AVAILABLE = True
 except ImportError:
     NATS_AVAILABLE = False
@@ -40,6 +56,15 @@ class CommunicationAgent(BaseAgent):
     DEFAULT_MAX_MESSAGES = 100000
     DEFAULT_MAX_AGE = 86400  # 24 hours
     
+    # Per-agent-type subjects: <stream>.<agent_type>.<agent_id>
+    DEFAULT_AGENT_TYPE = "generic"
+    BROADCAST_TOKEN = "broadcast"
+    ANY_AGENT_TOKEN = "any"
+    
+    # Replay defaults
+    DEFAULT_REPLAY_BATCH = 256  # messages in flight / rows per query
+    REPLAY_IDLE_TIMEOUT = 1.0  # seconds
+    
     def __init__(self, agent_id: str = "communication_agent", config: Optional[Dict[str, Any]] = None):
         super().__init__(agent_id, config)
         self.message_broker: Dict[str, asyncio.Queue] = {}
@@ -50,7 +75,9 @@ class CommunicationAgent(BaseAgent):
         self.jetstream: Optional[JetStreamContext] = None
         self.nats_servers = (config or {}).get("nats_servers", ["nats://localhost:4222"])
         self.stream_name = (config or {}).get("stream_name", "AGENT_MESSAGES")
-        self.use_jetstream = (config or {}).get("use_jetstream", NATS_AVAILABLE)
+        # Connection factory override, e.g. FakeJetStreamServer.connect for offline tests
+        self.nats_connect = (config or {}).get("nats_connect") or (nats.connect if NATS_AVAILABLE else None)
+        self.use_jetstream = (config or {}).get("use_jetstream", self.nats_connect is not None)
         
         # Configurable JetStream settings
         self.max_messages = (config or {}).get("max_messages", self.DEFAULT_MAX_MESSAGES)
@@ -59,17 +86,149 @@ class CommunicationAgent(BaseAgent):
         self.max_reconnect_attempts = (config or {}).get("max_reconnect_attempts", self.MAX_RECONNECT_ATTEMPTS)
         self.reconnect_time_wait = (config or {}).get("reconnect_time_wait", self.RECONNECT_TIME_WAIT)
         
+        # Queue groups: one per agent type for "to_type" messages, shared by the
+        # replicas consuming that type, and one per agent for messages addressed
+        # to it, shared only by the replicas hosting that agent
+        self.durable_prefix = (config or {}).get("durable_prefix", "agent_comm")
+        self.agent_types: Dict[str, str] = dict((config or {}).get("agent_types", {}))
+        self.consumer_agent_types: Optional[List[str]] = (config or {}).get("consumer_agent_types")
+        self.type_subscriptions: Dict[str, Any] = {}
+        self.agent_subscriptions: Dict[str, Any] = {}
+        self.subject_stats: Dict[str, Dict[str, int]] = {}
+        
         # Message tracking
-        self.pending_acks: Dict[str, Dict[str, Any]] = {}
         self.failed_messages: List[Dict[str, Any]] = []
+        self.traffic = TrafficStats(
+            window=(config or {}).get("stats_window", TrafficStats.DEFAULT_WINDOW),
+            top_k=(config or {}).get("stats_top_talkers", 10)
+        )
+        
+        # Per-replica directory for durable state files (None keeps that state
+        # in memory); replicas sharing an agent ID must not share a directory
+        self.data_dir: Optional[str] = (config or {}).get("data_dir")
+        
+        # Failed deliveries are retried with exponential backoff, then dead-lettered
+        self.dead_letters = DeadLetterQueue(
+            deliver=self._retry_delivery,
+            path=(config or {}).get("dlq_path", self._data_file(f"dlq_{agent_id}.jsonl")),
+            max_attempts=(config or {}).get("max_delivery_attempts", DeadLetterQueue.DEFAULT_MAX_ATTEMPTS),
+            base_delay=(config or {}).get("retry_base_delay", DeadLetterQueue.DEFAULT_BASE_DELAY),
+            max_delay=(config or {}).get("retry_max_delay", DeadLetterQueue.DEFAULT_MAX_DELAY),
+            prepare=self._inline_blobs
+        )
+        # Messages awaiting a retry, keyed by message ID
+        self.pending_acks: Dict[str, Dict[str, Any]] = self.dead_letters.pending
+        
+        # Broker outage handling: stop publishing after repeated failures and
+        # buffer messages on disk until the reconnector can drain them
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=(config or {}).get("circuit_failure_threshold", CircuitBreaker.DEFAULT_FAILURE_THRESHOLD),
+            recovery_timeout=(config or {}).get("circuit_recovery_timeout", CircuitBreaker.DEFAULT_RECOVERY_TIMEOUT)
+        )
+        self.outbox = DurableOutbox(
+            (config or {}).get("outbox_path", self._data_file(f"outbox_{agent_id}.jsonl")),
+            fsync=(config or {}).get("outbox_fsync", False),
+            prepare=self._inline_blobs
+        )
+        self._reconnect_task: Optional[asyncio.Task] = None
+        
+        # Wire format for JetStream payloads ("msgpack" for binary internal hops)
+        self.wire_codec = get_codec((config or {}).get("wire_codec"))
+        
+        # Large payloads (whole source files) are compressed above a threshold once
+        # "compression_algorithm" is set; receiving always decodes by header, so
+        # enable it only after every consumer runs this version
+        self.compressor = PayloadCompressor(
+            algorithm=(config or {}).get("compression_algorithm", PayloadCompressor.DEFAULT_ALGORITHM),
+            threshold=(config or {}).get("compression_threshold", PayloadCompressor.DEFAULT_THRESHOLD),
+            level=(config or {}).get("compression_level")
+        )
+        
+        # Same-host transport for agents hosted by other processes ("shm")
+        self.shm_transport: Optional[SharedMemoryTransport] = None
+        if (config or {}).get("transport") == "shm":
+            self.shm_transport = SharedMemoryTransport(
+                process_name=(config or {}).get("shm_process_name", agent_id),
+                agent_hosts=(config or {}).get("shm_agent_hosts", {}),
+                deliver=self._route_message,
+                codec=self.wire_codec,
+                capacity=(config or {}).get("shm_ring_capacity", SharedMemoryRing.DEFAULT_CAPACITY)
+            )
+        
+        # Messages to agents registered as ordered carry per sender->recipient
+        # sequence numbers and are received through a reorder buffer (senders
+        # only stamp for agents they know to be ordered, so replicas share
+        # the ordered_agents setting)
+        self.sequencer = SequenceStamper()
+        self.ordered_agents = set((config or {}).get("ordered_agents", []))
+        self.reorder_buffer = ReorderBuffer(
+            max_held=(config or {}).get("reorder_max_held", ReorderBuffer.DEFAULT_MAX_HELD),
+            gap_timeout=(config or {}).get("reorder_gap_timeout", ReorderBuffer.DEFAULT_GAP_TIMEOUT)
+        )
+        self._reorder_task: Optional[asyncio.Task] = None
         
+        # Mailboxes can serve tenants by weighted fair queuing so one flooding
+        # project only delays its own messages
+        self.fair_queuing = (config or {}).get("fair_queuing", False)
+        self.tenant_weights = (config or {}).get("tenant_weights", {})
+        self.tenant_quota = (config or {}).get("tenant_quota", 0)
+        
+        # Large payload values are stored once in a content-addressed blob
+        # store and travel as references (opt-in). Blobs expire, so messages
+        # are resolved before they are delivered and before they are written
+        # to stores that can outlive the blobs (dead letters, outbox, table).
+        self.claim_check: Optional[ClaimCheck] = None
+        if (config or {}).get("claim_check", False):
+            self.claim_check = ClaimCheck(
+                BlobStore(
+                    (config or {}).get("blob_store_path", BlobStore.DEFAULT_PATH),
+                    ttl=(config or {}).get("blob_ttl", BlobStore.DEFAULT_TTL)
+                ),
+                threshold=(config or {}).get("claim_check_threshold", ClaimCheck.DEFAULT_THRESHOLD)
+            )
+        self.blob_purge_interval = (config or {}).get("blob_purge_interval", BlobStore.DEFAULT_PURGE_INTERVAL)
+        self._blob_purge_task: Optional[asyncio.Task] = None
+        
+        # Outgoing JetStream messages can be coalesced into batches (opt-in)
+        self.send_batcher: Optional[MicroBatcher] = None
+        if (config or {}).get("send_batching", False):
+            self.send_batcher = MicroBatcher(
+                self._publish_batch,
+                max_delay=(config or {}).get("batch_max_delay", MicroBatcher.DEFAULT_MAX_DELAY),
+                controller=AIMDController(
+                    max_size=(config or {}).get("batch_max_size", AIMDController.DEFAULT_MAX_SIZE),
+                    target_latency=(config or {}).get("batch_target_latency", AIMDController.DEFAULT_TARGET_LATENCY)
+                )
+            )
+        
+        # Routed messages are written behind into the messages table (opt-in)
+        self.message_store: Optional[MessageWriteBehind] = None
+        # SQLAlchemy async engine of the messages table (database.engine if None)
+        self.database_engine = (config or {}).get("database_engine")
+        if (config or {}).get("persist_messages", False):
+            self.message_store = MessageWriteBehind(
+                writer=(config or {}).get("message_writer") or SQLMessageWriter(self.database_engine),
+                max_buffer=(config or {}).get("persist_max_buffer", MessageWriteBehind.DEFAULT_MAX_BUFFER),
+                batch_size=(config or {}).get("persist_batch_size", MessageWriteBehind.DEFAULT_BATCH_SIZE),
+                flush_interval=(config or {}).get("persist_flush_interval", MessageWriteBehind.DEFAULT_FLUSH_INTERVAL),
+                prepare=self._inline_blobs
+            )
+    
     async def initialize(self) -> bool:
         """Initialize communication agent with NATS JetStream"""
         try:
             self.logger.info("Initializing Communication Agent")
             
-            if self.use_jetstream and NATS_AVAILABLE:
+            if self.shm_transport:
+                self.shm_transport.start()
+            if self.claim_check:
+                self._blob_purge_task = asyncio.get_running_loop().create_task(self._blob_purge_loop())
+            
+            if self.use_jetstream and self.nats_connect:
                 await self._initialize_nats_jetstream()
+                # Messages buffered before a restart still have to go out
+                if self.outbox.pending:
+                    self._ensure_reconnector()
             else:
                 self.logger.info("Using in-memory message broker")
             
@@ -87,7 +246,7 @@ class CommunicationAgent(BaseAgent):
             
             # Connect to NATS with timeout
             self.nats_client = await asyncio.wait_for(
-                nats.connect(
+                self.nats_connect(
                     servers=self.nats_servers,
                     max_reconnect_attempts=self.max_reconnect_attempts,
                     reconnect_time_wait=self.reconnect_time_wait
@@ -124,38 +283,195 @@ class CommunicationAgent(BaseAgent):
             raise
     
     async def _subscribe_to_messages(self) -> None:
-        """Subscribe to JetStream messages"""
+        """Subscribe to broadcast and per-agent-type JetStream subjects"""
         try:
-            subject = f"{self.stream_name}.*"
-            
-            # Create durable consumer
+            # Broadcasts must reach every replica, so each one gets its own durable
+            subject = f"{self.stream_name}.{self.BROADCAST_TOKEN}"
             await self.jetstream.subscribe(
                 subject=subject,
                 cb=self._handle_jetstream_message,
-                durable="agent_comm_consumer"
+                durable=f"{self.durable_prefix}_{self.BROADCAST_TOKEN}_{self._subject_token(self.agent_id)}",
+                manual_ack=True
             )
-            
             self.logger.info(f"Subscribed to JetStream subject: {subject}")
             
+            for agent_type in self._consumed_agent_types():
+                await self._subscribe_agent_type(agent_type)
+            for agent_id in list(self.message_broker):
+                await self._subscribe_agent(agent_id)
+            
         except Exception as e:
             self.logger.error(f"Failed to subscribe to messages: {e}", exc_info=True)
     
+    async def _subscribe_agent_type(self, agent_type: str) -> None:
+        """
+        Create a filtered durable consumer for the messages sent to an agent type.
+        
+        Replicas consuming the same agent type join the same queue group, so
+        JetStream spreads that type's "to_type" traffic across them. Messages
+        addressed to a specific agent are not part of it (see `_subscribe_agent`).
+        """
+        token = self._subject_token(agent_type)
+        if token in self.type_subscriptions or not self.jetstream:
+            return
+        
+        subject = f"{self.stream_name}.{token}.{self.ANY_AGENT_TOKEN}"
+        # JetStream requires a queue group to be named after its durable consumer
+        name = f"{self.durable_prefix}_{token}_{self.ANY_AGENT_TOKEN}"
+        self.type_subscriptions[token] = await self.jetstream.subscribe(
+            subject=subject,
+            queue=name,
+            durable=name,
+            cb=self._handle_jetstream_message,
+            manual_ack=True
+        )
+        self.subject_stats.setdefault(token, self._new_subject_stats())
+        self.logger.info(f"Subscribed to JetStream subject: {subject} (queue group: {name})")
+    
+    async def _subscribe_agent(self, agent_id: str) -> None:
+        """
+        Create a durable consumer for the messages addressed to a hosted agent.
+        
+        Its queue group is keyed to the agent, so only replicas hosting the
+        agent receive its messages (and a sender's messages to it stay in one
+        consumer, in order).
+        """
+        if agent_id in self.agent_subscriptions or not self.jetstream:
+            return
+        
+        subject = self.get_subject({"to": agent_id})
+        token = self._subject_key(subject)
+        name = f"{self.durable_prefix}_{token}_{self._subject_token(agent_id)}"
+        self.agent_subscriptions[agent_id] = await self.jetstream.subscribe(
+            subject=subject,
+            queue=name,
+            durable=name,
+            cb=self._handle_jetstream_message,
+            manual_ack=True
+        )
+        self.subject_stats.setdefault(token, self._new_subject_stats())
+        self.logger.info(f"Subscribed to JetStream subject: {subject} (queue group: {name})")
+    
+    def _consumed_agent_types(self) -> List[str]:
+        """Agent types this replica consumes (configured, or derived from registered agents)"""
+        if self.consumer_agent_types is not None:
+            return list(self.consumer_agent_types)
+        types = {self.agent_types.get(agent_id, self.DEFAULT_AGENT_TYPE) for agent_id in self.message_broker}
+        return sorted(types)
+    
+    @staticmethod
+    def _subject_token(name: str) -> str:
+        """Make a name safe to use as a single NATS subject token"""
+        return re.sub(r"[^A-Za-z0-9_-]", "_", name) or "_"
+    
+    @staticmethod
+    def _new_subject_stats() -> Dict[str, int]:
+        """Create an empty per-subject counter set"""
+        return {
+            "published": 0,
+            "delivered": 0,
+            "acked": 0,
+            "nacked": 0,
+            "redelivered": 0,
+            "last_published_seq": 0,
+            "last_delivered_seq": 0,
+            "pending": 0
+        }
+    
+    def get_subject(self, message: Dict[str, Any]) -> str:
+        """
+        Get the JetStream subject a message is published on.
+        
+        Messages addressed to an agent use <stream>.<agent_type>.<agent_id>,
+        messages addressed to an agent type ("to_type") use <stream>.<agent_type>.any
+        and everything else goes to <stream>.broadcast.
+        """
+        target = message.get("to")
+        if target:
+            agent_type = self.agent_types.get(target, self.DEFAULT_AGENT_TYPE)
+            return f"{self.stream_name}.{self._subject_token(agent_type)}.{self._subject_token(target)}"
+        if message.get("to_type"):
+            return f"{self.stream_name}.{self._subject_token(message['to_type'])}.{self.ANY_AGENT_TOKEN}"
+        return f"{self.stream_name}.{self.BROADCAST_TOKEN}"
+    
+    @staticmethod
+    def _subject_key(subject: str) -> str:
+        """Get the stats bucket (agent type or broadcast) for a subject"""
+        parts = subject.split(".")
+        return parts[1] if len(parts) > 1 else subject
+    
+    def _subject_stats_for(self, subject: str) -> Dict[str, int]:
+        """Get the counters for a subject's stats bucket"""
+        key = self._subject_key(subject)
+        if key not in self.subject_stats:
+            self.subject_stats[key] = self._new_subject_stats()
+        return self.subject_stats[key]
+    
     async def _handle_jetstream_message(self, msg) -> None:
         """Handle incoming JetStream message"""
+        stats = self._subject_stats_for(msg.subject)
+        stats["delivered"] += 1
         try:
-            # Decode message
-            message_data = json.loads(msg.data.decode())
+            metadata = msg.metadata
+            stats["last_delivered_seq"] = metadata.sequence.stream
+            stats["pending"] = metadata.num_pending
+            if metadata.num_delivered > 1:
+                stats["redelivered"] += 1
+        except Exception:
+            # Metadata is only available on JetStream messages
+            pass
+        
+        message_data = None
+        is_batch = BATCH_COUNT_HEADER in (getattr(msg, "headers", None) or {})
+        try:
+            # Decode message according to its Content-Encoding and Content-Type headers
+            message_data = self._decode_jetstream_message(msg)
             
-            # Process message
-            await self._route_message(message_data)
+            if is_batch:
+                if not isinstance(message_data, list):
+                    raise ValueError(f"Batch payload decoded to {type(message_data).__name__}, expected a list")
+                # A coalesced batch is acked as a whole; messages in it that
+                # cannot be delivered are retried one by one
+                for item in message_data:
+                    result = await self._route_message(item)
+                    if result.get("status") == "error":
+                        self.dead_letters.schedule(item, result.get("error", "Delivery failed"))
+            else:
+                # Process message
+                result = await self._route_message(message_data)
+                if result.get("status") == "error":
+                    raise RuntimeError(result.get("error", "Delivery failed"))
             
             # Acknowledge message
             await msg.ack()
+            stats["acked"] += 1
             
         except Exception as e:
             self.logger.error(f"Error handling JetStream message: {e}", exc_info=True)
-            # Negative acknowledgment - message will be redelivered
-            await msg.nak()
+            attempts = getattr(getattr(msg, "metadata", None), "num_delivered", 1)
+            if message_data is not None and attempts >= self.dead_letters.max_attempts:
+                # Out of attempts - stop redelivery and keep it in the dead letter queue
+                await msg.term()
+                # Each message of a batch is dead-lettered on its own
+                items = message_data if is_batch and isinstance(message_data, list) else [message_data]
+                for index, item in enumerate(items):
+                    fallback_id = f"js_{stats['last_delivered_seq']}" + (f"_{index}" if is_batch else "")
+                    self.dead_letters.dead_letter({
+                        "message_id": item.get("message_id", fallback_id) if isinstance(item, dict) else fallback_id,
+                        "message": item,
+                        "attempts": attempts,
+                        "last_error": str(e)
+                    })
+            else:
+                # Negative acknowledgment - JetStream redelivers after the backoff delay
+                await msg.nak(delay=self.dead_letters.backoff_delay(attempts))
+            stats["nacked"] += 1
+    
+    def _decode_jetstream_message(self, msg) -> Any:
+        """Decode a message (or a list of them, for a batch) according to its Content-Encoding and Content-Type headers"""
+        headers = getattr(msg, "headers", None) or {}
+        data = self.compressor.decode(msg.data, headers, self._subject_key(msg.subject))
+        return get_codec_for_content_type(headers.get(CONTENT_TYPE_HEADER)).decode(data)
     
     async def process_message(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -167,12 +483,25 @@ class CommunicationAgent(BaseAgent):
         Returns:
             Response if message requires one
         """
+        started = time.perf_counter()
         try:
+            # Swap large values for blob references first, so nothing below
+            # (logging included) copies them. Only the references made here
+            # are listed, whatever the caller put in the field.
+            message.pop(BLOB_REFS_FIELD, None)
+            if self.claim_check and "payload" in message:
+                message["payload"], refs = self.claim_check.check_in(message["payload"])
+                if refs:
+                    message[BLOB_REFS_FIELD] = refs
+            
             self.logger.debug(f"Processing message: {message}")
             
-            # Add message ID if not present
+            # Add message ID if not present (unique across restarts: it is the
+            # JetStream dedup key and the messages table's unique key)
             if "message_id" not in message:
-                message["message_id"] = f"msg_{len(self.message_history) + 1}"
+                message["message_id"] = f"msg_{uuid.uuid4().hex}"
+            if message.get("to") in self.ordered_agents:
+                self.sequencer.stamp(message)
             
             # Add timestamp
             message["timestamp"] = datetime.now(timezone.utc).isoformat()
@@ -181,10 +510,18 @@ class CommunicationAgent(BaseAgent):
             self.message_history.append(message)
             
             # Route message
-            if self.use_jetstream and self.jetstream:
-                return await self._publish_to_jetstream(message)
-            else:
-                return await self._route_message(message)
+            result = await self._send(message)
+            
+            # Retry failed deliveries in the background
+            if result.get("status") == "error":
+                entry = self.dead_letters.schedule(message, result.get("error", "Delivery failed"))
+                result["retry_scheduled"] = entry["message_id"] in self.dead_letters.pending
+            
+            if self.message_store:
+                self.message_store.add(message, result.get("status", "unknown"))
+            
+            self.traffic.record(message, result.get("status", "unknown"), time.perf_counter() - started)
+            return result
             
         except Exception as e:
             self.logger.error(f"Error processing message: {e}", exc_info=True)
@@ -193,56 +530,246 @@ class CommunicationAgent(BaseAgent):
                 "error": str(e),
                 "timestamp": datetime.now(timezone.utc).isoformat()
             })
+            self.traffic.record(message, "error", time.perf_counter() - started)
             return {
                 "status": "error",
                 "error": str(e)
             }
     
+    async def _send(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a message over the fastest transport that reaches its target"""
+        if self.shm_transport and self.shm_transport.is_remote(message.get("to")):
+            if self.shm_transport.send(message):
+                return {
+                    "status": "sent",
+                    "transport": "shm",
+                    "message_id": message.get("message_id", "unknown")
+                }
+            # Ring full - fall back to the broker
+        if self.use_jetstream and self.jetstream:
+            if self.send_batcher:
+                return await self.send_batcher.submit(message)
+            return await self._publish_to_jetstream(message)
+        return await self._route_message(message)
+    
     async def _publish_to_jetstream(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Publish message to JetStream for guaranteed delivery"""
+        # Once messages are buffered, later ones queue behind them to keep order
+        if self.outbox.pending or not self.circuit_breaker.allow_request():
+            return await self._buffer_message(message)
+        
         try:
-            target = message.get("to", "broadcast")
-            subject = f"{self.stream_name}.{target}"
-            
-            # Publish to JetStream
-            ack = await self.jetstream.publish(
-                subject=subject,
-                payload=json.dumps(message).encode()
-            )
+            result = await self._publish(message)
+            self.circuit_breaker.record_success()
+            return result
             
-            self.logger.debug(f"Message published to JetStream: {ack.seq}")
-            
-            return {
+        except Exception as e:
+            self.logger.error(f"Failed to publish to JetStream: {e}", exc_info=True)
+            self.circuit_breaker.record_failure()
+            return await self._buffer_message(message)
+    
+    async def _publish(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Publish a single message to its JetStream subject (raises on failure)"""
+        subject = self.get_subject(message)
+        payload, headers = self.compressor.encode(self.wire_codec.encode(message), self._subject_key(subject))
+        if self.wire_codec.content_type != "application/json":
+            headers = {**(headers or {}), CONTENT_TYPE_HEADER: self.wire_codec.content_type}
+        
+        # Publish to JetStream
+        ack = await self.jetstream.publish(
+            subject=subject,
+            payload=payload,
+            headers=headers
+        )
+        
+        self.logger.debug(f"Message published to JetStream: {ack.seq}")
+        stats = self._subject_stats_for(subject)
+        stats["published"] += 1
+        stats["last_published_seq"] = ack.seq
+        
+        return {
+            "status": "published",
+            "message_id": message["message_id"],
+            "sequence": ack.seq,
+            "stream": ack.stream
+        }
+    
+    async def _publish_batch(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Publish coalesced messages as one JetStream message per subject"""
+        groups: Dict[str, List[int]] = {}
+        for index, message in enumerate(messages):
+            groups.setdefault(self.get_subject(message), []).append(index)
+        
+        results: List[Dict[str, Any]] = [{}] * len(messages)
+        for subject, indexes in groups.items():
+            group = [messages[index] for index in indexes]
+            if len(group) == 1:
+                group_results = [await self._publish_to_jetstream(group[0])]
+            elif self.outbox.pending or not self.circuit_breaker.allow_request():
+                group_results = [await self._buffer_message(message) for message in group]
+            else:
+                try:
+                    group_results = await self._publish_group(subject, group)
+                    self.circuit_breaker.record_success()
+                except Exception as e:
+                    self.logger.error(f"Failed to publish batch to JetStream: {e}", exc_info=True)
+                    self.circuit_breaker.record_failure()
+                    group_results = [await self._buffer_message(message) for message in group]
+            for index, result in zip(indexes, group_results):
+                results[index] = result
+        return results
+    
+    async def _publish_group(self, subject: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Publish messages for one subject as a single batch message (raises on failure)"""
+        payload, headers = self.compressor.encode(self.wire_codec.encode(messages), self._subject_key(subject))
+        headers = {**(headers or {}), BATCH_COUNT_HEADER: str(len(messages))}
+        if self.wire_codec.content_type != "application/json":
+            headers[CONTENT_TYPE_HEADER] = self.wire_codec.content_type
+        
+        ack = await self.jetstream.publish(subject=subject, payload=payload, headers=headers)
+        stats = self._subject_stats_for(subject)
+        stats["published"] += len(messages)
+        stats["last_published_seq"] = ack.seq
+        
+        return [
+            {
                 "status": "published",
                 "message_id": message["message_id"],
                 "sequence": ack.seq,
-                "stream": ack.stream
+                "stream": ack.stream,
+                "batch_size": len(messages)
             }
+            for message in messages
+        ]
+    
+    def _data_file(self, name: str) -> Optional[str]:
+        """Path of a state file in the data directory (None without one)"""
+        if not self.data_dir:
+            return None
+        os.makedirs(self.data_dir, exist_ok=True)
+        return os.path.join(self.data_dir, name)
+    
+    async def _buffer_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Deliver locally when possible, otherwise keep the message in the outbox"""
+        target = message.get("to")
+        if (target and target in self.message_broker) or (
+            not target and message.get("to_type") and self._pick_agent_of_type(message["to_type"])
+        ):
+            # Local agents do not need the broker
+            return await self._route_message(message)
+        
+        pending = self.outbox.append(message)
+        self._ensure_reconnector()
+        return {
+            "status": "buffered",
+            "message_id": message.get("message_id", "unknown"),
+            "outbox_pending": pending
+        }
+    
+    async def _blob_purge_loop(self) -> None:
+        """Delete expired blobs periodically (off the event loop, as it walks the store)"""
+        while True:
+            await asyncio.sleep(self.blob_purge_interval)
+            try:
+                purged = await asyncio.to_thread(self.claim_check.store.purge_expired)
+                if purged:
+                    self.logger.info(f"Purged {purged} expired blobs")
+            except Exception as e:
+                self.logger.warning(f"Blob purge failed: {e}")
+    
+    def _ensure_reconnector(self) -> None:
+        """Start the background reconnector if it is not running"""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect_loop())
+    
+    async def _reconnect_loop(self) -> None:
+        """Reconnect to NATS and drain the outbox in order once the broker is back"""
+        while self.outbox.pending:
+            # A half-open breaker admits this loop as its single probe
+            if not self.circuit_breaker.allow_request():
+                await asyncio.sleep(self.reconnect_time_wait)
+                continue
             
+            try:
+                if not getattr(self.nats_client, "is_connected", False):
+                    await self._reconnect()
+                drained = await self.outbox.drain(self._drain_publish)
+                if drained:
+                    self.logger.info(f"Drained {drained} buffered messages, {self.outbox.pending} pending")
+            except Exception as e:
+                self.logger.warning(f"Reconnect attempt failed: {e}")
+                self.circuit_breaker.record_failure()
+            
+            if self.outbox.pending:
+                await asyncio.sleep(self.reconnect_time_wait)
+    
+    async def _reconnect(self) -> None:
+        """Replace the NATS connection and recreate the subscriptions"""
+        if self.nats_client:
+            try:
+                await self.nats_client.close()
+            except Exception:
+                pass
+        self.type_subscriptions = {}
+        self.agent_subscriptions = {}
+        await self._initialize_nats_jetstream()
+        self.logger.info("Reconnected to NATS JetStream")
+    
+    async def _drain_publish(self, message: Dict[str, Any]) -> bool:
+        """Publish one outbox message, feeding the result into the circuit breaker"""
+        try:
+            await self._publish(message)
+            self.circuit_breaker.record_success()
+            return True
         except Exception as e:
-            self.logger.error(f"Failed to publish to JetStream: {e}", exc_info=True)
-            # Fall back to direct routing
-            return await self._route_message(message)
+            self.logger.warning(f"Outbox drain interrupted: {e}")
+            self.circuit_breaker.record_failure()
+            return False
     
     async def _route_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Route message directly to target agent (in-memory)"""
         try:
+            # Recipients get the values, not references to blobs
+            message = self._resolve_blobs(message)
             target = message.get("to")
             
+            if not target and message.get("to_type"):
+                target = self._pick_agent_of_type(message["to_type"])
+                if not target:
+                    return {
+                        "status": "error",
+                        "error": f"No agent of type registered: {message['to_type']}"
+                    }
+            
             if target and target in self.message_broker:
-                await self.message_broker[target].put(message)
+                try:
+                    if target in self.ordered_agents and SEQUENCE_FIELD in message:
+                        return await self._deliver_in_order(target, message)
+                    await self.message_broker[target].put(message)
+                except TenantQuotaExceeded as e:
+                    # Over-quota messages are shed, not retried
+                    return {
+                        "status": "dropped",
+                        "error": str(e),
+                        "message_id": message.get("message_id", "unknown")
+                    }
                 return {
                     "status": "delivered",
                     "message_id": message.get("message_id", "unknown")
                 }
             elif not target:
                 # Broadcast to all registered agents
+                recipients = 0
                 for agent_queue in self.message_broker.values():
-                    await agent_queue.put(message)
+                    try:
+                        await agent_queue.put(message)
+                        recipients += 1
+                    except TenantQuotaExceeded:
+                        pass
                 return {
                     "status": "broadcast",
                     "message_id": message.get("message_id", "unknown"),
-                    "recipients": len(self.message_broker)
+                    "recipients": recipients
                 }
             else:
                 return {
@@ -257,6 +784,51 @@ class CommunicationAgent(BaseAgent):
                 "error": str(e)
             }
     
+    async def _deliver_in_order(self, target: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Deliver a sequenced message through the reorder buffer"""
+        key, seq = self.sequencer.stream_key(message), message[SEQUENCE_FIELD]
+        released = self.reorder_buffer.push(key, seq, message)
+        dropped = None
+        for ready in released:
+            try:
+                await self.message_broker[target].put(ready)
+            except TenantQuotaExceeded as e:
+                if ready is message:
+                    dropped = e
+        
+        if self.reorder_buffer.next_deadline() is not None and (
+            self._reorder_task is None or self._reorder_task.done()
+        ):
+            self._reorder_task = asyncio.get_running_loop().create_task(self._reorder_gap_loop())
+        if dropped is not None:
+            raise dropped
+        
+        if any(ready is message for ready in released):
+            status = "delivered"
+        elif self.reorder_buffer.holds(key, seq):
+            status = "held"
+        else:
+            # Behind the stream position: already delivered, or its gap was skipped
+            status = "late" if self.reorder_buffer.was_skipped(key, seq) else "duplicate"
+        return {
+            "status": status,
+            "message_id": message.get("message_id", "unknown")
+        }
+    
+    async def _reorder_gap_loop(self) -> None:
+        """Release held messages once the gap in front of them times out"""
+        while True:
+            deadline = self.reorder_buffer.next_deadline()
+            if deadline is None:
+                return
+            await asyncio.sleep(max(deadline - time.monotonic(), 0))
+            for ready in self.reorder_buffer.expire():
+                if ready.get("to") in self.message_broker:
+                    try:
+                        await self.message_broker[ready["to"]].put(ready)
+                    except TenantQuotaExceeded:
+                        pass
+    
     async def execute(self) -> Any:
         """Execute communication agent main loop"""
         # Monitor message queues and handle routing
@@ -271,24 +843,324 @@ class CommunicationAgent(BaseAgent):
         await asyncio.sleep(1)
         return None
     
-    async def register_agent(self, agent_id: str) -> None:
-        """Register an agent for message delivery"""
+    async def register_agent(
+        self,
+        agent_id: str,
+        agent_type: Optional[str] = None,
+        ordered: bool = False,
+        fair: Optional[bool] = None
+    ) -> None:
+        """
+        Register an agent for message delivery.
+        
+        Args:
+            agent_id: ID of the agent
+            agent_type: Agent type (e.g. "CodeGenerationAgent") used for subject
+                routing and queue-group membership
+            ordered: Deliver each sender's messages in the order they were sent
+            fair: Serve the agent's mailbox by weighted fair queuing across
+                tenants (defaults to the fair_queuing setting)
+        """
+        if agent_type:
+            self.agent_types[agent_id] = agent_type
+        if ordered:
+            self.ordered_agents.add(agent_id)
         if agent_id not in self.message_broker:
-            self.message_broker[agent_id] = asyncio.Queue()
+            if self.fair_queuing if fair is None else fair:
+                self.message_broker[agent_id] = FairQueue(weights=self.tenant_weights, quota=self.tenant_quota)
+            else:
+                self.message_broker[agent_id] = asyncio.Queue()
             self.logger.info(f"Registered agent: {agent_id}")
+        
+        # Consume the agent's own subject, and its type's subject if this
+        # replica now hosts that type
+        if self.jetstream:
+            try:
+                await self._subscribe_agent(agent_id)
+                if self.consumer_agent_types is None:
+                    await self._subscribe_agent_type(self.agent_types.get(agent_id, self.DEFAULT_AGENT_TYPE))
+            except Exception as e:
+                self.logger.error(f"Failed to subscribe for agent {agent_id}: {e}", exc_info=True)
     
     async def unregister_agent(self, agent_id: str) -> None:
         """Unregister an agent"""
         if agent_id in self.message_broker:
             del self.message_broker[agent_id]
             self.logger.info(f"Unregistered agent: {agent_id}")
+        subscription = self.agent_subscriptions.pop(agent_id, None)
+        if subscription:
+            # The durable consumer keeps the agent's messages for its next host
+            try:
+                await subscription.unsubscribe()
+            except Exception as e:
+                self.logger.warning(f"Failed to unsubscribe for agent {agent_id}: {e}")
+    
+    def _pick_agent_of_type(self, agent_type: str) -> Optional[str]:
+        """Pick the least-loaded locally registered agent of a type"""
+        candidates = [
+            agent_id for agent_id in self.message_broker
+            if self.agent_types.get(agent_id, self.DEFAULT_AGENT_TYPE) == agent_type
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda agent_id: self.message_broker[agent_id].qsize())
+    
+    async def get_subject_lag(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get per-subject consumer lag.
+        
+        Uses JetStream consumer info when connected (num_pending is the number of
+        stream messages the queue group has not been delivered yet) and falls back
+        to the locally tracked counters otherwise.
+        
+        Returns:
+            Lag information keyed by agent type (or "broadcast")
+        """
+        lag: Dict[str, Dict[str, Any]] = {}
+        for key, stats in self.subject_stats.items():
+            lag[key] = {
+                "published": stats["published"],
+                "delivered": stats["delivered"],
+                "pending": stats["pending"],
+                "ack_pending": stats["delivered"] - stats["acked"] - stats["nacked"],
+                "redelivered": stats["redelivered"],
+                "source": "local"
+            }
+        
+        # An agent type's bucket sums its "to_type" consumer and the consumers
+        # of the agents of that type hosted here
+        consumers = list(self.type_subscriptions.items())
+        consumers += [
+            (self._subject_key(self.get_subject({"to": agent_id})), subscription)
+            for agent_id, subscription in self.agent_subscriptions.items()
+        ]
+        remote: Dict[str, Dict[str, Any]] = {}
+        for key, subscription in consumers:
+            try:
+                info = await subscription.consumer_info()
+            except Exception as e:
+                self.logger.debug(f"Consumer info unavailable for {key}: {e}")
+                continue
+            totals = remote.setdefault(key, {"pending": 0, "ack_pending": 0, "redelivered": 0, "source": "jetstream"})
+            totals["pending"] += info.num_pending
+            totals["ack_pending"] += info.num_ack_pending
+            totals["redelivered"] += info.num_redelivered
+        for key, totals in remote.items():
+            lag.setdefault(key, {}).update(totals)
+        
+        return lag
+    
+    async def replay_messages(
+        self,
+        target: str,
+        start_seq: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        batch_size: int = DEFAULT_REPLAY_BATCH,
+        rate: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the messages addressed to an agent, oldest first.
+        
+        Reads from JetStream when connected and from the messages table
+        otherwise. At most `batch_size` messages are held in memory at a time,
+        so arbitrarily long histories can be replayed.
+        
+        Args:
+            target: Agent ID whose messages to replay
+            start_seq: First JetStream stream sequence to replay
+            start_time: Replay messages sent at or after this time
+            batch_size: Messages in flight (JetStream) or rows per query (database)
+            rate: Maximum messages per second (unthrottled if None)
+        
+        Yields:
+            Messages in the order they were sent
+        """
+        if self.use_jetstream and self.jetstream:
+            source = self._replay_from_jetstream(target, start_seq, start_time, batch_size)
+        else:
+            source = self._replay_from_database(target, start_time, batch_size)
+        
+        loop = asyncio.get_running_loop()
+        interval = 1 / rate if rate else 0.0
+        next_at = loop.time()
+        try:
+            async for message in source:
+                if interval:
+                    delay = next_at - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_at = max(next_at, loop.time()) + interval
+                yield message
+        finally:
+            await source.aclose()
+    
+    async def _replay_from_jetstream(
+        self,
+        target: str,
+        start_seq: Optional[int],
+        start_time: Optional[datetime],
+        batch_size: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Replay through an ephemeral consumer filtered on the target's subject.
+        
+        max_ack_pending caps how many messages the server pushes before they
+        are acknowledged, and the local queue blocks the subscription callback,
+        so memory stays bounded by batch_size.
+        """
+        config: Dict[str, Any] = {"max_ack_pending": batch_size}
+        if start_seq is not None:
+            config.update(deliver_policy="by_start_sequence", opt_start_seq=start_seq)
+        elif start_time is not None:
+            if start_time.tzinfo is None:
+                start_time = start_time.replace(tzinfo=timezone.utc)
+            config.update(deliver_policy="by_start_time", opt_start_time=start_time.isoformat())
+        else:
+            config.update(deliver_policy="all")
+        if NATS_AVAILABLE:
+            config = ConsumerConfig(**{**config, "deliver_policy": DeliverPolicy(config["deliver_policy"])})
+        
+        # Messages published after the replay started are delivered live, not replayed
+        info = await self.jetstream.stream_info(self.stream_name)
+        # nats-py returns a StreamInfo, the fake server a dict
+        last_seq = info["last_seq"] if isinstance(info, dict) else info.state.last_seq
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=batch_size)
+        subscription = await self.jetstream.subscribe(
+            subject=self.get_subject({"to": target}),
+            cb=queue.put,
+            manual_ack=True,
+            config=config
+        )
+        replayed_seq = 0
+        try:
+            info = await subscription.consumer_info()
+            if info.num_pending == 0 and info.num_ack_pending == 0 and queue.empty():
+                return
+            
+            while replayed_seq < last_seq:
+                try:
+                    msg = await asyncio.wait_for(queue.get(), timeout=self.REPLAY_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    info = await subscription.consumer_info()
+                    if info.num_pending == 0 and info.num_ack_pending == 0:
+                        break
+                    continue
+                
+                seq = msg.metadata.sequence.stream
+                if seq > replayed_seq:
+                    # Redeliveries (ack_wait expired while the caller was slow) are skipped
+                    replayed_seq = seq
+                    decoded = self._decode_jetstream_message(msg)
+                    for message in decoded if isinstance(decoded, list) else [decoded]:
+                        yield self._inline_blobs(message)
+                await msg.ack()
+                if msg.metadata.num_pending == 0:
+                    break
+        finally:
+            await subscription.unsubscribe()
+    
+    async def _replay_from_database(
+        self,
+        target: str,
+        start_time: Optional[datetime],
+        batch_size: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Replay from the messages table using keyset pagination on the primary key"""
+        from sqlalchemy import select
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from database import Message, engine
+        
+        if start_time is not None and start_time.tzinfo is not None:
+            start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+        
+        last_id = 0
+        while True:
+            query = select(Message).where(Message.to_agent == target, Message.id > last_id)
+            if start_time is not None:
+                query = query.where(Message.created_at >= start_time)
+            async with AsyncSession(self.database_engine or engine) as session:
+                rows = (await session.execute(query.order_by(Message.id).limit(batch_size))).scalars().all()
+            
+            for row in rows:
+                yield {
+                    "message_id": row.message_id,
+                    "from": row.from_agent,
+                    "to": row.to_agent,
+                    "type": row.message_type,
+                    "payload": row.payload,
+                    "timestamp": row.created_at.replace(tzinfo=timezone.utc).isoformat()
+                }
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1].id
+    
+    async def _retry_delivery(self, message: Dict[str, Any]) -> Union[bool, str]:
+        """Retry delivery of a failed message (called by the dead letter queue)"""
+        result = await self._send(message)
+        if result.get("status") == "late":
+            return LATE
+        return result.get("status") != "error"
+    
+    def get_dead_letters(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Inspect messages in the dead letter queue"""
+        return self.dead_letters.list(limit=limit, offset=offset)
+    
+    async def replay_dead_letters(self, message_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Redeliver dead-lettered messages (all if no IDs are given)"""
+        return await self.dead_letters.replay(message_ids)
+    
+    def purge_dead_letters(self, message_ids: Optional[List[str]] = None) -> int:
+        """Permanently remove dead-lettered messages (all if no IDs are given)"""
+        return self.dead_letters.purge(message_ids)
     
     async def cleanup(self) -> None:
         """Clean up resources"""
+        # Publish coalesced messages while the connection is still up
+        if self.send_batcher:
+            await self.send_batcher.flush()
+        await self.dead_letters.stop()
+        if self.message_store:
+            await self.message_store.stop()
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._reorder_task:
+            self._reorder_task.cancel()
+            self._reorder_task = None
+        if self._blob_purge_task:
+            self._blob_purge_task.cancel()
+            self._blob_purge_task = None
+        if self.shm_transport:
+            await self.shm_transport.close()
         if self.nats_client:
             await self.nats_client.close()
             self.logger.info("NATS connection closed")
     
+    def _resolve_blobs(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get a copy of a message with its blob references replaced by their values.
+        
+        Messages without references are returned as they are.
+        
+        Raises:
+            KeyError: If a referenced blob is not in the store (or has expired)
+        """
+        refs = message.get(BLOB_REFS_FIELD)
+        if not refs or not self.claim_check:
+            return message
+        resolved = {key: value for key, value in message.items() if key != BLOB_REFS_FIELD}
+        resolved["payload"] = self.claim_check.resolve(message.get("payload"), refs)
+        return resolved
+    
+    def _inline_blobs(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Resolve blob references where possible, keeping them (with a warning) if a blob is gone"""
+        try:
+            return self._resolve_blobs(message)
+        except KeyError as e:
+            self.logger.warning(f"Blob {e} of message {message.get('message_id', 'unknown')} is no longer stored")
+            return message
+    
     def get_message_count(self) -> int:
         """Get total message count"""
         return len(self.message_history)
@@ -299,9 +1171,27 @@ class CommunicationAgent(BaseAgent):
             "agent_id": self.agent_id,
             "total_messages": len(self.message_history),
             "failed_messages": len(self.failed_messages),
+            "dead_letter_queue": self.dead_letters.get_statistics(),
+            "circuit_breaker": self.circuit_breaker.get_statistics(),
+            "outbox": self.outbox.get_statistics(),
+            "compression": self.compressor.get_statistics(),
+            "reorder_buffer": self.reorder_buffer.get_statistics(),
+            "shm_transport": self.shm_transport.get_statistics() if self.shm_transport else None,
+            "message_store": self.message_store.get_statistics() if self.message_store else None,
+            "claim_check": self.claim_check.get_statistics() if self.claim_check else None,
+            "send_batching": self.send_batcher.get_statistics() if self.send_batcher else None,
             "registered_agents": len(self.message_broker),
             "use_jetstream": self.use_jetstream,
-            "jetstream_connected": self.jetstream is not None
+            "jetstream_connected": self.jetstream is not None,
+            "consumed_agent_types": sorted(self.type_subscriptions.keys()),
+            "consumed_agents": sorted(self.agent_subscriptions.keys()),
+            "subjects": {key: dict(stats) for key, stats in self.subject_stats.items()},
+            "traffic": self.traffic.snapshot(),
+            "queue_depth": {agent_id: queue.qsize() for agent_id, queue in self.message_broker.items()},
+            "fair_queues": {
+                agent_id: queue.get_statistics() for agent_id, queue in self.message_broker.items()
+                if isinstance(queue, FairQueue)
+            }
         }
     
     async def get_checkpoint_state(self) -> Dict[str, Any]:
@@ -309,12 +1199,16 @@ class CommunicationAgent(BaseAgent):
         return {
             "message_history_count": len(self.message_history),
             "failed_messages": self.failed_messages[-10:],  # Keep last 10
-            "registered_agents": list(self.message_broker.keys())
+            "registered_agents": list(self.message_broker.keys()),
+            "agent_types": dict(self.agent_types),
+            "ordered_agents": sorted(self.ordered_agents)
         }
     
     async def restore_checkpoint_state(self, state: Dict[str, Any]) -> None:
         """Restore custom state from checkpoint"""
         self.failed_messages = state.get("failed_messages", [])
+        self.agent_types.update(state.get("agent_types", {}))
+        self.ordered_agents.update(state.get("ordered_agents", []))
         # Re-register agents
         for agent_id in state.get("registered_agents", []):
             await self.register_agent(agent_id)
@@ -6,10 +6,11 @@ from typing import Any, Dict, Optional, List
 from datetime import datetime, timezone
 import asyncio
 import logging
-import json
 import pickle
 from enum import Enum
 
+import serialization
+
 logger = logging.getLogger(__name__)
 
 
@@ -222,13 +223,13 @@ class BaseAgent(ABC):
             if backend:
                 # Save to storage backend (Redis, PostgreSQL, etc.)
                 checkpoint_key = f"agent:checkpoint:{self.agent_id}"
-                await backend.set(checkpoint_key, json.dumps(checkpoint_data))
+                await backend.set(checkpoint_key, serialization.dumps(checkpoint_data))
                 self.logger.info(f"Checkpoint saved for agent {self.agent_id}")
             else:
                 # Fallback: save to local file
                 checkpoint_file = f"/tmp/agent_checkpoint_{self.agent_id}.json"
                 with open(checkpoint_file, 'w') as f:
-                    json.dump(checkpoint_data, f, indent=2)
+                    f.write(serialization.dumps(checkpoint_data, indent=True))
                 self.logger.info(f"Checkpoint saved to file: {checkpoint_file}")
             
             self.last_checkpoint = datetime.now(timezone.utc)
@@ -257,13 +258,13 @@ class BaseAgent(ABC):
                 checkpoint_key = f"agent:checkpoint:{self.agent_id}"
                 data = await backend.get(checkpoint_key)
                 if data:
-                    checkpoint_data = json.loads(data)
+                    checkpoint_data = serialization.loads(data)
             else:
                 # Fallback: load from local file
                 checkpoint_file = f"/tmp/agent_checkpoint_{self.agent_id}.json"
                 try:
                     with open(checkpoint_file, 'r') as f:
-                        checkpoint_data = json.load(f)
+                        checkpoint_data = serialization.loads(f.read())
                 except FileNotFoundError:
                     self.logger.info(f"No checkpoint found for agent {self.agent_id}")
                     return False
@@ -0,0 +1,174 @@
+"""
+Micro-batching - Nagle-style coalescing of outgoing messages with an AIMD batch size
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import time
+
+
+# Header of a JetStream message carrying a list of coalesced messages
+BATCH_COUNT_HEADER = "Batch-Count"
+
+
+class AIMDController:
+    """
+    Picks the batch size from observed publish latency.
+    
+    The size grows additively while full batches publish within the target
+    latency and is cut multiplicatively when a publish is slower, the same
+    way TCP congestion control probes for bandwidth.
+    """
+    
+    DEFAULT_MIN_SIZE = 1
+    DEFAULT_INITIAL_SIZE = 32
+    DEFAULT_MAX_SIZE = 256
+    DEFAULT_TARGET_LATENCY = 0.005  # seconds
+    
+    def __init__(
+        self,
+        min_size: int = DEFAULT_MIN_SIZE,
+        initial_size: int = DEFAULT_INITIAL_SIZE,
+        max_size: int = DEFAULT_MAX_SIZE,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        increase: int = 1,
+        decrease: float = 0.5
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.size = max(min_size, min(initial_size, max_size))
+        self.stats = {"increases": 0, "decreases": 0}
+    
+    def observe(self, latency: float, batch_size: int) -> int:
+        """
+        Feed back the latency of a published batch.
+        
+        Returns:
+            The new batch size
+        """
+        if latency > self.target_latency:
+            new_size = max(self.min_size, int(self.size * self.decrease))
+            if new_size < self.size:
+                self.stats["decreases"] += 1
+            self.size = new_size
+        elif batch_size >= self.size and self.size < self.max_size:
+            # Only grow when there is demand for bigger batches
+            self.size = min(self.max_size, self.size + self.increase)
+            self.stats["increases"] += 1
+        return self.size
+
+
+class MicroBatcher:
+    """
+    Coalesces items into batches published with one call, following Nagle's
+    rule: an item is sent at once when no batch is in flight; otherwise it
+    waits until the batch in flight completes, the pending batch reaches the
+    controller's size, or `max_delay` passes, whichever comes first.
+    
+    Each `submit` resolves with the result for its own item, so callers keep
+    per-message results. A lone sender is never delayed; chatty senders
+    share batches.
+    """
+    
+    DEFAULT_MAX_DELAY = 0.002  # seconds
+    
+    def __init__(
+        self,
+        publish: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_delay: float = DEFAULT_MAX_DELAY,
+        controller: Optional[AIMDController] = None
+    ):
+        """
+        Initialize the batcher.
+        
+        Args:
+            publish: Coroutine publishing a batch and returning one result per item
+            max_delay: Longest time an item waits for its batch to fill
+            controller: Batch size controller (default AIMDController())
+        """
+        self.publish = publish
+        self.max_delay = max_delay
+        self.controller = controller or AIMDController()
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self.stats = {
+            "messages": 0,
+            "batches": 0,
+            "flushed_full": 0,
+            "flushed_idle": 0,
+            "flushed_ack": 0,
+            "flushed_timer": 0,
+            "publish_errors": 0
+        }
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for the result of publishing its batch"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.controller.size:
+            self.stats["flushed_full"] += 1
+            self._flush()
+        elif not self._in_flight:
+            self.stats["flushed_idle"] += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush_on_timer)
+        return await future
+    
+    def _flush_on_timer(self) -> None:
+        self._timer = None
+        if self._pending:
+            self.stats["flushed_timer"] += 1
+            self._flush()
+    
+    def _flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._publish_batch(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+    
+    async def _publish_batch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.stats["batches"] += 1
+        self.stats["messages"] += len(batch)
+        started = time.perf_counter()
+        try:
+            results = await self.publish([item for item, _ in batch])
+        except Exception as e:
+            self.stats["publish_errors"] += 1
+            self.controller.observe(float("inf"), len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self.controller.observe(time.perf_counter() - started, len(batch))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        
+        # Items that queued up behind this batch go out now
+        if self._pending:
+            self.stats["flushed_ack"] += 1
+            self._flush()
+    
+    async def flush(self) -> None:
+        """Publish pending items now and wait for all batches in flight"""
+        if self._pending:
+            self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get batching counters and the current batch size"""
+        return {
+            **self.stats,
+            **self.controller.stats,
+            "pending": len(self._pending),
+            "batch_size": self.controller.size,
+            "average_batch": round(self.stats["messages"] / self.stats["batches"], 2) if self.stats["batches"] else 0.0
+        }
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Code Analysis Benchmark
+Compares the single-pass scanner with the previous multi-pass analysis on multi-megabyte files
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from code_analysis import IncrementalAnalyzer, analyze_source, scan_code
+from generation_cache import GenerationCache
+from process_pool import ProcessPool
+from python_analysis import analyze_python
+from repository_analysis import RepositoryAnalysisJob
+
+
+def legacy_analyze(code: str, language: str) -> Dict[str, Any]:
+    """The analysis as it was before the single-pass scanner: one split per metric, regex per line"""
+    comment_patterns = {"python": r'^\s*#', "javascript": r'^\s*//', "java": r'^\s*//'}
+    pattern = comment_patterns.get(language, r'^\s*//')
+    issues: List[Dict[str, Any]] = []
+    for i, line in enumerate(code.split('\n')):
+        if len(line) > 120:
+            issues.append({"type": "style", "severity": "low", "line": i + 1, "message": "Line too long (>120 characters)"})
+    return {
+        "metrics": {
+            "lines_of_code": len(code.split('\n')),
+            "blank_lines": len([line for line in code.split('\n') if not line.strip()]),
+            "comment_lines": len([line for line in code.split('\n') if re.match(pattern, line)])
+        },
+        "issues": issues,
+        "long_file": len(code.split('\n')) > 200
+    }
+
+
+def python_source(size: int) -> str:
+    """Build Python source of roughly `size` bytes"""
+    block = "\n".join([
+        "# Helpers for order processing",
+        "def process_order_{i}(order, inventory):",
+        "    \"\"\"Reserve stock for an order\"\"\"",
+        "",
+        "    for item in order.items:",
+        "        if inventory.available(item.sku) < item.quantity:",
+        "            raise ValueError(f'Not enough stock for {{item.sku}} in order {{order.id}}, requested {{item.quantity}}')",
+        "        inventory.reserve(item.sku, item.quantity)  # reservation expires after the configured timeout window",
+        "    return order",
+        "",
+        ""
+    ])
+    blocks = []
+    total = i = 0
+    while total < size:
+        blocks.append(block.format(i=i))
+        total += len(blocks[-1])
+        i += 1
+    return "".join(blocks)
+
+
+def best_of(repeat: int, func, *args) -> float:
+    """Fastest of `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_incremental(size: int, repeat: int) -> None:
+    """Time re-analysis of a one-line edit against analyzing the whole file again"""
+    code = python_source(size)
+    analyzer = IncrementalAnalyzer(GenerationCache(max_entries=1000000, ttl=0))
+    asyncio.run(analyzer.analyze(code, "python"))
+    analyzed = analyzer.stats["blocks_analyzed"]
+    
+    edits = []
+    for edit in range(repeat):
+        edited = code.replace("def process_order_100(", f"def process_order_100_v{edit}(", 1)
+        started = time.perf_counter()
+        asyncio.run(analyzer.analyze(edited, "python"))
+        edits.append(time.perf_counter() - started)
+    full = best_of(repeat, analyze_source, edited, "python")
+    incremental = min(edits)
+    
+    lines = code.count("\n") + 1
+    print(f"\nIncremental re-analysis of a one-line edit ({lines} lines, {len(code) / 1024:.0f} KB)")
+    print(f"{'full ms':>12}{'incremental ms':>18}{'speedup':>12}{'blocks':>10}{'re-analyzed':>14}")
+    print(f"{full * 1000:>12.1f}{incremental * 1000:>18.2f}{full / incremental:>11.1f}x"
+          f"{analyzed:>10}{(analyzer.stats['blocks_analyzed'] - analyzed) / repeat:>14.0f}")
+
+
+def bench_repository(files: int, file_kb: int) -> None:
+    """Time a parallel analysis of a generated repository"""
+    pool = ProcessPool()
+    with tempfile.TemporaryDirectory() as root:
+        for i in range(files):
+            directory = os.path.join(root, f"package_{i // 100}")
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"module_{i}.py"), "w") as f:
+                f.write(python_source(file_kb * 1024))
+        
+        inline = asyncio.run(RepositoryAnalysisJob(root).run())
+        pooled = asyncio.run(RepositoryAnalysisJob(root, pool=pool).run())
+    pool.shutdown()
+    
+    print(f"\nRepository analysis ({files} files of {file_kb} KB, {pool.max_workers} workers)")
+    print(f"{'mode':>8}{'seconds':>10}{'files':>8}{'files/s':>10}{'10k files s':>14}{'failed':>8}")
+    for mode, result in (("inline", inline), ("pooled", pooled)):
+        rate = result["files"] / max(result["elapsed_seconds"], 0.001)
+        print(f"{mode:>8}{result['elapsed_seconds']:>10.2f}{result['files']:>8}{rate:>10.0f}"
+              f"{10000 / rate:>14.1f}{result['failed']:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark code analysis")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="File sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    parser.add_argument("--incremental-kb", type=int, default=400, help="File size for the incremental benchmark in KB")
+    parser.add_argument("--repository-files", type=int, default=2000, help="Files in the repository benchmark")
+    parser.add_argument("--repository-file-kb", type=int, default=8, help="File size in the repository benchmark in KB")
+    args = parser.parse_args()
+    
+    print(f"\n{'=' * 82}\nCode analysis benchmark (Python source)\n{'=' * 82}")
+    print(f"{'size MB':>8}{'lines':>12}{'legacy ms':>14}{'single-pass ms':>18}{'speedup':>12}{'MB/s':>8}{'AST ms':>10}")
+    for size in args.sizes:
+        code = python_source(int(size * 1024 * 1024))
+        legacy = best_of(args.repeat, legacy_analyze, code, "python")
+        single = best_of(args.repeat, scan_code, code, "python")
+        structure = best_of(args.repeat, analyze_python, code)
+        lines = scan_code(code, "python")["metrics"]["lines_of_code"]
+        print(f"{size:>8.1f}{lines:>12}{legacy * 1000:>14.1f}{single * 1000:>18.1f}"
+              f"{legacy / single:>11.2f}x{size / single:>8.1f}{structure * 1000:>10.1f}")
+    
+    bench_incremental(args.incremental_kb * 1024, args.repeat)
+    bench_repository(args.repository_files, args.repository_file_kb)
+
+
+if __name__ == "__main__":
+    main()
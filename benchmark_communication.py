@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Communication Layer Benchmark
+Measures CommunicationAgent throughput and redelivery behavior offline,
+using the in-process JetStream stand-in instead of a NATS server
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import uuid
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from agent_communication import CommunicationAgent
+from fake_jetstream import FakeJetStreamServer
+from sharding import HashRing, ShardedBroker, ShardProcess
+from shm_transport import SharedMemoryRing
+
+
+def print_result(name: str, count: int, elapsed: float, extra: str = "") -> None:
+    """Print a benchmark result line"""
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    print(f"{name:<40} {count:>8} msgs {elapsed:>8.3f}s {rate:>12,.0f} msg/s {extra}")
+
+
+async def create_agent(use_jetstream: bool, workdir: str, **config: Any) -> CommunicationAgent:
+    """Create and initialize a communication agent for benchmarking"""
+    server = FakeJetStreamServer(ack_wait=config.pop("ack_wait", 30.0))
+    agent = CommunicationAgent(config={
+        "use_jetstream": use_jetstream,
+        "nats_connect": server.connect if use_jetstream else None,
+        "dlq_path": f"{workdir}/dlq.jsonl",
+        **config
+    })
+    await agent.initialize()
+    return agent
+
+
+async def drain(agent: CommunicationAgent, targets: Dict[str, int], expected: int, timeout: float = 60.0) -> int:
+    """Wait until the target queues hold the expected number of messages"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        received = sum(agent.message_broker[target].qsize() for target in targets)
+        if received >= expected:
+            return received
+        await asyncio.sleep(0.001)
+    return sum(agent.message_broker[target].qsize() for target in targets)
+
+
+async def bench_throughput(messages: int, payload_size: int, use_jetstream: bool, workdir: str) -> None:
+    """Publish messages to a handful of agents and wait for delivery"""
+    agent = await create_agent(use_jetstream, workdir)
+    targets = {f"agent_{i}": i for i in range(4)}
+    for target in targets:
+        await agent.register_agent(target, agent_type=f"Type{targets[target] % 2}")
+    
+    payload = {"data": "x" * payload_size}
+    names = list(targets)
+    start = time.perf_counter()
+    for i in range(messages):
+        await agent.process_message({"from": "bench", "to": names[i % len(names)], "payload": payload})
+    published = time.perf_counter() - start
+    received = await drain(agent, targets, messages)
+    total = time.perf_counter() - start
+    
+    mode = "jetstream(fake)" if use_jetstream else "in-memory"
+    print_result(f"publish [{mode}]", messages, published)
+    print_result(f"end-to-end [{mode}]", received, total)
+    await agent.cleanup()
+
+
+async def bench_redelivery(messages: int, failure_rate: float, workdir: str) -> None:
+    """Fail a fraction of first deliveries and measure how quickly redelivery recovers them"""
+    agent = await create_agent(True, workdir, retry_base_delay=0.001, retry_max_delay=0.01)
+    await agent.register_agent("flaky_agent", agent_type="Flaky")
+    
+    route = agent._route_message
+    seen = set()
+    
+    async def flaky_route(message: Dict[str, Any]) -> Dict[str, Any]:
+        message_id = message.get("message_id")
+        if message_id not in seen and random.random() < failure_rate:
+            seen.add(message_id)
+            return {"status": "error", "error": "injected failure"}
+        return await route(message)
+    
+    agent._route_message = flaky_route
+    
+    start = time.perf_counter()
+    for i in range(messages):
+        await agent.process_message({"from": "bench", "to": "flaky_agent", "payload": {"n": i}})
+    received = await drain(agent, {"flaky_agent": 0}, messages)
+    elapsed = time.perf_counter() - start
+    
+    stats = agent.subject_stats.get("Flaky", {})
+    print_result(
+        f"redelivery [{failure_rate:.0%} first-try failures]",
+        received,
+        elapsed,
+        f"naks={stats.get('nacked', 0)} redelivered={stats.get('redelivered', 0)}"
+    )
+    await agent.cleanup()
+
+
+async def bench_sharded(messages: int, payload_size: int, shard_counts: List[int], senders: int = 64) -> None:
+    """
+    Route through a ShardedBroker over 1..N shard processes.
+    
+    Concurrent senders go through the broker's hash ring to the owning shard,
+    so shards route disjoint traffic in parallel on their own CPUs; the time
+    covers every message being delivered into its agent's queue. Adding
+    shards only helps while there are free cores for them.
+    """
+    agent_ids = [f"agent_{i}" for i in range(256)]
+    rng = random.Random(42)
+    targets = [rng.choice(agent_ids) for _ in range(messages)]
+    payload = {"data": "x" * payload_size}
+    
+    for count in shard_counts:
+        broker = ShardedBroker({
+            f"shard_{i}": ShardProcess(f"shard_{i}", {"use_jetstream": False}) for i in range(count)
+        })
+        await broker.start()
+        await asyncio.gather(*(broker.register_agent(agent_id) for agent_id in agent_ids))
+        before = {name: dict(shard.stats) for name, shard in broker.shards.items()}
+        
+        delivered = 0
+        
+        async def sender(offset: int) -> None:
+            nonlocal delivered
+            for i in range(offset, messages, senders):
+                result = await broker.process_message({"from": f"sender_{offset}", "to": targets[i], "payload": payload})
+                delivered += result["status"] == "delivered"
+        
+        start, start_cpu = time.perf_counter(), time.process_time()
+        await asyncio.gather(*(sender(offset) for offset in range(senders)))
+        elapsed = time.perf_counter() - start
+        # CPU spent in this (router) process bounds how far the shards can scale
+        router_cpu = time.process_time() - start_cpu
+        
+        batch = statistics.mean(
+            (shard.stats["calls"] - before[name]["calls"]) / max(1, shard.stats["batches"] - before[name]["batches"])
+            for name, shard in broker.shards.items()
+        )
+        # Keys that change owner when one more shard joins
+        grown = HashRing([f"shard_{i}" for i in range(count + 1)])
+        moved = sum(broker.ring.get_node(agent_id) != grown.get_node(agent_id) for agent_id in agent_ids)
+        print_result(
+            f"sharded routing [{count} shard process{'es' if count > 1 else ''}]",
+            delivered,
+            elapsed,
+            f"router cpu={1e6 * router_cpu / messages:.1f}us/msg avg pipe batch={batch:.0f} "
+            f"moved_on_add={moved / len(agent_ids):.0%}"
+        )
+        await broker.cleanup()
+
+
+def _spin_read(ring: SharedMemoryRing) -> bytes:
+    """Busy-wait for the next record (yielding the CPU between polls)"""
+    while True:
+        view = ring.read()
+        if view is not None:
+            data = bytes(view)
+            view.release()
+            ring.release()
+            return data
+        os.sched_yield()
+
+
+def _echo(ping: str, pong: str, rounds: int) -> None:
+    """Echo every record from the ping ring back on the pong ring"""
+    inbox, outbox = SharedMemoryRing(ping), SharedMemoryRing(pong)
+    for _ in range(rounds):
+        outbox.write(_spin_read(inbox))
+    inbox.close()
+    outbox.close()
+
+
+def bench_shm_latency(rounds: int, payload_size: int) -> None:
+    """Ping-pong between two processes over shared memory rings"""
+    ping, pong = f"bench_{uuid.uuid4().hex[:8]}_ping", f"bench_{uuid.uuid4().hex[:8]}_pong"
+    outbox, inbox = SharedMemoryRing(ping), SharedMemoryRing(pong)
+    echo = multiprocessing.get_context("fork").Process(target=_echo, args=(ping, pong, rounds))
+    echo.start()
+    
+    payload = b"x" * payload_size
+    one_way_us = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        sent = time.perf_counter()
+        outbox.write(payload)
+        _spin_read(inbox)
+        one_way_us.append(1e6 * (time.perf_counter() - sent) / 2)
+    elapsed = time.perf_counter() - start
+    echo.join()
+    outbox.close(unlink=True)
+    inbox.close(unlink=True)
+    
+    one_way_us.sort()
+    print_result(
+        "shared memory ping-pong",
+        rounds,
+        elapsed,
+        f"one-way p50={statistics.median(one_way_us):.1f}us p99={one_way_us[int(0.99 * len(one_way_us))]:.1f}us"
+    )
+
+
+async def bench_fair_queuing(messages: int, fair: bool, quota: int, workdir: str) -> None:
+    """Flood one agent from a noisy tenant and measure how long a quiet tenant waits"""
+    agent = await create_agent(False, workdir, fair_queuing=fair, tenant_quota=quota)
+    await agent.register_agent("codegen", agent_type="CodeGenerationAgent")
+    
+    # 95% of the traffic comes from one project, arriving twice as fast as the
+    # agent consumes, so its mailbox keeps growing
+    waits: Dict[str, List[float]] = {"noisy": [], "quiet": []}
+    queue = agent.message_broker["codegen"]
+    start = time.perf_counter()
+    for i in range(messages):
+        tenant = "quiet" if i % 20 == 0 else "noisy"
+        await agent.process_message({
+            "from": "bench", "to": "codegen", "tenant": tenant, "payload": {"sent": time.perf_counter()}
+        })
+        if i % 2 or i == messages - 1:
+            while not queue.empty() and (i == messages - 1 or len(waits["noisy"]) + len(waits["quiet"]) <= i // 2):
+                message = queue.get_nowait()
+                waits[message["tenant"]].append(1000 * (time.perf_counter() - message["payload"]["sent"]))
+    elapsed = time.perf_counter() - start
+    
+    mode = f"fair, quota={quota}" if fair else "fifo"
+    dropped = agent.get_statistics()["traffic"]["counters"].get("dropped", 0)
+    summary = " ".join(
+        f"{tenant} p50={statistics.median(values):.1f}ms p99={sorted(values)[int(0.99 * len(values))]:.1f}ms"
+        for tenant, values in waits.items() if values
+    )
+    print_result(f"skewed tenants [{mode}]", sum(map(len, waits.values())), elapsed, f"{summary} dropped={dropped}")
+    await agent.cleanup()
+
+
+async def bench_claim_check(messages: int, payload_size: int, claim_check: bool, workdir: str) -> None:
+    """Send the same large code body repeatedly, inline or as a blob reference"""
+    agent = await create_agent(
+        False, workdir, claim_check=claim_check, blob_store_path=f"{workdir}/blobs", claim_check_threshold=4096
+    )
+    await agent.register_agent("reviewer")
+    
+    code = "print('hello world')\n" * (payload_size // 21 + 1)
+    start = time.perf_counter()
+    for _ in range(messages):
+        await agent.process_message({"from": "coder", "to": "reviewer", "payload": {"code": code}})
+    elapsed = time.perf_counter() - start
+    
+    # What every copy in history, checkpoints and on the wire costs
+    wire = sum(len(agent.wire_codec.encode(message)) for message in agent.message_history)
+    stats = agent.get_statistics()["claim_check"]
+    extra = f"wire={wire / messages:,.0f} B/msg"
+    if stats:
+        extra += f" blobs stored={stats['store']['bytes_stored']:,} B"
+    print_result(f"large payloads [{'claim check' if claim_check else 'inline'}]", messages, elapsed, extra)
+    await agent.cleanup()
+
+
+async def bench_batching(messages: int, payload_size: int, batching: bool, workdir: str, senders: int = 32) -> None:
+    """Publish from many concurrent senders over JetStream, with or without micro-batching"""
+    agent = await create_agent(True, workdir, send_batching=batching)
+    targets = {f"agent_{i}": i for i in range(4)}
+    for target in targets:
+        await agent.register_agent(target)
+    
+    payload = {"data": "x" * payload_size}
+    names = list(targets)
+    
+    async def sender(offset: int) -> None:
+        for i in range(offset, messages, senders):
+            await agent.process_message({"from": f"sender_{offset}", "to": names[i % len(names)], "payload": payload})
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(offset) for offset in range(senders)))
+    received = await drain(agent, targets, messages)
+    elapsed = time.perf_counter() - start
+    
+    stats = agent.get_statistics()["send_batching"]
+    extra = f"avg batch={stats['average_batch']} size={stats['batch_size']}" if stats else ""
+    print_result(f"{senders} senders [{'batched' if batching else 'unbatched'}]", received, elapsed, extra)
+    await agent.cleanup()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the communication layer offline")
+    parser.add_argument("--messages", type=int, default=20000, help="Messages per scenario")
+    parser.add_argument("--payload-size", type=int, default=256, help="Payload size in bytes")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="First-delivery failure rate")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Shard counts to compare")
+    args = parser.parse_args()
+    
+    # Injected failures are logged as errors; keep the report readable
+    logging.disable(logging.ERROR)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"\n{'=' * 70}\nCommunication layer benchmark\n{'=' * 70}")
+        await bench_throughput(args.messages, args.payload_size, False, workdir)
+        await bench_throughput(args.messages, args.payload_size, True, workdir)
+        await bench_redelivery(args.messages // 4, args.failure_rate, workdir)
+        await bench_batching(args.messages, args.payload_size, False, workdir)
+        await bench_batching(args.messages, args.payload_size, True, workdir)
+        await bench_sharded(args.messages, args.payload_size, args.shards)
+        bench_shm_latency(args.messages // 4, args.payload_size)
+        await bench_fair_queuing(args.messages, False, 0, workdir)
+        await bench_fair_queuing(args.messages, True, 0, workdir)
+        await bench_fair_queuing(args.messages, True, args.messages // 10, workdir)
+        await bench_claim_check(args.messages // 20, 256 * 1024, False, workdir)
+        await bench_claim_check(args.messages // 20, 256 * 1024, True, workdir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Serialization Microbenchmark
+Compares the registered codecs on payloads typical of the YMERA system
+"""
+import argparse
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import serialization
+
+
+def typical_payloads() -> Dict[str, Any]:
+    """Build payloads shaped like the ones each layer serializes"""
+    source = "\n".join(
+        f"def function_{i}(value):\n    \"\"\"Docstring {i}\"\"\"\n    return value * {i}\n" for i in range(300)
+    )
+    return {
+        "agent message": {
+            "message_id": "msg_123",
+            "from": "api",
+            "to": "code_generation_agent",
+            "type": "refactor_code",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "payload": {
+                "status": "success",
+                "language": "python",
+                "original_code": source,
+                "refactored_code": source,
+                "changes": [{"type": "line_count", "original": 1200, "refactored": 1100}]
+            }
+        },
+        "log record": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "level": "INFO",
+            "logger": "base_agent.communication_agent",
+            "message": "Message published to JetStream: 42",
+            "module": "agent_communication",
+            "function": "_publish",
+            "line": 388
+        },
+        "checkpoint": {
+            "agent_id": "devops_agent",
+            "state": "running",
+            "config": {"checkpoint_interval": 60, "supported_languages": ["python", "go", "rust"]},
+            "custom_state": {
+                "automation_stats": {"total_deployments": 120, "successful_deployments": 118},
+                "deployment_history": [
+                    {"deployment_id": f"deploy_{i}", "service": "api", "version": f"1.{i}.0", "status": "success"}
+                    for i in range(100)
+                ]
+            }
+        },
+        "websocket event": {
+            "event": "agent:updated",
+            "data": {"id": "agent_42", "name": "Coder", "config": {"model": "default", "temperature": 0.2}}
+        }
+    }
+
+
+def bench(codec: serialization.Codec, payload: Any, number: int) -> Dict[str, float]:
+    """Time encode and decode of one payload"""
+    encoded = codec.encode(payload)
+    encode_time = timeit.timeit(lambda: codec.encode(payload), number=number)
+    decode_time = timeit.timeit(lambda: codec.decode(encoded), number=number)
+    return {
+        "encode_us": 1e6 * encode_time / number,
+        "decode_us": 1e6 * decode_time / number,
+        "size": len(encoded)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark serialization codecs")
+    parser.add_argument("--number", type=int, default=2000, help="Iterations per measurement")
+    args = parser.parse_args()
+    
+    codecs = list(serialization.available_codecs().values())
+    print(f"\n{'=' * 86}\nSerialization microbenchmark (default JSON codec: {serialization.json_codec.name})\n{'=' * 86}")
+    print(f"{'payload':<18}{'codec':<14}{'encode us':>12}{'decode us':>12}{'bytes':>10}{'speedup':>12}")
+    
+    for payload_name, payload in typical_payloads().items():
+        baseline = None
+        for codec in codecs:
+            result = bench(codec, payload, args.number)
+            total = result["encode_us"] + result["decode_us"]
+            baseline = baseline or total
+            print(f"{payload_name:<18}{codec.name:<14}{result['encode_us']:>12.2f}{result['decode_us']:>12.2f}"
+                  f"{result['size']:>10}{baseline / total:>11.2f}x")
+
+
+if __name__ == "__main__":
+    main()
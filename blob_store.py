@@ -0,0 +1,260 @@
+"""
+Blob Store - Content-addressed storage for large payloads (claim check pattern)
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import time
+
+
+# Key of the digest in a blob reference
+BLOB_REF_KEY = "$blob"
+
+# Message field listing the payload paths replaced by blob references. It
+# is set by the sending agent, so a payload value shaped like a reference
+# is only resolved when the sender put it there.
+BLOB_REFS_FIELD = "blob_refs"
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class BlobStore:
+    """
+    Content-addressed blob store on local disk.
+    
+    Blobs are stored once under their SHA-256 digest (two-level fan-out
+    directories) and written to a temporary file then renamed, so readers
+    never see a partial blob and concurrent writers of the same content are
+    harmless. Reads are memory-mapped, leaving caching to the page cache.
+    Processes sharing the directory (or a shared volume) share the blobs.
+    
+    Blobs expire `ttl` seconds after they were last stored (storing the same
+    content again renews them); `purge_expired` deletes them.
+    """
+    
+    DEFAULT_PATH = "/tmp/agent_blobs"
+    DEFAULT_TTL = 86400.0  # seconds
+    DEFAULT_PURGE_INTERVAL = 3600.0  # seconds
+    
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+        # Digest -> when this process last wrote or renewed the blob
+        self._known: Dict[str, float] = {}
+        self.stats = {
+            "stored": 0,
+            "deduplicated": 0,
+            "bytes_stored": 0,
+            "bytes_deduplicated": 0,
+            "reads": 0,
+            "missing": 0,
+            "expired": 0
+        }
+    
+    def _blob_path(self, digest: str) -> str:
+        if not _DIGEST.fullmatch(digest):
+            raise KeyError(digest)
+        return os.path.join(self.path, digest[:2], digest[2:])
+    
+    def put(self, data: bytes) -> str:
+        """
+        Store a blob unless identical content is already stored.
+        
+        Returns:
+            Hex SHA-256 digest of the blob
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        now = time.time()
+        renewed = self._known.get(digest)
+        if renewed is not None and now - renewed < self.ttl / 2:
+            self._deduplicated(len(data))
+            return digest
+        try:
+            # Renew the blob, so content still being sent does not expire
+            os.utime(path)
+            self._known[digest] = now
+            self._deduplicated(len(data))
+            return digest
+        except FileNotFoundError:
+            pass
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._known[digest] = now
+        self.stats["stored"] += 1
+        self.stats["bytes_stored"] += len(data)
+        return digest
+    
+    def _deduplicated(self, size: int) -> None:
+        self.stats["deduplicated"] += 1
+        self.stats["bytes_deduplicated"] += size
+    
+    def open(self, digest: str) -> mmap.mmap:
+        """
+        Map a blob read-only; the caller closes the map.
+        
+        Raises:
+            KeyError: If the blob is not in the store
+        """
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError: empty files cannot be mapped
+            self.stats["missing"] += 1
+            raise KeyError(digest)
+        self.stats["reads"] += 1
+        return mapped
+    
+    def get(self, digest: str) -> bytes:
+        """
+        Read a blob.
+        
+        Raises:
+            KeyError: If the blob is not in the store
+        """
+        with self.open(digest) as mapped:
+            return mapped[:]
+    
+    def contains(self, digest: str) -> bool:
+        """Check whether a blob is stored"""
+        return os.path.exists(self._blob_path(digest))
+    
+    def delete(self, digest: str) -> bool:
+        """Remove a blob (returns False if it was not stored)"""
+        self._known.pop(digest, None)
+        try:
+            os.unlink(self._blob_path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        Delete blobs (and abandoned temporary files) not stored within the TTL.
+        
+        Returns:
+            Number of blobs deleted
+        """
+        cutoff = (now if now is not None else time.time()) - self.ttl
+        purged = 0
+        for fan_out in os.scandir(self.path):
+            if not fan_out.is_dir():
+                continue
+            for entry in os.scandir(fan_out.path):
+                try:
+                    if entry.stat().st_mtime >= cutoff:
+                        continue
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+                if not entry.name.startswith(".tmp_"):
+                    self._known.pop(fan_out.name + entry.name, None)
+                    purged += 1
+        self.stats["expired"] += purged
+        return purged
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get store counters"""
+        return dict(self.stats)
+
+
+class ClaimCheck:
+    """
+    Swaps large payload values for blob references and back.
+    
+    `check_in` replaces every string or bytes value of at least `threshold`
+    bytes (UTF-8 encoded, at any depth of the payload) with {"$blob": digest,
+    "size": n, "type": "str" | "bytes"}, so messages, history, checkpoints
+    and broker traffic carry a few dozen bytes instead of the body. It also
+    returns the paths of the replaced values, which travel with the message
+    in its BLOB_REFS_FIELD; receivers resolve only those paths, with `load`
+    or `resolve`.
+    """
+    
+    DEFAULT_THRESHOLD = 65536  # bytes
+    
+    def __init__(self, store: BlobStore, threshold: int = DEFAULT_THRESHOLD):
+        self.store = store
+        self.threshold = threshold
+        self.stats = {"checked_in": 0, "resolved": 0}
+    
+    def check_in(self, payload: Any) -> Tuple[Any, List[List[Any]]]:
+        """
+        Replace large values of a payload with blob references.
+        
+        Returns:
+            The payload with large values replaced (containers holding them are
+            copied; the caller's payload is left unchanged) and the path (keys
+            and list indexes) of every replaced value
+        """
+        refs: List[List[Any]] = []
+        return self._check_in(payload, [], refs), refs
+    
+    def _check_in(self, value: Any, path: List[Any], refs: List[List[Any]]) -> Any:
+        if isinstance(value, dict):
+            replaced = {key: self._check_in(item, path + [key], refs) for key, item in value.items()}
+            return replaced if any(replaced[key] is not value[key] for key in value) else value
+        if isinstance(value, list):
+            replaced = [self._check_in(item, path + [index], refs) for index, item in enumerate(value)]
+            return replaced if any(new is not old for new, old in zip(replaced, value)) else value
+        # A character takes at most 4 bytes, so shorter strings are not encoded
+        if isinstance(value, str) and 4 * len(value) >= self.threshold:
+            data = value.encode("utf-8")
+            if len(data) >= self.threshold:
+                refs.append(path)
+                return self._ref(data, "str")
+        if isinstance(value, (bytes, bytearray)) and len(value) >= self.threshold:
+            refs.append(path)
+            return self._ref(bytes(value), "bytes")
+        return value
+    
+    def _ref(self, data: bytes, kind: str) -> Dict[str, Any]:
+        self.stats["checked_in"] += 1
+        return {BLOB_REF_KEY: self.store.put(data), "size": len(data), "type": kind}
+    
+    def load(self, ref: Dict[str, Any]) -> Any:
+        """
+        Read the value behind a blob reference.
+        
+        Raises:
+            KeyError: If the blob is not in the store (or has expired)
+        """
+        self.stats["resolved"] += 1
+        with self.store.open(ref[BLOB_REF_KEY]) as mapped:
+            if ref.get("type") == "bytes":
+                return mapped[:]
+            view = memoryview(mapped)
+            try:
+                return str(view, "utf-8")
+            finally:
+                view.release()
+    
+    def resolve(self, payload: Any, refs: List[List[Any]]) -> Any:
+        """Resolve the blob references at the given paths (containers on the way are copied)"""
+        for path in refs:
+            payload = self._resolve_path(payload, path)
+        return payload
+    
+    def _resolve_path(self, value: Any, path: List[Any]) -> Any:
+        if not path:
+            return self.load(value)
+        copied = dict(value) if isinstance(value, dict) else list(value)
+        copied[path[0]] = self._resolve_path(value[path[0]], path[1:])
+        return copied
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get claim check and store counters"""
+        return {**self.stats, "store": self.store.get_statistics(), "threshold": self.threshold}
@@ -0,0 +1,97 @@
+"""
+Circuit Breaker - Stops calling an unhealthy dependency until it has had time to recover
+"""
+from typing import Any, Dict, Optional
+from enum import Enum
+import time
+
+
+class CircuitState(Enum):
+    """Circuit breaker states"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    
+    The circuit opens after `failure_threshold` consecutive failures. While it
+    is open, calls are rejected without touching the dependency. After
+    `recovery_timeout` seconds it becomes half-open and lets a single probe
+    through, rejecting other calls until the probe reports back: a success
+    closes it again, a failure re-opens it. A probe that never reports is
+    replaced after another `recovery_timeout`.
+    """
+    
+    DEFAULT_FAILURE_THRESHOLD = 5
+    DEFAULT_RECOVERY_TIMEOUT = 5.0  # seconds
+    
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started_at: Optional[float] = None
+        self.stats = {
+            "trips": 0,
+            "rejected": 0,
+            "successes": 0,
+            "failures": 0
+        }
+    
+    @property
+    def state(self) -> CircuitState:
+        """Current state (an open circuit turns half-open once the recovery timeout passed)"""
+        if self.opened_at is None:
+            return CircuitState.CLOSED
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            return CircuitState.HALF_OPEN
+        return CircuitState.OPEN
+    
+    @property
+    def is_open(self) -> bool:
+        return self.state == CircuitState.OPEN
+    
+    def allow_request(self) -> bool:
+        """Check whether a call may go through (counts rejections)"""
+        state = self.state
+        if state == CircuitState.HALF_OPEN:
+            now = time.monotonic()
+            if self.probe_started_at is None or now - self.probe_started_at >= self.recovery_timeout:
+                self.probe_started_at = now
+                return True
+        if state != CircuitState.CLOSED:
+            self.stats["rejected"] += 1
+            return False
+        return True
+    
+    def record_success(self) -> None:
+        """Record a successful call and close the circuit"""
+        self.stats["successes"] += 1
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+    
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if the threshold is reached"""
+        self.stats["failures"] += 1
+        self.probe_started_at = None
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.stats["trips"] += 1
+            self.opened_at = time.monotonic()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get breaker state and counters"""
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self.consecutive_failures,
+            **self.stats
+        }
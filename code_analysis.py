@@ -0,0 +1,316 @@
+"""
+Code analysis - single-pass line scanning with per-language rules compiled once
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import re
+
+from python_analysis import analyze_python, summarize_structure
+
+
+DEFAULT_MAX_LINE_LENGTH = 120
+
+
+class LineRule:
+    """
+    An issue reported for every code line matching a pattern.
+    
+    `literal` is a substring every match contains; the pattern only runs on
+    lines containing it, which keeps regex matching off the hot path.
+    """
+    
+    __slots__ = ("literal", "pattern", "type", "severity", "message")
+    
+    def __init__(self, literal: str, pattern: str, type: str, severity: str, message: str):
+        self.literal = literal
+        self.pattern = re.compile(pattern)
+        self.type = type
+        self.severity = severity
+        self.message = message
+    
+    def issue(self, line: int) -> Dict[str, Any]:
+        """Build the issue reported for a matching line"""
+        return {"type": self.type, "severity": self.severity, "line": line, "message": self.message}
+
+
+class LanguageRules:
+    """
+    How the lines of one language are classified.
+    
+    Rules are compiled once when the module is imported and shared by every
+    scan; they are only matched against lines that are neither blank nor
+    comments.
+    """
+    
+    def __init__(
+        self,
+        comment_prefixes: Tuple[str, ...],
+        rules: Sequence[LineRule] = (),
+        max_line_length: int = DEFAULT_MAX_LINE_LENGTH
+    ):
+        self.comment_prefixes = comment_prefixes
+        self.rules = tuple(rules)
+        self.max_line_length = max_line_length
+
+
+_EVAL = LineRule("eval", r'\beval\s*\(', "security", "high", "Use of eval() on dynamic input")
+
+DEFAULT_RULES = LanguageRules(("//",))
+
+LANGUAGE_RULES: Dict[str, LanguageRules] = {
+    "python": LanguageRules(("#",), [
+        LineRule("except", r'^\s*except\s*:', "error_handling", "medium", "Bare except also catches SystemExit and KeyboardInterrupt"),
+        _EVAL
+    ]),
+    "javascript": LanguageRules(("//",), [
+        LineRule("var", r'\bvar\s', "style", "low", "Use let or const instead of var"),
+        _EVAL
+    ]),
+    "typescript": LanguageRules(("//",), [
+        LineRule("var", r'\bvar\s', "style", "low", "Use let or const instead of var"),
+        _EVAL
+    ])
+}
+
+
+def rules_for(language: str) -> LanguageRules:
+    """Get the compiled rules of a language (C-style comments if unknown)"""
+    return LANGUAGE_RULES.get(language, DEFAULT_RULES)
+
+
+def scan_code(code: str, language: str) -> Dict[str, Any]:
+    """
+    Compute line metrics and line-level issues in one pass over the code.
+    
+    Args:
+        code: Source code
+        language: Programming language selecting the rules
+    
+    Returns:
+        {"metrics": {lines_of_code, blank_lines, comment_lines, long_lines}, "issues": [...]}
+    """
+    rules = rules_for(language)
+    comment_prefixes = rules.comment_prefixes
+    max_line_length = rules.max_line_length
+    line_rules = rules.rules
+    long_line_message = f"Line too long (>{max_line_length} characters)"
+    
+    lines = code.split('\n')
+    blank_lines = comment_lines = long_lines = 0
+    issues: List[Dict[str, Any]] = []
+    for number, line in enumerate(lines, 1):
+        if len(line) > max_line_length:
+            long_lines += 1
+            issues.append({"type": "style", "severity": "low", "line": number, "message": long_line_message})
+        stripped = line.lstrip()
+        if not stripped:
+            blank_lines += 1
+        elif stripped.startswith(comment_prefixes):
+            comment_lines += 1
+        else:
+            for rule in line_rules:
+                if rule.literal in line and rule.pattern.search(line):
+                    issues.append(rule.issue(number))
+    
+    return {
+        "metrics": {
+            "lines_of_code": len(lines),
+            "blank_lines": blank_lines,
+            "comment_lines": comment_lines,
+            "long_lines": long_lines
+        },
+        "issues": issues
+    }
+
+
+def content_key(language: str, code: str) -> str:
+    """Cache key of an analysis: the language and a SHA-256 of the code"""
+    return f"{language}:{hashlib.sha256(code.encode('utf-8')).hexdigest()}"
+
+
+def analyze_source(code: str, language: str) -> Dict[str, Any]:
+    """
+    Scan the code and, for Python, add its structure from one AST parse.
+    
+    Returns:
+        scan_code's metrics and issues, plus "structure" for Python
+    """
+    result = scan_code(code, language)
+    if language == "python":
+        structure = analyze_python(code)
+        result["structure"] = structure
+        result["issues"] = sorted(result["issues"] + structure.pop("issues"), key=lambda issue: issue["line"])
+    return result
+
+
+def collapse_blank_lines(code: str) -> str:
+    """Collapse runs of blank lines into one"""
+    refactored_lines = []
+    prev_blank = False
+    
+    for line in code.split('\n'):
+        is_blank = not line.strip()
+        if not (is_blank and prev_blank):
+            refactored_lines.append(line)
+        prev_blank = is_blank
+    
+    return '\n'.join(refactored_lines)
+
+
+# A line starting at column 0 opens a top-level block, unless it continues
+# the previous one (closing bracket, else/elif/except/finally) or is a comment
+_BLOCK_START = re.compile(r'^(?=[^\s#)\]}])(?!(?:else|elif|except|finally)\b)', re.M)
+# Lines inside triple-quoted strings never open a block (a quote mismatched
+# here only makes blocks larger, or the analysis fall back to the whole file)
+_TRIPLE_QUOTED = re.compile(r'(\'\'\'|""").*?(?<!\\)\1', re.S)
+
+
+def split_blocks(code: str) -> List[Tuple[int, str]]:
+    """
+    Cut code into top-level blocks; decorators stay with what they decorate.
+    
+    Joining the block texts with newlines gives back the code.
+    
+    Returns:
+        (first line number, text) of every block
+    """
+    starts = [match.start() for match in _BLOCK_START.finditer(code)]
+    strings = [match.span() for match in _TRIPLE_QUOTED.finditer(code)]
+    if strings:
+        kept = []
+        string_index = 0
+        for start in starts:
+            while string_index < len(strings) and strings[string_index][1] <= start:
+                string_index += 1
+            if string_index == len(strings) or start <= strings[string_index][0]:
+                kept.append(start)
+        starts = kept
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    
+    blocks = []
+    line = 1
+    block_start = None
+    for index, start in enumerate(starts):
+        if block_start is None:
+            block_start = start
+        end = starts[index + 1] if index + 1 < len(starts) else None
+        if end is not None and code.startswith("@", start):
+            continue
+        # Each later block starts right after a newline, which joins the two
+        text = code[block_start:end - 1] if end is not None else code[block_start:]
+        blocks.append((line, text))
+        line += text.count("\n") + 1
+        block_start = None
+    return blocks
+
+
+def analyze_blocks(blocks: List[str], language: str) -> List[Dict[str, Any]]:
+    """Analyze each block on its own (line numbers relative to the block)"""
+    return [analyze_source(block, language) for block in blocks]
+
+
+async def _run_inline(func: Callable[..., Any], *args: Any, size: int = 0) -> Any:
+    return func(*args)
+
+
+class IncrementalAnalyzer:
+    """
+    Re-analyzes only the blocks of a file that changed since they were last seen.
+    
+    Files are cut with `split_blocks` and every block is analyzed on its own
+    and cached by content hash with block-relative line numbers, so blocks
+    that merely moved are reused. Re-analyzing an edit costs the changed
+    blocks plus hashing and merging; the file-level aggregates (totals,
+    import graph, complexity summary) are then rebuilt from the per-block
+    results. The merged result equals `analyze_source` on the whole file.
+    When a Python block does not parse on its own (a cut inside a multi-line
+    string or bracket, or a real syntax error) the file is analyzed whole.
+    """
+    
+    def __init__(self, cache: Any):
+        """
+        Initialize the analyzer.
+        
+        Args:
+            cache: Block results by content key (get/put(key, value, size=...))
+        """
+        self.cache = cache
+        self.stats = {
+            "analyses": 0,
+            "blocks": 0,
+            "blocks_reused": 0,
+            "blocks_analyzed": 0,
+            "fallbacks": 0
+        }
+    
+    async def analyze(
+        self,
+        code: str,
+        language: str,
+        run: Optional[Callable[..., Awaitable[Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze code, reusing cached results of unchanged blocks.
+        
+        Args:
+            code: Source code
+            language: Programming language
+            run: Coroutine run(func, *args, size=...) executing CPU-bound work (inline if None)
+        
+        Returns:
+            The same result as analyze_source(code, language)
+        """
+        run = run or _run_inline
+        self.stats["analyses"] += 1
+        blocks = split_blocks(code)
+        keys = [content_key(language, text) for _, text in blocks]
+        results = [self.cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+        self.stats["blocks"] += len(blocks)
+        self.stats["blocks_reused"] += len(blocks) - len(missing)
+        self.stats["blocks_analyzed"] += len(missing)
+        
+        if missing:
+            texts = [blocks[index][1] for index in missing]
+            fresh = await run(analyze_blocks, texts, language, size=sum(map(len, texts)))
+            for index, text, result in zip(missing, texts, fresh):
+                results[index] = result
+                self.cache.put(keys[index], result, size=len(text))
+        
+        if any(result.get("structure", {}).get("syntax_error") for result in results):
+            self.stats["fallbacks"] += 1
+            return await run(analyze_source, code, language, size=len(code))
+        return _merge([line for line, _ in blocks], results, language)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get block counters and the share of blocks reused"""
+        return {
+            **self.stats,
+            "reuse_rate": round(self.stats["blocks_reused"] / self.stats["blocks"], 4) if self.stats["blocks"] else 0.0
+        }
+
+
+def _merge(lines: List[int], results: List[Dict[str, Any]], language: str) -> Dict[str, Any]:
+    metrics = {"lines_of_code": 0, "blank_lines": 0, "comment_lines": 0, "long_lines": 0}
+    issues: List[Dict[str, Any]] = []
+    structure = {"functions": [], "classes": 0, "imports": [], "syntax_error": None} if language == "python" else None
+    imports = set()
+    for line, result in zip(lines, results):
+        offset = line - 1
+        for name, value in result["metrics"].items():
+            metrics[name] += value
+        issues.extend({**issue, "line": issue["line"] + offset} for issue in result["issues"])
+        if structure is not None:
+            block_structure = result["structure"]
+            structure["functions"].extend(
+                {**function, "line": function["line"] + offset} for function in block_structure["functions"]
+            )
+            structure["classes"] += block_structure["classes"]
+            imports.update(block_structure["imports"])
+    
+    merged = {"metrics": metrics, "issues": issues}
+    if structure is not None:
+        structure["imports"] = sorted(imports)
+        merged["structure"] = summarize_structure(structure)
+    return merged
@@ -0,0 +1,155 @@
+"""
+Payload Compression - Threshold-based compression for large inter-agent messages
+"""
+from typing import Any, Dict, Optional, Tuple
+import time
+import zlib
+
+from logger import logger
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# Header carrying the payload encoding; messages without it are plain JSON
+ENCODING_HEADER = "Content-Encoding"
+IDENTITY = "identity"
+
+
+class PayloadCompressor:
+    """
+    Compresses serialized payloads above a size threshold.
+    
+    The encoding travels in the Content-Encoding message header, so receivers
+    decode by header and plain messages (from older publishers) keep working.
+    Payloads that do not shrink by at least `min_ratio` are sent uncompressed
+    so receivers never pay decompression for nothing.
+    
+    Consumers that predate the header cannot read compressed payloads, so
+    compression is off by default. Roll it out in two steps: first deploy
+    header-aware consumers everywhere, then enable an algorithm on publishers.
+    """
+    
+    DEFAULT_ALGORITHM: Optional[str] = None
+    DEFAULT_THRESHOLD = 8192  # bytes
+    DEFAULT_MIN_RATIO = 1.2
+    
+    def __init__(
+        self,
+        algorithm: Optional[str] = DEFAULT_ALGORITHM,
+        threshold: int = DEFAULT_THRESHOLD,
+        level: Optional[int] = None,
+        min_ratio: float = DEFAULT_MIN_RATIO
+    ):
+        """
+        Initialize the compressor.
+        
+        Args:
+            algorithm: "zlib", "zstd" (needs the zstandard package) or None to disable
+            threshold: Minimum payload size in bytes worth compressing
+            level: Compression level (algorithm default if None)
+            min_ratio: Minimum original/compressed ratio to send compressed data
+        """
+        if algorithm == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard library not available. Falling back to zlib compression.")
+            algorithm = "zlib"
+        self.algorithm = algorithm if algorithm and algorithm != IDENTITY else None
+        self.threshold = threshold
+        self.level = level
+        self.min_ratio = min_ratio
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        
+        if self.algorithm == "zstd":
+            self._zstd_compressor = zstandard.ZstdCompressor(level=level or 3)
+    
+    def encode(self, data: bytes, key: str = "default") -> Tuple[bytes, Optional[Dict[str, str]]]:
+        """
+        Compress a payload if it is large enough.
+        
+        Args:
+            data: Serialized payload
+            key: Statistics bucket (e.g. the subject's agent type)
+        
+        Returns:
+            Payload to send and the headers to send with it (None if uncompressed)
+        """
+        stats = self._stats_for(key)
+        stats["messages"] += 1
+        stats["bytes_in"] += len(data)
+        
+        if not self.algorithm or len(data) < self.threshold:
+            stats["bytes_out"] += len(data)
+            return data, None
+        
+        start = time.perf_counter()
+        compressed = self._compress(data)
+        stats["compress_seconds"] += time.perf_counter() - start
+        
+        if len(data) < len(compressed) * self.min_ratio:
+            stats["incompressible"] += 1
+            stats["bytes_out"] += len(data)
+            return data, None
+        
+        stats["compressed"] += 1
+        stats["bytes_out"] += len(compressed)
+        return compressed, {ENCODING_HEADER: self.algorithm}
+    
+    def decode(self, data: bytes, headers: Optional[Dict[str, str]], key: str = "default") -> bytes:
+        """
+        Decompress a payload according to its Content-Encoding header.
+        
+        Raises:
+            ValueError: If the encoding is not supported
+        """
+        encoding = (headers or {}).get(ENCODING_HEADER, IDENTITY)
+        if encoding == IDENTITY:
+            return data
+        
+        start = time.perf_counter()
+        if encoding == "zlib":
+            decoded = zlib.decompress(data)
+        elif encoding == "zstd" and ZSTD_AVAILABLE:
+            decoded = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            raise ValueError(f"Unsupported payload encoding: {encoding}")
+        
+        stats = self._stats_for(key)
+        stats["decompressed"] += 1
+        stats["decompress_seconds"] += time.perf_counter() - start
+        return decoded
+    
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        """Get compression ratio and CPU cost per statistics bucket"""
+        report = {}
+        for key, stats in self.stats.items():
+            report[key] = {
+                **stats,
+                "ratio": round(stats["bytes_in"] / stats["bytes_out"], 3) if stats["bytes_out"] else 1.0,
+                "avg_compress_ms": round(1000 * stats["compress_seconds"] / stats["compressed"], 4)
+                if stats["compressed"] else 0.0,
+                "avg_decompress_ms": round(1000 * stats["decompress_seconds"] / stats["decompressed"], 4)
+                if stats["decompressed"] else 0.0
+            }
+        return report
+    
+    def _compress(self, data: bytes) -> bytes:
+        if self.algorithm == "zstd":
+            return self._zstd_compressor.compress(data)
+        return zlib.compress(data, self.level if self.level is not None else 6)
+    
+    def _stats_for(self, key: str) -> Dict[str, Any]:
+        if key not in self.stats:
+            self.stats[key] = {
+                "messages": 0,
+                "compressed": 0,
+                "incompressible": 0,
+                "decompressed": 0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "compress_seconds": 0.0,
+                "decompress_seconds": 0.0
+            }
+        return self.stats[key]
@@ -34,6 +34,11 @@ class Settings(BaseSettings):
     # NATS
     nats_servers: str = "nats://localhost:4222"
     
+    # Message broker: agents are spread over this many shard processes,
+    # each with its own NATS connection
+    broker_shards: int = 2
+    broker_data_dir: Optional[str] = None
+    
     # Security
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
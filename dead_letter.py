@@ -0,0 +1,323 @@
+"""
+Dead Letter Queue - Scheduled retries with exponential backoff for failed message deliveries
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from logger import logger
+import serialization
+
+
+# Returned by a deliver callback when the message reached its recipient too
+# late to be used (e.g. its successors were already released without it)
+LATE = "late"
+
+class DeadLetterQueue:
+    """
+    Retry scheduler and durable dead letter store for undeliverable messages.
+    
+    Failed deliveries are kept in a min-heap ordered by their next attempt time
+    and retried by a single background task, so retries never run on the
+    caller's routing path. Once a message has used up its attempts it is moved
+    to the dead letter store, an append-only JSON lines file that survives
+    restarts and can be inspected, replayed and purged.
+    """
+    
+    DEFAULT_MAX_ATTEMPTS = 5
+    DEFAULT_BASE_DELAY = 0.5  # seconds
+    DEFAULT_MAX_DELAY = 60.0  # seconds
+    
+    def __init__(
+        self,
+        deliver: Callable[[Dict[str, Any]], Awaitable[bool]],
+        path: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        jitter: bool = True,
+        prepare: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+    ):
+        """
+        Initialize the dead letter queue.
+        
+        Args:
+            deliver: Coroutine that retries a delivery and returns True on success
+                (or LATE if the message was dropped as arriving too late)
+            path: JSON lines file backing the dead letter store (None keeps it in memory)
+            max_attempts: Delivery attempts before a message is dead-lettered
+            base_delay: Delay before the first retry in seconds
+            max_delay: Upper bound for the backoff delay in seconds
+            jitter: Randomize delays to avoid synchronized retry storms
+            prepare: Applied to a message before it enters the dead letter store
+                (e.g. to inline values that would not outlive the store)
+        """
+        self.deliver = deliver
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.prepare = prepare
+        
+        # Messages waiting for a retry, keyed by message ID
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        # Messages that exhausted their attempts, in arrival order
+        self.dead_letters: Dict[str, Dict[str, Any]] = {}
+        
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "scheduled": 0,
+            "retried": 0,
+            "recovered": 0,
+            "late": 0,
+            "dead_lettered": 0,
+            "replayed": 0,
+            "purged": 0
+        }
+        
+        self._load()
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Get the delay before the given retry attempt.
+        
+        Exponential backoff with "equal jitter": half of the delay is fixed and
+        the other half is random, so retries spread out but never fire immediately.
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempt - 1)))
+        if self.jitter:
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        return delay
+    
+    def schedule(self, message: Dict[str, Any], error: str) -> Dict[str, Any]:
+        """
+        Schedule a retry for a failed delivery.
+        
+        Args:
+            message: Message that could not be delivered
+            error: Error describing the failure
+        
+        Returns:
+            Retry entry (moved to the dead letter store if attempts are exhausted)
+        """
+        message_id = message.get("message_id") or f"dlq_{self._counter + 1}"
+        entry = self.pending.get(message_id) or {
+            "message_id": message_id,
+            "message": message,
+            "attempts": 0,
+            "first_failure": datetime.now(timezone.utc).isoformat()
+        }
+        entry["attempts"] += 1
+        entry["last_error"] = error
+        
+        if entry["attempts"] >= self.max_attempts:
+            self.pending.pop(message_id, None)
+            return self.dead_letter(entry)
+        
+        delay = self.backoff_delay(entry["attempts"])
+        entry["next_attempt"] = time.monotonic() + delay
+        self.pending[message_id] = entry
+        self._push(entry)
+        self.stats["scheduled"] += 1
+        return entry
+    
+    def dead_letter(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Move an entry to the durable dead letter store"""
+        record = {
+            "message_id": entry["message_id"],
+            "message": self.prepare(entry["message"]) if self.prepare else entry["message"],
+            "attempts": entry["attempts"],
+            "last_error": entry.get("last_error"),
+            "first_failure": entry.get("first_failure"),
+            "dead_lettered_at": datetime.now(timezone.utc).isoformat()
+        }
+        self.dead_letters[record["message_id"]] = record
+        self.stats["dead_lettered"] += 1
+        self._append(record)
+        logger.warning(f"Message {record['message_id']} dead-lettered after {record['attempts']} attempts")
+        return record
+    
+    def list(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Inspect dead-lettered messages (oldest first)"""
+        records = list(self.dead_letters.values())
+        return records[offset:offset + limit]
+    
+    async def replay(self, message_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Redeliver dead-lettered messages.
+        
+        Args:
+            message_ids: Messages to replay (all if None)
+        
+        Returns:
+            Counts of replayed and still failing messages
+        """
+        ids = list(self.dead_letters) if message_ids is None else [m for m in message_ids if m in self.dead_letters]
+        replayed: List[str] = []
+        failed: List[str] = []
+        
+        for message_id in ids:
+            record = self.dead_letters[message_id]
+            try:
+                delivered = await self.deliver(record["message"])
+            except Exception as e:
+                logger.error(f"Replay of {message_id} failed: {e}", exc_info=True)
+                delivered = False
+            (replayed if delivered else failed).append(message_id)
+        
+        for message_id in replayed:
+            del self.dead_letters[message_id]
+        if replayed:
+            self.stats["replayed"] += len(replayed)
+            self._rewrite()
+        
+        return {"replayed": len(replayed), "failed": len(failed), "failed_ids": failed}
+    
+    def purge(self, message_ids: Optional[List[str]] = None) -> int:
+        """
+        Remove dead-lettered messages permanently.
+        
+        Args:
+            message_ids: Messages to purge (all if None)
+        
+        Returns:
+            Number of purged messages
+        """
+        if message_ids is None:
+            count = len(self.dead_letters)
+            self.dead_letters.clear()
+        else:
+            count = 0
+            for message_id in message_ids:
+                if self.dead_letters.pop(message_id, None) is not None:
+                    count += 1
+        if count:
+            self.stats["purged"] += count
+            self._rewrite()
+        return count
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get retry and dead letter statistics"""
+        return {
+            **self.stats,
+            "pending_retries": len(self.pending),
+            "dead_letters": len(self.dead_letters)
+        }
+    
+    async def stop(self) -> None:
+        """Stop the retry scheduler"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    # Scheduler internals
+    
+    def _push(self, entry: Dict[str, Any]) -> None:
+        """Add an entry to the timer heap and wake the scheduler if it is now first"""
+        self._counter += 1
+        heapq.heappush(self._heap, (entry["next_attempt"], self._counter, entry["message_id"]))
+        
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._heap[0][2] == entry["message_id"]:
+            self._wakeup.set()
+    
+    async def _run(self) -> None:
+        """Fire due retries in deadline order"""
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            due: List[Dict[str, Any]] = []
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due_at, _, message_id = heapq.heappop(self._heap)
+                entry = self.pending.get(message_id)
+                # Skip stale heap items left behind by rescheduling
+                if entry is not None and entry["next_attempt"] == due_at:
+                    due.append(entry)
+            
+            if due:
+                await asyncio.gather(*(self._retry(entry) for entry in due))
+    
+    async def _retry(self, entry: Dict[str, Any]) -> None:
+        """Retry a single delivery and reschedule it on failure"""
+        self.stats["retried"] += 1
+        try:
+            delivered = await self.deliver(entry["message"])
+            error = "Delivery failed"
+        except Exception as e:
+            delivered = False
+            error = str(e)
+        
+        if delivered == LATE:
+            # Retrying cannot help any more
+            self.pending.pop(entry["message_id"], None)
+            self.stats["late"] += 1
+        elif delivered:
+            self.pending.pop(entry["message_id"], None)
+            self.stats["recovered"] += 1
+        else:
+            self.schedule(entry["message"], error)
+    
+    # Durable store
+    
+    def _load(self) -> None:
+        """Load dead letters persisted by a previous run"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        record = serialization.loads(line)
+                        self.dead_letters[record["message_id"]] = record
+        except Exception as e:
+            logger.error(f"Failed to load dead letter queue from {self.path}: {e}", exc_info=True)
+    
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Append a record to the dead letter file"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'a') as f:
+                f.write(serialization.dumps(record) + "\n")
+        except Exception as e:
+            logger.error(f"Failed to persist dead letter: {e}", exc_info=True)
+    
+    def _rewrite(self) -> None:
+        """Compact the dead letter file after replays or purges"""
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                for record in self.dead_letters.values():
+                    f.write(serialization.dumps(record) + "\n")
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to compact dead letter queue: {e}", exc_info=True)
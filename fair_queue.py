@@ -0,0 +1,155 @@
+"""
+Fair Queue - Weighted fair queuing of agent mailboxes across tenants
+"""
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import heapq
+import time
+
+from traffic_stats import LatencyHistogram
+
+
+DEFAULT_TENANT = "default"
+
+
+def tenant_of(message: Dict[str, Any]) -> str:
+    """Tenant of a message: its tenant field, the payload's project, or the sender"""
+    payload = message.get("payload")
+    project = payload.get("project") if isinstance(payload, dict) else None
+    return str(message.get("tenant") or project or message.get("from") or DEFAULT_TENANT)
+
+
+class TenantQuotaExceeded(asyncio.QueueFull):
+    """Raised when a tenant already has its quota of messages queued"""
+    pass
+
+
+class _TenantState:
+    """Queue and counters of one tenant"""
+    
+    __slots__ = ("items", "last_finish", "stats", "latency")
+    
+    def __init__(self):
+        self.items: Deque[Tuple[float, float, Any]] = deque()
+        self.last_finish = 0.0
+        self.stats = {"enqueued": 0, "dequeued": 0, "dropped": 0}
+        self.latency = LatencyHistogram()
+
+
+class FairQueue(asyncio.Queue):
+    """
+    asyncio.Queue that serves tenants by weighted fair queuing.
+    
+    Every message gets a virtual finish tag of max(virtual time, the tenant's
+    previous tag) + 1 / weight, and the message with the smallest tag is
+    served next. A tenant with weight 2 therefore gets twice the service of a
+    tenant with weight 1 while both are backlogged, and a tenant flooding the
+    queue only delays itself. Each tenant may have at most `quota` messages
+    queued (0 = unlimited); puts beyond that raise TenantQuotaExceeded.
+    """
+    
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        quota: int = 0,
+        default_weight: float = 1.0,
+        tenant_key: Callable[[Any], str] = tenant_of,
+        maxsize: int = 0
+    ):
+        """
+        Initialize the queue.
+        
+        Args:
+            weights: Weight per tenant (default_weight for tenants not listed)
+            quota: Maximum queued messages per tenant (0 = unlimited)
+            default_weight: Weight of unlisted tenants
+            tenant_key: Function returning the tenant of an item
+            maxsize: Maximum total queued messages (0 = unlimited)
+        """
+        self.weights = dict(weights or {})
+        self.quota = quota
+        self.default_weight = default_weight
+        self.tenant_key = tenant_key
+        super().__init__(maxsize)
+    
+    # asyncio.Queue storage hooks (qsize, empty and _format read the storage directly)
+    
+    def _init(self, maxsize: int) -> None:
+        self._tenants: Dict[str, _TenantState] = {}
+        self._heads: List[Tuple[float, int, str]] = []
+        self._size = 0
+        self._virtual_time = 0.0
+        self._order = 0
+    
+    def _qsize(self) -> int:
+        return self._size
+    
+    def _put(self, item: Any) -> None:
+        tenant = self.tenant_key(item)
+        state = self._tenant(tenant)
+        finish = max(self._virtual_time, state.last_finish) + 1.0 / self.weights.get(tenant, self.default_weight)
+        state.last_finish = finish
+        state.items.append((finish, time.monotonic(), item))
+        state.stats["enqueued"] += 1
+        self._size += 1
+        if len(state.items) == 1:
+            self._push_head(tenant, finish)
+    
+    def _get(self) -> Any:
+        _, _, tenant = heapq.heappop(self._heads)
+        state = self._tenants[tenant]
+        finish, enqueued_at, item = state.items.popleft()
+        self._virtual_time = finish
+        self._size -= 1
+        state.stats["dequeued"] += 1
+        state.latency.record(time.monotonic() - enqueued_at)
+        if state.items:
+            self._push_head(tenant, state.items[0][0])
+        return item
+    
+    def _format(self) -> str:
+        return f"maxsize={self._maxsize!r} tenants={len(self._tenants)} size={self._size}"
+    
+    def qsize(self) -> int:
+        """Number of items queued across all tenants"""
+        return self._size
+    
+    def empty(self) -> bool:
+        """Return True if no tenant has messages queued"""
+        return not self._size
+    
+    def put_nowait(self, item: Any) -> None:
+        """Queue an item, enforcing the tenant quota"""
+        if self.quota:
+            tenant = self.tenant_key(item)
+            state = self._tenant(tenant)
+            if len(state.items) >= self.quota:
+                state.stats["dropped"] += 1
+                raise TenantQuotaExceeded(f"Tenant {tenant} has {self.quota} messages queued")
+        super().put_nowait(item)
+    
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        """Get counters and queueing latency per tenant"""
+        return {
+            tenant: {
+                **state.stats,
+                "queued": len(state.items),
+                "weight": self.weights.get(tenant, self.default_weight),
+                "wait_ms": {
+                    "p50": round(1000 * state.latency.quantile(0.5), 4),
+                    "p99": round(1000 * state.latency.quantile(0.99), 4)
+                }
+            }
+            for tenant, state in self._tenants.items()
+        }
+    
+    def _tenant(self, tenant: str) -> _TenantState:
+        state = self._tenants.get(tenant)
+        if state is None:
+            state = self._tenants[tenant] = _TenantState()
+        return state
+    
+    def _push_head(self, tenant: str, finish: float) -> None:
+        self._order += 1
+        heapq.heappush(self._heads, (finish, self._order, tenant))
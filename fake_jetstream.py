@@ -0,0 +1,617 @@
+"""
+Fake JetStream - In-process stand-in for NATS JetStream used in tests and benchmarks
+"""
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from collections import OrderedDict, deque
+from datetime import datetime
+import asyncio
+import heapq
+import time
+
+
+class FakeJetStreamError(Exception):
+    """Raised for JetStream API errors (mirrors nats.js.errors.APIError)"""
+    pass
+
+
+class NoStreamResponseError(FakeJetStreamError):
+    """Raised when no stream is bound to a published subject"""
+    pass
+
+
+class NoRespondersError(FakeJetStreamError):
+    """Raised when the fake server is unavailable"""
+    pass
+
+
+def subject_matches(pattern: str, subject: str) -> bool:
+    """Match a subject against a NATS pattern ('*' matches one token, '>' the rest)"""
+    pattern_tokens = pattern.split(".")
+    subject_tokens = subject.split(".")
+    for i, token in enumerate(pattern_tokens):
+        if token == ">":
+            return len(subject_tokens) > i
+        if i >= len(subject_tokens):
+            return False
+        if token != "*" and token != subject_tokens[i]:
+            return False
+    return len(pattern_tokens) == len(subject_tokens)
+
+
+def _config_value(config: Any, key: str, default: Any) -> Any:
+    """Read a consumer setting from a dict or a nats.js.api.ConsumerConfig"""
+    value = config.get(key) if isinstance(config, dict) else getattr(config, key, None)
+    if value is None:
+        return default
+    # DeliverPolicy and friends are str enums
+    return getattr(value, "value", value)
+
+
+def _start_time(value: Any) -> float:
+    """Convert an opt_start_time (epoch seconds or RFC 3339 string) to epoch seconds"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class PubAck:
+    """Publish acknowledgment returned by FakeJetStream.publish"""
+    
+    def __init__(self, stream: str, seq: int, duplicate: bool = False):
+        self.stream = stream
+        self.seq = seq
+        self.duplicate = duplicate
+
+
+class SequencePair:
+    """Stream and consumer sequence of a delivered message"""
+    
+    def __init__(self, stream: int, consumer: int):
+        self.stream = stream
+        self.consumer = consumer
+
+
+class MsgMetadata:
+    """Delivery metadata attached to every message (mirrors nats.aio.msg.Msg.Metadata)"""
+    
+    def __init__(self, stream: str, consumer: str, sequence: SequencePair,
+                 num_pending: int, num_delivered: int, timestamp: float):
+        self.stream = stream
+        self.consumer = consumer
+        self.sequence = sequence
+        self.num_pending = num_pending
+        self.num_delivered = num_delivered
+        self.timestamp = timestamp
+
+
+class ConsumerInfo:
+    """Consumer state snapshot (mirrors nats.js.api.ConsumerInfo)"""
+    
+    def __init__(self, stream_name: str, name: str, num_pending: int, num_ack_pending: int,
+                 num_redelivered: int, delivered: SequencePair, ack_floor: SequencePair):
+        self.stream_name = stream_name
+        self.name = name
+        self.num_pending = num_pending
+        self.num_ack_pending = num_ack_pending
+        self.num_redelivered = num_redelivered
+        self.delivered = delivered
+        self.ack_floor = ack_floor
+
+
+class StoredMessage:
+    """Message persisted in a fake stream"""
+    
+    __slots__ = ("seq", "subject", "data", "headers", "timestamp")
+    
+    def __init__(self, seq: int, subject: str, data: bytes, headers: Optional[Dict[str, str]], timestamp: float):
+        self.seq = seq
+        self.subject = subject
+        self.data = data
+        self.headers = headers
+        self.timestamp = timestamp
+
+
+class FakeMsg:
+    """Message delivered to a subscription callback"""
+    
+    def __init__(self, consumer: "FakeConsumer", stored: StoredMessage, metadata: MsgMetadata):
+        self._consumer = consumer
+        self.subject = stored.subject
+        self.data = stored.data
+        self.headers = stored.headers
+        self.metadata = metadata
+        self._ackd = False
+    
+    def _check_ackd(self) -> None:
+        if self._ackd:
+            raise FakeJetStreamError("message was already acknowledged")
+        self._ackd = True
+    
+    async def ack(self) -> None:
+        """Acknowledge the message"""
+        self._check_ackd()
+        self._consumer._ack(self.metadata.sequence.stream)
+    
+    async def nak(self, delay: Optional[float] = None) -> None:
+        """Negatively acknowledge the message so it is redelivered (after delay seconds)"""
+        self._check_ackd()
+        self._consumer._nak(self.metadata.sequence.stream, delay)
+    
+    async def term(self) -> None:
+        """Stop redelivery of the message"""
+        self._check_ackd()
+        self._consumer._ack(self.metadata.sequence.stream, terminated=True)
+    
+    async def in_progress(self) -> None:
+        """Reset the ack wait timer"""
+        self._consumer._touch(self.metadata.sequence.stream)
+
+
+class FakeStream:
+    """Stream with limits-based retention"""
+    
+    def __init__(self, name: str, subjects: List[str], max_msgs: int = -1, max_bytes: int = -1,
+                 max_age: float = 0, max_msg_size: int = -1, discard: str = "old",
+                 duplicate_window: float = 120.0):
+        self.name = name
+        self.subjects = subjects
+        self.max_msgs = max_msgs
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_msg_size = max_msg_size
+        self.discard = discard
+        self.duplicate_window = duplicate_window
+        
+        self.messages: "OrderedDict[int, StoredMessage]" = OrderedDict()
+        self.bytes = 0
+        self.last_seq = 0
+        self.consumers: Dict[str, "FakeConsumer"] = {}
+        self._msg_ids: "OrderedDict[str, tuple]" = OrderedDict()
+    
+    def matches(self, subject: str) -> bool:
+        return any(subject_matches(pattern, subject) for pattern in self.subjects)
+    
+    def covers(self, filter_subject: str) -> bool:
+        """Check whether a consumer filter (which may contain wildcards) falls inside this stream"""
+        # Wildcard tokens in the filter behave like any concrete token would
+        return self.matches(filter_subject.replace(">", "_").replace("*", "_"))
+    
+    def store(self, subject: str, data: bytes, headers: Optional[Dict[str, str]]) -> PubAck:
+        """Store a message, enforcing limits, and notify matching consumers"""
+        now = time.time()
+        
+        # Deduplicate on Nats-Msg-Id within the duplicate window
+        msg_id = (headers or {}).get("Nats-Msg-Id")
+        if msg_id:
+            while self._msg_ids and next(iter(self._msg_ids.values()))[1] < now - self.duplicate_window:
+                self._msg_ids.popitem(last=False)
+            if msg_id in self._msg_ids:
+                return PubAck(self.name, self._msg_ids[msg_id][0], duplicate=True)
+        
+        if 0 <= self.max_msg_size < len(data):
+            raise FakeJetStreamError("message size exceeds maximum allowed")
+        
+        self._expire(now)
+        if self.discard == "new" and (
+            (0 <= self.max_msgs <= len(self.messages)) or (0 <= self.max_bytes < self.bytes + len(data))
+        ):
+            raise FakeJetStreamError("maximum messages exceeded")
+        
+        self.last_seq += 1
+        stored = StoredMessage(self.last_seq, subject, data, headers, now)
+        self.messages[stored.seq] = stored
+        self.bytes += len(data)
+        if msg_id:
+            self._msg_ids[msg_id] = (stored.seq, now)
+        
+        while (0 <= self.max_msgs < len(self.messages)) or (0 <= self.max_bytes < self.bytes):
+            self._evict_oldest()
+        
+        for consumer in self.consumers.values():
+            consumer._on_stored(stored)
+        return PubAck(self.name, stored.seq)
+    
+    def get(self, seq: int) -> Optional[StoredMessage]:
+        """Get a stored message (None if it expired or was evicted)"""
+        self._expire(time.time())
+        return self.messages.get(seq)
+    
+    def _expire(self, now: float) -> None:
+        if self.max_age <= 0:
+            return
+        while self.messages and next(iter(self.messages.values())).timestamp < now - self.max_age:
+            self._evict_oldest()
+    
+    def _evict_oldest(self) -> None:
+        _, stored = self.messages.popitem(last=False)
+        self.bytes -= len(stored.data)
+    
+    def info(self) -> Dict[str, Any]:
+        self._expire(time.time())
+        return {
+            "name": self.name,
+            "subjects": list(self.subjects),
+            "messages": len(self.messages),
+            "bytes": self.bytes,
+            "first_seq": next(iter(self.messages), self.last_seq + 1),
+            "last_seq": self.last_seq,
+            "consumer_count": len(self.consumers)
+        }
+
+
+class FakeConsumer:
+    """
+    Push consumer with explicit acks.
+    
+    Messages are delivered round-robin to the bound subscriptions (a queue
+    group when more than one is bound). Unacknowledged messages are redelivered
+    after ack_wait, nak'd messages after their nak delay, up to max_deliver times.
+    """
+    
+    def __init__(self, stream: FakeStream, name: str, filter_subject: str, durable: bool,
+                 ack_wait: float = 30.0, max_deliver: int = -1, max_ack_pending: int = 1000,
+                 deliver_policy: str = "all", opt_start_seq: int = 0, opt_start_time: float = 0.0):
+        self.stream = stream
+        self.name = name
+        self.filter_subject = filter_subject
+        self.durable = durable
+        self.ack_wait = ack_wait
+        self.max_deliver = max_deliver
+        self.max_ack_pending = max_ack_pending
+        
+        self.subscriptions: List["FakeSubscription"] = []
+        self._next_subscription = 0
+        # Stream sequences matching the filter that were never delivered
+        self._backlog: Deque[int] = deque(
+            seq for seq, stored in stream.messages.items()
+            if deliver_policy != "new"
+            and seq >= opt_start_seq
+            and stored.timestamp >= opt_start_time
+            and subject_matches(filter_subject, stored.subject)
+        )
+        # Delivered but unacknowledged: stream seq -> [deliveries, deadline]
+        self._pending: Dict[int, List[float]] = {}
+        self._timers: List[tuple] = []
+        self._consumer_seq = 0
+        self._delivered_stream_seq = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "delivered": 0,
+            "redelivered": 0,
+            "acked": 0,
+            "nacked": 0,
+            "terminated": 0,
+            "max_deliver_exceeded": 0
+        }
+    
+    def _on_stored(self, stored: StoredMessage) -> None:
+        if subject_matches(self.filter_subject, stored.subject):
+            self._backlog.append(stored.seq)
+            self._wakeup.set()
+    
+    def bind(self, subscription: "FakeSubscription") -> None:
+        self.subscriptions.append(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+        self._wakeup.set()
+    
+    def unbind(self, subscription: "FakeSubscription") -> None:
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        if not self.subscriptions and self._task:
+            self._task.cancel()
+            self._task = None
+    
+    def info(self) -> ConsumerInfo:
+        ack_floor = min(self._pending) - 1 if self._pending else self._delivered_stream_seq
+        return ConsumerInfo(
+            stream_name=self.stream.name,
+            name=self.name,
+            num_pending=len(self._backlog),
+            num_ack_pending=len(self._pending),
+            num_redelivered=self.stats["redelivered"],
+            delivered=SequencePair(self._delivered_stream_seq, self._consumer_seq),
+            ack_floor=SequencePair(ack_floor, 0)
+        )
+    
+    # Ack handling
+    
+    def _ack(self, seq: int, terminated: bool = False) -> None:
+        if self._pending.pop(seq, None) is not None:
+            self.stats["terminated" if terminated else "acked"] += 1
+            self._wakeup.set()
+    
+    def _nak(self, seq: int, delay: Optional[float]) -> None:
+        entry = self._pending.get(seq)
+        if entry is None:
+            return
+        self.stats["nacked"] += 1
+        entry[1] = time.monotonic() + (delay or 0)
+        heapq.heappush(self._timers, (entry[1], seq))
+        self._wakeup.set()
+    
+    def _touch(self, seq: int) -> None:
+        entry = self._pending.get(seq)
+        if entry is not None:
+            entry[1] = time.monotonic() + self.ack_wait
+            heapq.heappush(self._timers, (entry[1], seq))
+    
+    # Delivery
+    
+    async def _dispatch(self) -> None:
+        """Deliver redeliveries and new messages to bound subscriptions"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            
+            # Redeliveries first (nak'd or ack_wait expired)
+            while self._timers and self._timers[0][0] <= now:
+                deadline, seq = heapq.heappop(self._timers)
+                entry = self._pending.get(seq)
+                if entry is None or entry[1] != deadline:
+                    continue
+                if 0 < self.max_deliver <= entry[0]:
+                    del self._pending[seq]
+                    self.stats["max_deliver_exceeded"] += 1
+                    continue
+                self._deliver(seq, redelivery=True)
+            
+            while self._backlog and len(self._pending) < self.max_ack_pending:
+                self._deliver(self._backlog.popleft(), redelivery=False)
+            
+            timeout = self._timers[0][0] - now if self._timers else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _deliver(self, seq: int, redelivery: bool) -> None:
+        stored = self.stream.get(seq)
+        if stored is None:
+            # Expired or evicted by stream limits
+            self._pending.pop(seq, None)
+            return
+        
+        entry = self._pending.setdefault(seq, [0, 0.0])
+        entry[0] += 1
+        entry[1] = time.monotonic() + self.ack_wait
+        heapq.heappush(self._timers, (entry[1], seq))
+        
+        self._consumer_seq += 1
+        self._delivered_stream_seq = max(self._delivered_stream_seq, seq)
+        self.stats["delivered"] += 1
+        if redelivery:
+            self.stats["redelivered"] += 1
+        
+        metadata = MsgMetadata(
+            stream=self.stream.name,
+            consumer=self.name,
+            sequence=SequencePair(seq, self._consumer_seq),
+            num_pending=len(self._backlog),
+            num_delivered=int(entry[0]),
+            timestamp=stored.timestamp
+        )
+        subscription = self.subscriptions[self._next_subscription % len(self.subscriptions)]
+        self._next_subscription += 1
+        subscription._queue.put_nowait(FakeMsg(self, stored, metadata))
+
+
+class FakeSubscription:
+    """Push subscription running its callback for one message at a time"""
+    
+    def __init__(self, consumer: FakeConsumer, cb: Callable[[FakeMsg], Awaitable[None]],
+                 manual_ack: bool, queue: Optional[str] = None):
+        self._consumer = consumer
+        self._cb = cb
+        self._manual_ack = manual_ack
+        self.queue = queue
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        consumer.bind(self)
+    
+    async def _run(self) -> None:
+        while True:
+            msg = await self._queue.get()
+            try:
+                await self._cb(msg)
+                if not self._manual_ack and not msg._ackd:
+                    await msg.ack()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Callback errors leave the message unacked; it is redelivered after ack_wait
+                pass
+    
+    async def consumer_info(self) -> ConsumerInfo:
+        """Get the bound consumer's state"""
+        return self._consumer.info()
+    
+    async def unsubscribe(self) -> None:
+        """Stop receiving messages (durable consumers keep their state)"""
+        self._task.cancel()
+        self._consumer.unbind(self)
+        if not self._consumer.durable and not self._consumer.subscriptions:
+            self._consumer.stream.consumers.pop(self._consumer.name, None)
+
+
+class FakeJetStream:
+    """JetStream context (subset of nats.js.JetStreamContext used by the agents)"""
+    
+    def __init__(self, server: "FakeJetStreamServer", client: "FakeNATSClient"):
+        self._server = server
+        self._client = client
+    
+    async def add_stream(self, name: str, subjects: Optional[List[str]] = None, **config: Any) -> Dict[str, Any]:
+        """Create a stream (or return the existing one)"""
+        self._server._check_available()
+        if name not in self._server.streams:
+            self._server.streams[name] = FakeStream(
+                name,
+                subjects or [name],
+                max_msgs=config.get("max_msgs", -1),
+                max_bytes=config.get("max_bytes", -1),
+                max_age=config.get("max_age", 0),
+                max_msg_size=config.get("max_msg_size", -1),
+                discard=config.get("discard", "old"),
+                duplicate_window=config.get("duplicate_window", 120.0)
+            )
+        return self._server.streams[name].info()
+    
+    async def stream_info(self, name: str) -> Dict[str, Any]:
+        """Get stream state"""
+        return self._server._stream(name).info()
+    
+    async def delete_stream(self, name: str) -> bool:
+        """Delete a stream and its consumers"""
+        stream = self._server._stream(name)
+        for consumer in list(stream.consumers.values()):
+            for subscription in list(consumer.subscriptions):
+                await subscription.unsubscribe()
+        del self._server.streams[name]
+        return True
+    
+    async def publish(self, subject: str, payload: bytes = b"", timeout: Optional[float] = None,
+                      stream: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> PubAck:
+        """Publish a message to the stream bound to the subject"""
+        self._server._check_available()
+        self._server.stats["published"] += 1
+        for candidate in self._server.streams.values():
+            if (stream is None or candidate.name == stream) and candidate.matches(subject):
+                return candidate.store(subject, payload, headers)
+        raise NoStreamResponseError(f"no stream bound to subject {subject}")
+    
+    async def get_msg(self, stream_name: str, seq: int) -> StoredMessage:
+        """Get a stored message by stream sequence"""
+        stored = self._server._stream(stream_name).get(seq)
+        if stored is None:
+            raise FakeJetStreamError(f"no message found for sequence {seq}")
+        return stored
+    
+    async def consumer_info(self, stream: str, consumer: str) -> ConsumerInfo:
+        """Get consumer state"""
+        consumers = self._server._stream(stream).consumers
+        if consumer not in consumers:
+            raise FakeJetStreamError(f"consumer not found: {consumer}")
+        return consumers[consumer].info()
+    
+    async def subscribe(
+        self,
+        subject: str,
+        queue: Optional[str] = None,
+        cb: Optional[Callable[[FakeMsg], Awaitable[None]]] = None,
+        durable: Optional[str] = None,
+        stream: Optional[str] = None,
+        manual_ack: bool = False,
+        deliver_policy: Optional[str] = None,
+        config: Optional[Any] = None,
+        **kwargs: Any
+    ) -> FakeSubscription:
+        """
+        Create a push subscription.
+        
+        Subscriptions using the same durable name (or queue group) bind to the
+        same consumer and share its messages.
+        
+        Raises:
+            ValueError: If a queue group and a differently named durable are both given
+        """
+        self._server._check_available()
+        if cb is None:
+            raise FakeJetStreamError("a callback is required by the fake JetStream")
+        
+        stream_obj = self._server._stream(stream) if stream else next(
+            (candidate for candidate in self._server.streams.values() if candidate.covers(subject)),
+            None
+        )
+        if stream_obj is None:
+            raise NoStreamResponseError(f"no stream matches subject {subject}")
+        
+        if queue and durable and durable != queue:
+            # As nats-py: a queue group binds to the durable of the same name
+            raise ValueError(f"cannot create queue subscription '{queue}' to consumer '{durable}'")
+        
+        config = config or {}
+        name = durable or queue
+        consumer = stream_obj.consumers.get(name) if name else None
+        if consumer is None:
+            self._server._ephemeral_count += 1
+            name = name or f"ephemeral_{self._server._ephemeral_count}"
+            consumer = FakeConsumer(
+                stream_obj,
+                name,
+                filter_subject=subject,
+                durable=bool(durable or queue),
+                ack_wait=_config_value(config, "ack_wait", self._server.ack_wait),
+                max_deliver=_config_value(config, "max_deliver", -1),
+                max_ack_pending=_config_value(config, "max_ack_pending", 1000),
+                deliver_policy=deliver_policy or _config_value(config, "deliver_policy", "all"),
+                opt_start_seq=_config_value(config, "opt_start_seq", 0),
+                opt_start_time=_start_time(_config_value(config, "opt_start_time", 0.0))
+            )
+            stream_obj.consumers[name] = consumer
+        elif consumer.filter_subject != subject:
+            raise FakeJetStreamError(f"consumer {name} is bound to subject {consumer.filter_subject}")
+        
+        subscription = FakeSubscription(consumer, cb, manual_ack, queue)
+        self._client._subscriptions.append(subscription)
+        return subscription
+
+
+class FakeNATSClient:
+    """NATS client connected to a FakeJetStreamServer"""
+    
+    def __init__(self, server: "FakeJetStreamServer"):
+        self._server = server
+        self._subscriptions: List[FakeSubscription] = []
+        self.is_closed = False
+    
+    @property
+    def is_connected(self) -> bool:
+        return not self.is_closed and self._server.available
+    
+    def jetstream(self, **kwargs: Any) -> FakeJetStream:
+        return FakeJetStream(self._server, self)
+    
+    async def close(self) -> None:
+        for subscription in self._subscriptions:
+            await subscription.unsubscribe()
+        self._subscriptions.clear()
+        self.is_closed = True
+
+
+class FakeJetStreamServer:
+    """
+    In-process JetStream server shared by any number of clients.
+    
+    Pass `server.connect` as the "nats_connect" option of CommunicationAgent to
+    run the JetStream code paths without a NATS server. Setting `available`
+    to False makes every API call fail, which simulates a broker outage.
+    """
+    
+    DEFAULT_ACK_WAIT = 30.0  # seconds
+    
+    def __init__(self, ack_wait: float = DEFAULT_ACK_WAIT):
+        self.ack_wait = ack_wait
+        self.streams: Dict[str, FakeStream] = {}
+        self.available = True
+        self.stats = {"connections": 0, "published": 0}
+        self._ephemeral_count = 0
+    
+    async def connect(self, servers: Any = None, **kwargs: Any) -> FakeNATSClient:
+        """Connect a client (same call signature as nats.connect)"""
+        self._check_available()
+        self.stats["connections"] += 1
+        return FakeNATSClient(self)
+    
+    def _check_available(self) -> None:
+        if not self.available:
+            raise NoRespondersError("nats: no responders available for request")
+    
+    def _stream(self, name: str) -> FakeStream:
+        self._check_available()
+        if name not in self.streams:
+            raise FakeJetStreamError(f"stream not found: {name}")
+        return self.streams[name]
@@ -0,0 +1,413 @@
+"""
+Generation Cache - Content-addressed LRU/TTL cache for generated code, with a shared second level
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from enum import Enum
+import asyncio
+import hashlib
+import json
+import time
+import zlib
+
+from logger import logger
+from traffic_stats import LatencyHistogram
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def cache_key(language: str, specification: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Stable cache key of a generation request.
+    
+    The key is a SHA-256 over the canonical JSON of language, specification
+    and options, so it is the same in every process and across restarts.
+    """
+    canonical = json.dumps(
+        [language, specification, options or {}],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return f"{language}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class GenerationCache:
+    """
+    LRU cache of generated code bounded by entry count and total bytes.
+    
+    Entries expire `ttl` seconds after they were stored (0 = never). Expired
+    entries are dropped when looked up or by `purge_expired()`.
+    """
+    
+    DEFAULT_MAX_ENTRIES = 1000
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    DEFAULT_TTL = 3600.0  # seconds
+    
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and not self._expired(entry, time.monotonic())
+    
+    def get(self, key: str, now: Optional[float] = None) -> Optional[Any]:
+        """Look up code, refreshing its LRU position (None on a miss)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if self._expired(entry, time.monotonic() if now is None else now):
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+    
+    def put(self, key: str, code: Any, now: Optional[float] = None, size: Optional[int] = None) -> None:
+        """Store code (or any value of the given size), evicting least recently used entries to stay within bounds"""
+        size = len(code.encode("utf-8")) if size is None else size
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (code, time.monotonic() if now is None else now, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+    
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Drop expired entries (returns how many were dropped)"""
+        now = time.monotonic() if now is None else now
+        expired = [key for key, entry in self._entries.items() if self._expired(entry, now)]
+        for key in expired:
+            self._remove(key)
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+    
+    def clear(self) -> None:
+        """Drop every entry"""
+        self._entries.clear()
+        self.bytes = 0
+    
+    def _expired(self, entry: Tuple[Any, float, int], now: float) -> bool:
+        return bool(self.ttl) and now - entry[1] >= self.ttl
+    
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current size"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+
+class CachedGenerationFailure(Exception):
+    """A generation failed recently and the failure is still cached"""
+    pass
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+    
+    Callers arriving while a call for their key is in flight wait for that
+    call and share its result or exception instead of starting their own.
+    If the caller running the call is cancelled, the waiters elect a new one
+    among themselves rather than failing with it.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "abandoned": 0}
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+    
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `call` for a key, or join the call already running for it.
+        
+        Returns:
+            The call's result and whether it was shared with an earlier caller
+        """
+        future = self._calls.get(key)
+        while future is not None:
+            self.stats["coalesced"] += 1
+            try:
+                # Shielded so a cancelled waiter does not cancel the shared call
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled: the first waiter to wake up runs the call
+                future = self._calls.get(key)
+        
+        with self.lead(key) as future:
+            result = await call()
+            future.set_result(result)
+        return result, False
+    
+    @contextmanager
+    def lead(self, key: str) -> Iterator[asyncio.Future]:
+        """
+        Run the call for a key in the caller's own code.
+        
+        Callers of `do` join it until the block exits. The result must be set
+        on the yielded future; an exception leaving the block is shared with
+        them, while cancellation (or closing a generator) abandons the call.
+        
+        Raises:
+            RuntimeError: If a call for the key is already in flight
+        """
+        if key in self._calls:
+            raise RuntimeError(f"A call for {key} is already in flight")
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.stats["calls"] += 1
+        try:
+            yield future
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody joined the call
+            future.exception()
+            raise
+        except BaseException:
+            self.stats["abandoned"] += 1
+            future.cancel()
+            raise
+        finally:
+            del self._calls[key]
+            if not future.done():
+                # Left without a result: waiters elect a new leader
+                future.cancel()
+
+
+class InMemoryKeyValueStore:
+    """
+    In-process stand-in for a Redis-style key-value store.
+    
+    Implements the subset of the redis.asyncio client used by
+    SharedGenerationCache (get, set with ex, delete, incrby), so a single
+    instance shared by several agents behaves like one Redis server.
+    """
+    
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self.stats = {"gets": 0, "sets": 0}
+    
+    async def get(self, key: str) -> Optional[bytes]:
+        self.stats["gets"] += 1
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+    
+    async def set(self, key: str, value: Any, ex: Optional[float] = None) -> bool:
+        self.stats["sets"] += 1
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+    
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+    
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        value = int((await self.get(key)) or 0) + amount
+        self._data[key] = (value, None)
+        return value
+
+
+def connect_shared_backend(url: str) -> Optional[Any]:
+    """Create a Redis client for the shared cache (None if the redis library is missing)"""
+    if not REDIS_AVAILABLE:
+        logger.warning("redis library not available. Shared generation cache disabled.")
+        return None
+    return aioredis.from_url(url)
+
+
+class CacheLookup(Enum):
+    """Outcome of a shared cache lookup"""
+    HIT = "hit"
+    NEGATIVE = "negative"
+    MISS = "miss"
+
+
+class SharedGenerationCache:
+    """
+    Second-level generation cache shared by all replicas.
+    
+    Wraps any Redis-style async client (get / set(ex=...) / incrby). Code is
+    stored zlib-compressed; failed generations are cached for a short
+    `negative_ttl` so a broken specification is not retried by every
+    replica. Backend errors are logged and treated as misses, so the shared
+    cache can never fail a generation. Lookup counts of all replicas are
+    summed in the backend, giving the cluster-wide hit rate.
+    """
+    
+    DEFAULT_TTL = 86400  # seconds
+    DEFAULT_NEGATIVE_TTL = 60  # seconds
+    DEFAULT_PREFIX = "codegen:"
+    CODE_TAG = b"C"
+    FAILURE_TAG = b"E"
+    
+    def __init__(
+        self,
+        backend: Any,
+        ttl: int = DEFAULT_TTL,
+        negative_ttl: int = DEFAULT_NEGATIVE_TTL,
+        prefix: str = DEFAULT_PREFIX,
+        compression_level: int = 6
+    ):
+        """
+        Initialize the shared cache.
+        
+        Args:
+            backend: Redis-style async client (e.g. redis.asyncio.Redis or InMemoryKeyValueStore)
+            ttl: Lifetime of cached code in seconds
+            negative_ttl: Lifetime of cached failures in seconds
+            prefix: Key prefix in the backend
+            compression_level: zlib level for stored code
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self.compression_level = compression_level
+        self.latency = LatencyHistogram()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "stores": 0,
+            "failures_stored": 0,
+            "errors": 0,
+            "bytes_raw": 0,
+            "bytes_stored": 0
+        }
+        self._unflushed = {"lookups": 0, "hits": 0}
+        self.cluster = {"lookups": 0, "hits": 0}
+    
+    async def get(self, key: str) -> Tuple[CacheLookup, Optional[str]]:
+        """
+        Look up a key.
+        
+        Returns:
+            (HIT, code), (NEGATIVE, error message) or (MISS, None)
+        """
+        started = time.perf_counter()
+        try:
+            value = await self.backend.get(self.prefix + key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Shared generation cache lookup failed: {e}")
+            return CacheLookup.MISS, None
+        finally:
+            self.latency.record(time.perf_counter() - started)
+        
+        if not value:
+            self.stats["misses"] += 1
+            return CacheLookup.MISS, None
+        tag, body = value[:1], value[1:]
+        if tag == self.FAILURE_TAG:
+            self.stats["negative_hits"] += 1
+            return CacheLookup.NEGATIVE, body.decode("utf-8")
+        self.stats["hits"] += 1
+        return CacheLookup.HIT, zlib.decompress(body).decode("utf-8")
+    
+    async def put(self, key: str, code: str) -> None:
+        """Store generated code"""
+        raw = code.encode("utf-8")
+        value = self.CODE_TAG + zlib.compress(raw, self.compression_level)
+        if await self._set(key, value, self.ttl):
+            self.stats["stores"] += 1
+            self.stats["bytes_raw"] += len(raw)
+            self.stats["bytes_stored"] += len(value)
+    
+    async def put_failure(self, key: str, error: str) -> None:
+        """Remember that generating a key failed"""
+        if await self._set(key, self.FAILURE_TAG + error.encode("utf-8"), self.negative_ttl):
+            self.stats["failures_stored"] += 1
+    
+    async def _set(self, key: str, value: bytes, ttl: int) -> bool:
+        started = time.perf_counter()
+        try:
+            await self.backend.set(self.prefix + key, value, ex=ttl)
+            return True
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Shared generation cache store failed: {e}")
+            return False
+        finally:
+            self.latency.record(time.perf_counter() - started)
+    
+    def count_lookup(self, hit: bool) -> None:
+        """Count a request towards the cluster-wide hit rate (sent on the next flush)"""
+        self._unflushed["lookups"] += 1
+        self._unflushed["hits"] += hit
+    
+    async def flush_counters(self) -> Dict[str, int]:
+        """Add this replica's lookup counts to the cluster totals in the backend"""
+        try:
+            for name, count in self._unflushed.items():
+                self.cluster[name] = int(await self.backend.incrby(f"{self.prefix}stats:{name}", count))
+                self._unflushed[name] = 0
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Shared generation cache counter flush failed: {e}")
+        return dict(self.cluster)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get this replica's counters, L2 latency and the last seen cluster-wide hit rate"""
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["negative_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "compression_ratio": round(self.stats["bytes_raw"] / self.stats["bytes_stored"], 2)
+            if self.stats["bytes_stored"] else 0.0,
+            "latency_ms": {
+                "p50": round(1000 * self.latency.quantile(0.5), 4),
+                "p99": round(1000 * self.latency.quantile(0.99), 4)
+            },
+            "cluster": {
+                **self.cluster,
+                "hit_rate": round(self.cluster["hits"] / self.cluster["lookups"], 4) if self.cluster["lookups"] else 0.0
+            }
+        }
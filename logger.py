@@ -4,10 +4,10 @@ Logger Configuration for YMERA Multi-Agent AI System
 import logging
 import sys
 from typing import Any
-import json
 from datetime import datetime, timezone
 
 from config import settings
+import serialization
 
 
 class JSONFormatter(logging.Formatter):
@@ -31,7 +31,7 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, "extra"):
             log_data["extra"] = record.extra
             
-        return json.dumps(log_data)
+        return serialization.dumps(log_data)
 
 
 def setup_logging() -> None:
@@ -3,15 +3,21 @@ Main Application Entry Point for YMERA Multi-Agent AI System
 """
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 from typing import Dict, Any, List
+import multiprocessing
+import os
 import uvicorn
-import json
 
 from config import settings
 from database import init_db, close_db
 from logger import logger
 from base_agent import AgentState
+from agent_code_generation import CodeGenerationAgent
+from repository_analysis import RepositoryAnalysisJob
+from sharding import ShardedBroker, ShardProcess
+import serialization
 
 
 class ConnectionManager:
@@ -31,7 +37,7 @@ class ConnectionManager:
     
     async def broadcast(self, message: dict):
         """Broadcast message to all connected clients"""
-        message_str = json.dumps(message)
+        message_str = serialization.dumps(message)
         for connection in self.active_connections:
             try:
                 await connection.send_text(message_str)
@@ -49,11 +55,26 @@ async def lifespan(app: FastAPI):
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     await init_db()
     logger.info("Database initialized")
+    # Owns the process pool used for CPU-bound analysis, so it lives and dies with the app
+    app.state.code_agent = CodeGenerationAgent("api_code_generation_agent")
+    await app.state.code_agent.initialize()
+    # Agent messages are routed by shard processes, each with its own NATS connection
+    shard_config = {"nats_servers": settings.nats_servers.split(","), "data_dir": settings.broker_data_dir}
+    app.state.broker = ShardedBroker({
+        f"shard_{i}": ShardProcess(f"shard_{i}", shard_config, mp_context=multiprocessing.get_context("spawn"))
+        for i in range(settings.broker_shards)
+    })
+    await app.state.broker.start()
+    logger.info(f"Message broker started with {settings.broker_shards} shards")
     
     yield
     
     # Shutdown
     logger.info("Shutting down application")
+    await app.state.broker.cleanup()
+    logger.info("Message broker stopped")
+    await app.state.code_agent.cleanup()
+    logger.info("Code generation agent stopped")
     await close_db()
     logger.info("Database connections closed")
 
@@ -133,6 +154,7 @@ async def create_agent(agent_data: Dict[str, Any]) -> Dict[str, Any]:
     agent_id = agent_data.get("agent_id")
     if not agent_id:
         raise HTTPException(status_code=400, detail="agent_id is required")
+    await app.state.broker.register_agent(agent_id, agent_data.get("type", "coder"))
     
     # Broadcast agent creation event
     await manager.broadcast({
@@ -176,6 +198,7 @@ async def bulk_create_agents(bulk_data: Dict[str, Any]) -> Dict[str, Any]:
     for agent in agents:
         agent_id = agent.get("agent_id")
         if agent_id:
+            await app.state.broker.register_agent(agent_id, agent.get("type", "coder"))
             created_ids.append(agent_id)
             # Broadcast bulk agent creation event
             await manager.broadcast({
@@ -259,6 +282,7 @@ async def update_agent(agent_id: str, agent_data: Dict[str, Any]) -> Dict[str, A
 async def delete_agent(agent_id: str) -> Dict[str, Any]:
     """Delete an agent"""
     # This would stop and remove the agent
+    await app.state.broker.unregister_agent(agent_id)
     
     # Broadcast agent deletion event
     await manager.broadcast({
@@ -274,6 +298,84 @@ async def delete_agent(agent_id: str) -> Dict[str, Any]:
     }
 
 
+@app.post(f"{settings.api_prefix}/messages")
+async def send_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Route a message to an agent ("to"), an agent type ("to_type") or every agent"""
+    result = await app.state.broker.process_message(message)
+    if result.get("status") == "error":
+        raise HTTPException(status_code=404, detail=result.get("error"))
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+@app.get(f"{settings.api_prefix}/agents/{{agent_id}}/messages")
+async def receive_messages(agent_id: str, limit: int = 100) -> Dict[str, Any]:
+    """Take up to limit queued messages of an agent"""
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be a positive integer")
+    try:
+        messages = await app.state.broker.receive(agent_id, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Agent not registered: {agent_id}")
+    return {
+        "success": True,
+        "data": {
+            "messages": messages
+        }
+    }
+
+
+@app.post(f"{settings.api_prefix}/code/generate/batch")
+async def generate_code_batch(batch_data: Dict[str, Any]) -> StreamingResponse:
+    """Generate code for many specifications, streaming one NDJSON line per result as it completes"""
+    requests = batch_data.get("requests", [])
+    if not requests:
+        raise HTTPException(status_code=400, detail="requests is required")
+    if len(requests) > CodeGenerationAgent.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {CodeGenerationAgent.MAX_BATCH_SIZE} requests per batch"
+        )
+    # Validated before streaming starts: an error mid-stream would truncate the response
+    concurrency = batch_data.get("concurrency")
+    if concurrency is not None and (not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1):
+        raise HTTPException(status_code=400, detail="concurrency must be a positive integer")
+    
+    async def stream_results():
+        async for result in app.state.code_agent.generate_code_batch(requests, concurrency):
+            yield serialization.dumps(result) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.post(f"{settings.api_prefix}/code/analyze/repository")
+async def analyze_repository(analysis_data: Dict[str, Any]) -> StreamingResponse:
+    """Analyze a directory or zip archive, streaming progress events and the final report as NDJSON"""
+    path = analysis_data.get("path")
+    if not path:
+        raise HTTPException(status_code=400, detail="path is required")
+    
+    # Only sources under the working directory may be analyzed
+    root = os.path.realpath(os.getcwd())
+    source = os.path.realpath(path)
+    if os.path.commonpath([root, source]) != root:
+        raise HTTPException(status_code=403, detail="path must be inside the working directory")
+    try:
+        job = RepositoryAnalysisJob(source, pool=app.state.code_agent.process_pool)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    async def stream_events():
+        async for event in job.events():
+            # Progress also reaches WebSocket clients
+            await manager.broadcast(event)
+            yield serialization.dumps(event) + "\n"
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+
 @app.get(f"{settings.api_prefix}/projects")
 async def list_projects() -> Dict[str, Any]:
     """List all projects"""
@@ -350,6 +452,27 @@ async def login(credentials: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+async def stream_generated_code(websocket: WebSocket, message: Dict[str, Any]):
+    """Stream generated code to a WebSocket client as incremental frames"""
+    code_agent = app.state.code_agent
+    request_id = message.get("id")
+    language = message.get("language", "python")
+    if language not in code_agent.supported_languages:
+        await websocket.send_text(serialization.dumps({
+            "type": "code:error",
+            "id": request_id,
+            "error": f"Unsupported language: {language}"
+        }))
+        return
+    
+    # The next chunk is only generated once the previous frame has been sent,
+    # so a slow client slows generation down instead of buffering frames
+    async for frame in code_agent.generate_code_stream(
+        language, message.get("specification", ""), message.get("options", {})
+    ):
+        await websocket.send_text(serialization.dumps({**frame, "type": f"code:{frame['type']}", "id": request_id}))
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time communication"""
@@ -358,21 +481,23 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             # Receive message from client
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = serialization.loads(data)
             
             # Handle different message types
             if message.get("type") == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                await websocket.send_text(serialization.dumps({"type": "pong"}))
             elif message.get("type") == "subscribe":
                 channel = message.get("channel")
                 logger.info(f"Client subscribed to channel: {channel}")
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(serialization.dumps({
                     "type": "subscribed",
                     "channel": channel
                 }))
+            elif message.get("type") == "generate_code":
+                await stream_generated_code(websocket, message)
             else:
                 # Echo back for now
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(serialization.dumps({
                     "type": "message",
                     "data": message
                 }))
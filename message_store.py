@@ -0,0 +1,241 @@
+"""
+Message Store - Write-behind persistence of routed messages into the messages table
+"""
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from datetime import datetime, timezone
+import asyncio
+
+from logger import logger
+import serialization
+
+
+# Columns written for every message (id is generated by the database)
+MESSAGE_COLUMNS = [
+    "message_id", "from_agent", "to_agent", "message_type",
+    "payload", "status", "created_at", "processed_at"
+]
+
+
+def _naive_utc(value: Any) -> datetime:
+    """Convert an ISO timestamp or datetime to the naive UTC datetime the table stores"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            value = None
+    if not isinstance(value, datetime):
+        value = datetime.now(timezone.utc)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def message_to_row(message: Dict[str, Any], status: str) -> Dict[str, Any]:
+    """Map a routed message onto the columns of database.Message"""
+    return {
+        "message_id": str(message.get("message_id", "unknown")),
+        "from_agent": str(message.get("from") or "unknown"),
+        "to_agent": str(message.get("to") or message.get("to_type") or "broadcast"),
+        "message_type": str(message.get("type") or "request")[:50],
+        "payload": message.get("payload", {}),
+        "status": status[:50],
+        "created_at": _naive_utc(message.get("timestamp")),
+        "processed_at": _naive_utc(None)
+    }
+
+
+class SQLMessageWriter:
+    """
+    Writes message batches with SQLAlchemy.
+    
+    Batches become one multi-row INSERT. On PostgreSQL (asyncpg) large batches
+    are streamed with COPY into a temporary staging table and merged from
+    there. Duplicate message IDs are skipped in both cases, so redelivered
+    messages do not fail a whole batch.
+    """
+    
+    DEFAULT_COPY_THRESHOLD = 500  # rows
+    
+    def __init__(self, engine=None, copy_threshold: int = DEFAULT_COPY_THRESHOLD):
+        """
+        Initialize the writer.
+        
+        Args:
+            engine: SQLAlchemy async engine (database.engine if None)
+            copy_threshold: Batch size from which COPY is used on PostgreSQL
+        """
+        if engine is None:
+            from database import engine
+        self.engine = engine
+        self.copy_threshold = copy_threshold
+        self.dialect = engine.dialect.name
+    
+    async def __call__(self, rows: List[Dict[str, Any]]) -> None:
+        if self.dialect == "postgresql" and self.engine.driver == "asyncpg" and len(rows) >= self.copy_threshold:
+            await self._copy(rows)
+        else:
+            await self._insert(rows)
+    
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        """Write rows with a single multi-row INSERT"""
+        from database import Message
+        
+        if self.dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            statement = insert(Message).values(rows).on_conflict_do_nothing(index_elements=["message_id"])
+        elif self.dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+            statement = insert(Message).values(rows).on_conflict_do_nothing(index_elements=["message_id"])
+        else:
+            from sqlalchemy import insert
+            statement = insert(Message).values(rows)
+        
+        async with self.engine.begin() as conn:
+            await conn.execute(statement)
+    
+    async def _copy(self, rows: List[Dict[str, Any]]) -> None:
+        """Write rows with COPY through a staging table"""
+        columns = ", ".join(MESSAGE_COLUMNS)
+        records = [
+            tuple(serialization.dumps(row[c]) if c == "payload" else row[c] for c in MESSAGE_COLUMNS)
+            for row in rows
+        ]
+        
+        async with self.engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            async with driver.transaction():
+                await driver.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS messages_staging "
+                    "(LIKE messages INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                )
+                await driver.copy_records_to_table("messages_staging", records=records, columns=MESSAGE_COLUMNS)
+                await driver.execute(
+                    f"INSERT INTO messages ({columns}) SELECT {columns} FROM messages_staging "
+                    "ON CONFLICT (message_id) DO NOTHING"
+                )
+
+
+class MessageWriteBehind:
+    """
+    Bounded write-behind buffer for routed messages.
+    
+    `add` only appends to an in-memory buffer, so routing never waits on the
+    database. A background task flushes a batch whenever `batch_size` rows
+    are buffered or `flush_interval` seconds have passed. When the buffer is
+    full the oldest rows are dropped (and counted) instead of blocking.
+    Messages become rows when their batch is written, so `prepare` runs off
+    the routing path.
+    """
+    
+    DEFAULT_MAX_BUFFER = 10000
+    DEFAULT_BATCH_SIZE = 500
+    DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+    
+    def __init__(
+        self,
+        writer: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        max_buffer: int = DEFAULT_MAX_BUFFER,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        prepare: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+    ):
+        """
+        Initialize the write-behind buffer.
+        
+        Args:
+            writer: Coroutine writing a batch of rows (e.g. SQLMessageWriter)
+            max_buffer: Maximum buffered rows before the oldest are dropped
+            batch_size: Rows per write
+            flush_interval: Maximum seconds a row waits before it is written
+            prepare: Applied to each message before it becomes a row (e.g. to
+                inline values that would not outlive the table)
+        """
+        self.writer = writer
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prepare = prepare
+        self._buffer: Deque[Tuple[Dict[str, Any], str]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Failed writes since the last successful one
+        self.consecutive_errors = 0
+        self.stats = {
+            "buffered": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "flush_errors": 0
+        }
+    
+    def add(self, message: Dict[str, Any], status: str) -> None:
+        """Buffer a routed message for persistence (never blocks)"""
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            self.stats["dropped"] += 1
+        self._buffer.append((message, status))
+        self.stats["buffered"] += 1
+        
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+    
+    async def flush(self) -> int:
+        """Write everything buffered right now"""
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await self.writer([
+                    message_to_row(self.prepare(message) if self.prepare else message, status)
+                    for message, status in batch
+                ])
+            except Exception as e:
+                logger.error(f"Failed to persist {len(batch)} messages: {e}", exc_info=True)
+                self.stats["flush_errors"] += 1
+                self.consecutive_errors += 1
+                # Put the batch back (as far as there is room) and retry on the next flush
+                room = max(self.max_buffer - len(self._buffer), 0)
+                kept = batch[len(batch) - room:] if room < len(batch) else batch
+                self._buffer.extendleft(reversed(kept))
+                self.stats["dropped"] += len(batch) - len(kept)
+                break
+            self.consecutive_errors = 0
+            written += len(batch)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        return written
+    
+    async def stop(self) -> None:
+        """Stop the background task and write what is left"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get write-behind counters"""
+        return {"pending": len(self._buffer), "consecutive_errors": self.consecutive_errors, **self.stats}
+    
+    async def _run(self) -> None:
+        """Flush on batch size or interval, whichever comes first"""
+        while True:
+            if len(self._buffer) < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if self._buffer:
+                await self.flush()
+            if self.consecutive_errors and self._buffer:
+                # Back off while the database is failing
+                await asyncio.sleep(self.flush_interval)
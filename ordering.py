@@ -0,0 +1,217 @@
+"""
+Message Ordering - Per sender->recipient sequence numbers and a bounded reorder buffer
+"""
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict, deque
+import time
+import uuid
+
+
+# Message fields carrying the stream position
+SEQUENCE_FIELD = "sequence"
+EPOCH_FIELD = "sequence_epoch"
+
+
+class SequenceStamper:
+    """
+    Stamps messages with a sequence number per sender->recipient stream.
+    
+    Sequences restart at 1 for every stamper, so each stamper has a random
+    epoch that receivers use to tell a restarted sender from a duplicate.
+    Only the `max_streams` most recently used streams are remembered; a
+    forgotten stream that is used again restarts at 1 under a new epoch.
+    """
+    
+    DEFAULT_MAX_STREAMS = 10000
+    
+    def __init__(self, max_streams: int = DEFAULT_MAX_STREAMS):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.max_streams = max_streams
+        # (sender, recipient) -> [epoch, last sequence]
+        self._last: "OrderedDict[Tuple[str, str], List[Any]]" = OrderedDict()
+        self._evictions = 0
+    
+    def stamp(self, message: Dict[str, Any]) -> None:
+        """Stamp a directly addressed message (retried messages keep their stamp)"""
+        if SEQUENCE_FIELD in message or not message.get("to"):
+            return
+        key = (str(message.get("from") or "unknown"), str(message["to"]))
+        stream = self._last.get(key)
+        if stream is None:
+            epoch = f"{self.epoch}.{self._evictions}" if self._evictions else self.epoch
+            stream = self._last[key] = [epoch, 0]
+            if len(self._last) > self.max_streams:
+                self._last.popitem(last=False)
+                self._evictions += 1
+        else:
+            self._last.move_to_end(key)
+        stream[1] += 1
+        message[SEQUENCE_FIELD] = stream[1]
+        message[EPOCH_FIELD] = stream[0]
+    
+    @staticmethod
+    def stream_key(message: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+        """Get the (sender, recipient, epoch) stream of a stamped message"""
+        if SEQUENCE_FIELD not in message:
+            return None
+        return (str(message.get("from") or "unknown"), str(message.get("to")), str(message.get(EPOCH_FIELD)))
+
+
+class _StreamState:
+    """Receive state of one stream"""
+    
+    __slots__ = ("expected", "held", "gap_since", "skipped")
+    
+    # Skipped sequence ranges remembered to recognise late arrivals
+    MAX_SKIPPED_RANGES = 16
+    
+    def __init__(self):
+        self.expected = 1
+        self.held: Dict[int, Any] = {}
+        self.gap_since: Optional[float] = None
+        self.skipped: Deque[Tuple[int, int]] = deque(maxlen=self.MAX_SKIPPED_RANGES)
+
+
+class ReorderBuffer:
+    """
+    Releases messages of each stream in sequence order.
+    
+    Out-of-order messages are held until the gap before them is filled. A gap
+    is skipped once it has been open for `gap_timeout` seconds or the stream
+    holds `max_held` messages, so a lost message delays its successors but
+    never blocks them. Messages behind the stream position are dropped: as
+    late if their gap was skipped, as duplicates otherwise.
+    """
+    
+    DEFAULT_MAX_HELD = 1000  # messages per stream
+    DEFAULT_GAP_TIMEOUT = 2.0  # seconds
+    DEFAULT_MAX_STREAMS = 10000
+    
+    def __init__(
+        self,
+        max_held: int = DEFAULT_MAX_HELD,
+        gap_timeout: float = DEFAULT_GAP_TIMEOUT,
+        max_streams: int = DEFAULT_MAX_STREAMS
+    ):
+        self.max_held = max_held
+        self.gap_timeout = gap_timeout
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[Hashable, _StreamState]" = OrderedDict()
+        self._gapped: Dict[Hashable, _StreamState] = {}
+        self.stats = {
+            "in_order": 0,
+            "reordered": 0,
+            "duplicates": 0,
+            "late": 0,
+            "gaps_skipped": 0,
+            "messages_skipped": 0
+        }
+    
+    def push(self, key: Hashable, seq: int, item: Any, now: Optional[float] = None) -> List[Any]:
+        """
+        Add a message to its stream.
+        
+        Args:
+            key: Stream key
+            seq: Sequence number of the message
+            item: Message to release in order
+            now: Current monotonic time (time.monotonic() if None)
+        
+        Returns:
+            Messages that are now deliverable, in order
+        """
+        now = time.monotonic() if now is None else now
+        stream = self._stream(key)
+        if seq < stream.expected or seq in stream.held:
+            self.stats["late" if self._was_skipped(stream, seq) else "duplicates"] += 1
+            return []
+        
+        if seq == stream.expected and not stream.held:
+            stream.expected += 1
+            self.stats["in_order"] += 1
+            return [item]
+        
+        stream.held[seq] = item
+        if seq == stream.expected:
+            return self._drain(key, stream, now)
+        if stream.gap_since is None:
+            stream.gap_since = now
+            self._gapped[key] = stream
+        if len(stream.held) > self.max_held:
+            return self._skip_gap(key, stream, now)
+        return []
+    
+    def expire(self, now: Optional[float] = None) -> List[Any]:
+        """Skip gaps that timed out and return the messages released by that"""
+        now = time.monotonic() if now is None else now
+        released: List[Any] = []
+        for key, stream in list(self._gapped.items()):
+            if now - stream.gap_since >= self.gap_timeout:
+                released.extend(self._skip_gap(key, stream, now))
+        return released
+    
+    def holds(self, key: Hashable, seq: int) -> bool:
+        """Whether a message is held back waiting for a gap to fill"""
+        stream = self._streams.get(key)
+        return stream is not None and seq in stream.held
+    
+    def was_skipped(self, key: Hashable, seq: int) -> bool:
+        """Whether a sequence number belongs to a recently skipped gap"""
+        stream = self._streams.get(key)
+        return stream is not None and self._was_skipped(stream, seq)
+    
+    @staticmethod
+    def _was_skipped(stream: _StreamState, seq: int) -> bool:
+        return any(first <= seq < end for first, end in stream.skipped)
+    
+    def next_deadline(self) -> Optional[float]:
+        """Monotonic time at which the oldest open gap times out"""
+        if not self._gapped:
+            return None
+        return min(stream.gap_since for stream in self._gapped.values()) + self.gap_timeout
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get reordering counters"""
+        return {
+            "streams": len(self._streams),
+            "open_gaps": len(self._gapped),
+            "held": sum(len(stream.held) for stream in self._gapped.values()),
+            **self.stats
+        }
+    
+    def _stream(self, key: Hashable) -> _StreamState:
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = _StreamState()
+            # Forget the least recently used streams that hold nothing
+            while len(self._streams) > self.max_streams:
+                oldest = next((k for k, s in self._streams.items() if not s.held and k != key), None)
+                if oldest is None:
+                    break
+                del self._streams[oldest]
+        self._streams.move_to_end(key)
+        return stream
+    
+    def _skip_gap(self, key: Hashable, stream: _StreamState, now: float) -> List[Any]:
+        first_held = min(stream.held)
+        self.stats["gaps_skipped"] += 1
+        self.stats["messages_skipped"] += first_held - stream.expected
+        stream.skipped.append((stream.expected, first_held))
+        stream.expected = first_held
+        return self._drain(key, stream, now)
+    
+    def _drain(self, key: Hashable, stream: _StreamState, now: float) -> List[Any]:
+        released = []
+        while stream.expected in stream.held:
+            released.append(stream.held.pop(stream.expected))
+            stream.expected += 1
+        self.stats["reordered"] += len(released)
+        
+        if stream.held:
+            # The next gap starts now
+            stream.gap_since = now
+            self._gapped[key] = stream
+        else:
+            stream.gap_since = None
+            self._gapped.pop(key, None)
+        return released
@@ -0,0 +1,159 @@
+"""
+Durable Outbox - Append-only on-disk buffer for messages that could not reach the broker
+"""
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from collections import deque
+import os
+
+from logger import logger
+import serialization
+
+
+class DurableOutbox:
+    """
+    Append-only JSON lines outbox with a persisted read cursor.
+    
+    Messages are appended while the broker is unavailable and drained in
+    order once it is back. The byte offset of the next undrained record is
+    stored next to the log, so a restart resumes where draining stopped, and
+    the log is truncated once everything has been drained. Without a path the
+    messages are only kept in memory and do not survive a restart.
+    """
+    
+    CURSOR_SYNC_INTERVAL = 100  # records between cursor writes while draining
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        fsync: bool = False,
+        prepare: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+    ):
+        """
+        Initialize the outbox.
+        
+        Args:
+            path: Outbox log file (None keeps the outbox in memory)
+            fsync: Flush every append to disk (slower, survives power loss)
+            prepare: Applied to a message before it is buffered (e.g. to inline
+                values that would not outlive the outbox)
+        """
+        self.path = path
+        self.prepare = prepare
+        self.cursor_path = f"{path}.offset" if path else None
+        self.fsync = fsync
+        self._memory: Deque[Dict[str, Any]] = deque()
+        self.offset = self._read_cursor() if path else 0
+        self.pending = self._count_pending() if path else 0
+        self.stats = {"appended": 0, "drained": 0}
+    
+    def append(self, message: Dict[str, Any]) -> int:
+        """
+        Append a message to the outbox.
+        
+        Returns:
+            Number of messages waiting to be drained
+        """
+        if self.prepare:
+            message = self.prepare(message)
+        if not self.path:
+            self._memory.append(message)
+            self.pending += 1
+            self.stats["appended"] += 1
+            return self.pending
+        
+        with open(self.path, 'ab') as f:
+            f.write(serialization.dumpb(message) + b"\n")
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        self.pending += 1
+        self.stats["appended"] += 1
+        return self.pending
+    
+    async def drain(self, publish: Callable[[Dict[str, Any]], Awaitable[bool]]) -> int:
+        """
+        Publish buffered messages in order until the outbox is empty or a publish fails.
+        
+        Messages appended while draining are drained in the same pass.
+        
+        Args:
+            publish: Coroutine publishing one message, returning True on success
+        
+        Returns:
+            Number of drained messages
+        """
+        drained = 0
+        if not self.path:
+            while self._memory:
+                if not await publish(self._memory[0]):
+                    break
+                self._memory.popleft()
+                drained += 1
+            self.pending = len(self._memory)
+            self.stats["drained"] += drained
+            return drained
+        
+        if not self.pending or not os.path.exists(self.path):
+            return drained
+        
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    # Partially written record; retry it on the next drain
+                    break
+                if line.strip():
+                    if not await publish(serialization.loads(line)):
+                        break
+                    drained += 1
+                    self.pending -= 1
+                self.offset = f.tell()
+                # A crash between cursor writes re-sends a few records (at-least-once)
+                if drained % self.CURSOR_SYNC_INTERVAL == 0:
+                    self._write_cursor()
+            self._write_cursor()
+        
+        self.stats["drained"] += drained
+        if self.pending <= 0:
+            self._compact()
+        return drained
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get outbox counters"""
+        return {"pending": self.pending, **self.stats}
+    
+    def _compact(self) -> None:
+        """Truncate the fully drained log"""
+        with open(self.path, 'wb'):
+            pass
+        self.offset = 0
+        self.pending = 0
+        self._write_cursor()
+    
+    def _read_cursor(self) -> int:
+        try:
+            with open(self.cursor_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+    
+    def _write_cursor(self) -> None:
+        tmp_path = f"{self.cursor_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(self.offset))
+        os.replace(tmp_path, self.cursor_path)
+    
+    def _count_pending(self) -> int:
+        """Count undrained records left by a previous run"""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                return sum(1 for line in f if line.strip())
+        except Exception as e:
+            logger.error(f"Failed to read outbox {self.path}: {e}", exc_info=True)
+            return 0
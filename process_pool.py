@@ -0,0 +1,189 @@
+"""
+Process pool - runs CPU-bound work in worker processes with timeouts, cancellation and queue metrics
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import os
+import time
+
+from traffic_stats import LatencyHistogram
+
+
+class TaskTimeout(asyncio.TimeoutError):
+    """A pooled task ran longer than its timeout"""
+
+
+class ProcessPool:
+    """
+    Runs CPU-bound functions in worker processes so they never block the event loop.
+    
+    Tasks wait in an asyncio-side queue until a worker is free, so at most
+    `max_workers` tasks are handed to the executor, a task cancelled while
+    queued never starts and the queue depth is observable. A running task
+    cannot be interrupted inside its worker: when one exceeds its timeout the
+    workers are terminated and the executor replaced, and the other tasks
+    that were running are resubmitted once. A task cancelled while running
+    keeps its slot until its worker is done with it. Workers start on first use.
+    """
+    
+    DEFAULT_TIMEOUT = 30.0  # seconds
+    
+    def __init__(self, max_workers: Optional[int] = None, timeout: float = DEFAULT_TIMEOUT, mp_context=None):
+        """
+        Initialize the pool.
+        
+        Args:
+            max_workers: Worker processes (CPU count if None)
+            timeout: Default seconds a task may run once started
+            mp_context: multiprocessing context for the workers
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self.queued = 0
+        self.running = 0
+        self.wait_latency = LatencyHistogram()
+        self.run_latency = LatencyHistogram()
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "restarts": 0,
+            "peak_queue_depth": 0
+        }
+    
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Run func(*args) in a worker process.
+        
+        Args:
+            func: Picklable module-level function
+            args: Picklable arguments
+            timeout: Seconds the task may run once started (pool default if None)
+        
+        Returns:
+            The function's result
+        
+        Raises:
+            TaskTimeout: If the task ran longer than the timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self.stats["submitted"] += 1
+        self.queued += 1
+        self.stats["peak_queue_depth"] = max(self.stats["peak_queue_depth"], self.queued)
+        enqueued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        finally:
+            self.queued -= 1
+        
+        self.running += 1
+        started = time.perf_counter()
+        self.wait_latency.record(started - enqueued)
+        # Executor future of the attempt in progress (None once its worker is free)
+        current: List[Optional[Future]] = [None]
+        try:
+            result = await self._run_in_worker(func, args, timeout, current)
+        except asyncio.CancelledError:
+            # A running task finishes in its worker; its result is discarded
+            self.stats["cancelled"] += 1
+            raise
+        except TaskTimeout:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            future = current[0]
+            if future is None or future.done():
+                self._release()
+            else:
+                # A cancelled task still occupies its worker; releasing the slot
+                # now would start the next task's timeout while it waits for it
+                self._release_when_done(future)
+        
+        self.stats["completed"] += 1
+        self.run_latency.record(time.perf_counter() - started)
+        return result
+    
+    def _release(self) -> None:
+        self.running -= 1
+        self._slots.release()
+    
+    def _release_when_done(self, future: Future) -> None:
+        loop = asyncio.get_running_loop()
+        
+        def done(_: Future) -> None:
+            # Called from the executor's thread
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._release)
+        
+        future.add_done_callback(done)
+    
+    async def _run_in_worker(self, func: Callable[..., Any], args: tuple, timeout: float, current: List[Optional[Future]]) -> Any:
+        for attempt in range(2):
+            executor = self._get_executor()
+            current[0] = executor.submit(func, *args)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(current[0]), timeout)
+            except asyncio.TimeoutError:
+                self._restart(executor)
+                # The restart terminated the worker
+                current[0] = None
+                raise TaskTimeout(f"{getattr(func, '__name__', func)} timed out after {timeout}s")
+            except BrokenProcessPool:
+                if executor is self._executor:
+                    # A worker died (crash or out of memory): later tasks get fresh workers
+                    self._restart(executor)
+                    raise
+                if attempt:
+                    raise
+                # Another task's timeout replaced the workers under this one
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._mp_context)
+        return self._executor
+    
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        if executor is not self._executor:
+            return
+        self._executor = None
+        self.stats["restarts"] += 1
+        # Terminating the workers is the only way to stop a runaway task
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self) -> None:
+        """Stop the workers once their current tasks finish; queued tasks are dropped"""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get task counters, queue depth and wait/run latency"""
+        return {
+            **self.stats,
+            "workers": self.max_workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "wait_ms": {
+                "p50": round(1000 * self.wait_latency.quantile(0.5), 4),
+                "p99": round(1000 * self.wait_latency.quantile(0.99), 4)
+            },
+            "run_ms": {
+                "p50": round(1000 * self.run_latency.quantile(0.5), 4),
+                "p99": round(1000 * self.run_latency.quantile(0.99), 4)
+            }
+        }
@@ -0,0 +1,150 @@
+"""
+Python analysis - per-function complexity, nesting, sizes and imports from one AST parse
+"""
+from typing import Any, Dict, List, Optional
+import ast
+
+
+COMPLEXITY_WARNING = 10
+COMPLEXITY_ERROR = 20
+NESTING_WARNING = 4
+FUNCTION_LINES_WARNING = 50
+
+# Node types are matched exactly (type() in a set) to keep the walk cheap
+# Nodes adding a path through a function (elif is a nested If)
+_BRANCHES = frozenset({ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.match_case})
+# Nodes opening a nested block
+_BLOCKS = frozenset({ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try, ast.Match}) | (
+    frozenset({ast.TryStar}) if hasattr(ast, "TryStar") else frozenset()
+)
+_FUNCTIONS = frozenset({ast.FunctionDef, ast.AsyncFunctionDef})
+# Nodes that cannot contain anything the walk counts
+_LEAVES = frozenset({
+    ast.Name, ast.Constant, *ast.expr_context.__subclasses__(), *ast.operator.__subclasses__(),
+    *ast.unaryop.__subclasses__(), *ast.cmpop.__subclasses__(), *ast.boolop.__subclasses__()
+})
+
+
+def analyze_python(code: str) -> Dict[str, Any]:
+    """
+    Analyze the structure of Python code.
+    
+    The code is parsed once and the tree walked once; complexity and nesting
+    of a nested function count towards that function only.
+    
+    Args:
+        code: Python source
+    
+    Returns:
+        functions (name, line, lines, complexity, nesting, parameters,
+        docstring), classes, imports, aggregates, syntax_error and issues
+    """
+    structure: Dict[str, Any] = {
+        "functions": [],
+        "classes": 0,
+        "imports": [],
+        "syntax_error": None,
+        "issues": []
+    }
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None) or 1
+        structure["syntax_error"] = {"line": line, "message": str(e)}
+        structure["issues"].append({"type": "syntax", "severity": "high", "line": line, "message": f"Syntax error: {e}"})
+        return summarize_structure(structure)
+    
+    imports = set()
+    _walk(tree, None, 0, "", structure, imports)
+    structure["imports"] = sorted(imports)
+    for function in structure["functions"]:
+        structure["issues"].extend(_function_issues(function))
+    structure["issues"].sort(key=lambda issue: issue["line"])
+    return summarize_structure(structure)
+
+
+def _walk(node: ast.AST, function: Optional[Dict[str, Any]], depth: int, prefix: str,
+          structure: Dict[str, Any], imports: set) -> None:
+    for child in ast.iter_child_nodes(node):
+        kind = type(child)
+        if kind in _LEAVES:
+            continue
+        if kind in _FUNCTIONS:
+            arguments = child.args
+            record = {
+                "name": prefix + child.name,
+                "line": child.lineno,
+                "lines": child.end_lineno - child.lineno + 1,
+                "complexity": 1,
+                "nesting": 0,
+                "parameters": len(arguments.posonlyargs) + len(arguments.args) + len(arguments.kwonlyargs)
+                + (arguments.vararg is not None) + (arguments.kwarg is not None),
+                "docstring": ast.get_docstring(child, clean=False) is not None
+            }
+            structure["functions"].append(record)
+            _walk(child, record, 0, f"{record['name']}.", structure, imports)
+            continue
+        if kind is ast.ClassDef:
+            structure["classes"] += 1
+            _walk(child, function, depth, f"{prefix}{child.name}.", structure, imports)
+            continue
+        
+        if kind is ast.Import:
+            imports.update(alias.name for alias in child.names)
+        elif kind is ast.ImportFrom:
+            imports.add("." * child.level + (child.module or ""))
+        
+        child_depth = depth
+        if kind in _BLOCKS and not (type(node) is ast.If and node.orelse == [child]):
+            child_depth += 1
+        if function is not None:
+            if kind in _BRANCHES:
+                function["complexity"] += 1
+            elif kind is ast.BoolOp:
+                function["complexity"] += len(child.values) - 1
+            elif kind is ast.comprehension:
+                function["complexity"] += 1 + len(child.ifs)
+            if child_depth > function["nesting"]:
+                function["nesting"] = child_depth
+        _walk(child, function, child_depth, prefix, structure, imports)
+
+
+def _function_issues(function: Dict[str, Any]) -> List[Dict[str, Any]]:
+    issues = []
+    name, line = function["name"], function["line"]
+    if function["complexity"] > COMPLEXITY_WARNING:
+        issues.append({
+            "type": "complexity",
+            "severity": "high" if function["complexity"] > COMPLEXITY_ERROR else "medium",
+            "line": line,
+            "message": f"{name} has cyclomatic complexity {function['complexity']} (>{COMPLEXITY_WARNING})"
+        })
+    if function["nesting"] > NESTING_WARNING:
+        issues.append({
+            "type": "complexity",
+            "severity": "medium",
+            "line": line,
+            "message": f"{name} nests blocks {function['nesting']} deep (>{NESTING_WARNING})"
+        })
+    if function["lines"] > FUNCTION_LINES_WARNING:
+        issues.append({
+            "type": "maintainability",
+            "severity": "low",
+            "line": line,
+            "message": f"{name} is {function['lines']} lines long (>{FUNCTION_LINES_WARNING})"
+        })
+    return issues
+
+
+def summarize_structure(structure: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the aggregates (max/average complexity, max nesting, documented ratio) over the functions"""
+    functions = structure["functions"]
+    structure["max_complexity"] = max((function["complexity"] for function in functions), default=0)
+    structure["average_complexity"] = (
+        round(sum(function["complexity"] for function in functions) / len(functions), 2) if functions else 0.0
+    )
+    structure["max_nesting"] = max((function["nesting"] for function in functions), default=0)
+    structure["documented_ratio"] = (
+        round(sum(function["docstring"] for function in functions) / len(functions), 4) if functions else 1.0
+    )
+    return structure
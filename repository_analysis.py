@@ -0,0 +1,349 @@
+"""
+Repository analysis - parallel analysis of a directory tree or zip archive into one report
+"""
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import heapq
+import os
+import time
+import zipfile
+
+from code_analysis import analyze_source
+from process_pool import ProcessPool
+
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+    ".java": "java",
+    ".go": "go",
+    ".rs": "rust",
+    ".cpp": "c++",
+    ".cc": "c++",
+    ".hpp": "c++",
+    ".h": "c++",
+    ".cs": "c#"
+}
+
+# Directories holding dependencies, build output or VCS data rather than sources
+EXCLUDED_DIRECTORIES = frozenset({
+    ".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", "env",
+    "build", "dist", ".tox", ".mypy_cache", ".pytest_cache"
+})
+
+SEVERITY_WEIGHTS = {"high": 10, "medium": 5, "low": 2}
+
+def _read(root: str, archive: Optional[zipfile.ZipFile], name: str) -> bytes:
+    if archive is not None:
+        return archive.read(name)
+    # Checked again here, as a symlink may have been changed since it was listed
+    real_root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([real_root, path]) != real_root:
+        raise ValueError(f"{name} resolves outside {root}")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def analyze_files(root: str, entries: List[Tuple[str, str]], max_reported_issues: int = 50) -> List[Dict[str, Any]]:
+    """
+    Read and analyze files of a directory or zip archive (runs in worker processes).
+    
+    Results are reduced to counts and the notable findings so little has to
+    travel back to the parent process.
+    
+    Args:
+        root: Directory or zip archive path
+        entries: (path inside root, language) of each file
+        max_reported_issues: High severity issues kept per file
+    
+    Returns:
+        One summary per file, with "error" or "skipped" set when it was not analyzed
+    """
+    summaries = []
+    # The archive is opened once per chunk and closed with it
+    with (nullcontext() if os.path.isdir(root) else zipfile.ZipFile(root)) as archive:
+        for name, language in entries:
+            try:
+                data = _read(root, archive, name)
+                if b"\0" in data[:8192]:
+                    summaries.append({"path": name, "language": language, "skipped": "binary"})
+                    continue
+                result = analyze_source(data.decode("utf-8", errors="replace"), language)
+            except Exception as e:
+                summaries.append({"path": name, "language": language, "error": str(e)})
+                continue
+            
+            issues = result["issues"]
+            structure = result.get("structure") or {}
+            summaries.append({
+                "path": name,
+                "language": language,
+                "bytes": len(data),
+                "metrics": result["metrics"],
+                "severities": dict(Counter(issue["severity"] for issue in issues)),
+                "types": dict(Counter(issue["type"] for issue in issues)),
+                "high_issues": [issue for issue in issues if issue["severity"] == "high"][:max_reported_issues],
+                "functions": heapq.nlargest(
+                    10,
+                    ((function["complexity"], function["name"], function["line"])
+                     for function in structure.get("functions", []))
+                ),
+                "imports": structure.get("imports", [])
+            })
+    return summaries
+
+
+class RepositoryAnalysisJob:
+    """
+    Analyzes every source file of a directory tree or zip archive.
+    
+    Files are discovered lazily and handed to worker processes in chunks;
+    workers read the files themselves, so neither the file list nor the
+    contents are ever held in memory at once, and at most a few chunks per
+    worker are in flight. `events()` streams progress as chunks complete
+    and ends with the aggregated report.
+    """
+    
+    DEFAULT_CHUNK_SIZE = 32  # files per worker task
+    DEFAULT_MAX_FILE_SIZE = 2 * 1024 * 1024  # bytes
+    DEFAULT_MAX_REPORTED_ISSUES = 1000
+    TOP_N = 10
+    
+    def __init__(
+        self,
+        source: str,
+        pool: Optional[ProcessPool] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+        max_reported_issues: int = DEFAULT_MAX_REPORTED_ISSUES
+    ):
+        """
+        Initialize the job.
+        
+        Args:
+            source: Directory or zip archive to analyze
+            pool: Worker processes (files are analyzed inline if None)
+            chunk_size: Files per worker task
+            max_file_size: Larger files are skipped
+            max_reported_issues: High severity issues listed in the report
+        
+        Raises:
+            FileNotFoundError: If the source does not exist
+            ValueError: If the source is neither a directory nor a zip archive
+        """
+        if not os.path.exists(source):
+            raise FileNotFoundError(source)
+        if not os.path.isdir(source) and not zipfile.is_zipfile(source):
+            raise ValueError(f"Not a directory or zip archive: {source}")
+        self.source = source
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.max_file_size = max_file_size
+        self.max_reported_issues = max_reported_issues
+        self.files_total: Optional[int] = None
+        self._reset()
+    
+    def _reset(self) -> None:
+        self.files_discovered = 0
+        self.files_processed = 0
+        self.files_analyzed = 0
+        self.files_failed = 0
+        self.files_skipped = 0
+        self.bytes = 0
+        self.metrics = Counter()
+        self.languages: Dict[str, Counter] = {}
+        self.severities = Counter()
+        self.types = Counter()
+        self.imports = Counter()
+        self.high_issues: List[Dict[str, Any]] = []
+        self.errors: List[Dict[str, str]] = []
+        self._worst_files: List[Tuple[int, str]] = []
+        self._complex_functions: List[Tuple[int, str, str, int]] = []
+    
+    def iter_sources(self) -> Iterator[Tuple[str, str]]:
+        """Yield (path inside the source, language) of every file to analyze"""
+        if os.path.isdir(self.source):
+            root = os.path.realpath(self.source)
+            for directory, subdirectories, files in os.walk(self.source):
+                subdirectories[:] = sorted(
+                    name for name in subdirectories
+                    if name not in EXCLUDED_DIRECTORIES and not name.startswith(".")
+                )
+                for name in sorted(files):
+                    language = LANGUAGE_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+                    if language is None:
+                        continue
+                    path = os.path.join(directory, name)
+                    # Symlinks may point anywhere; only files inside the source are read
+                    if os.path.commonpath([root, os.path.realpath(path)]) != root or not os.path.isfile(path):
+                        self.files_skipped += 1
+                        continue
+                    if os.path.getsize(path) > self.max_file_size:
+                        self.files_skipped += 1
+                        continue
+                    yield os.path.relpath(path, self.source), language
+        else:
+            with zipfile.ZipFile(self.source) as archive:
+                members = [
+                    (info, LANGUAGE_BY_EXTENSION.get(os.path.splitext(info.filename)[1].lower()))
+                    for info in archive.infolist()
+                    if not info.is_dir() and not EXCLUDED_DIRECTORIES.intersection(info.filename.split("/")[:-1])
+                ]
+            members = [(info, language) for info, language in members if language]
+            small = [(info, language) for info, language in members if info.file_size <= self.max_file_size]
+            self.files_skipped += len(members) - len(small)
+            self.files_total = len(small)
+            for info, language in small:
+                yield info.filename, language
+    
+    def _chunks(self) -> Iterator[List[Tuple[str, str]]]:
+        chunk = []
+        for entry in self.iter_sources():
+            self.files_discovered += 1
+            chunk.append(entry)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    async def _analyze_chunk(self, chunk: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        if self.pool is None:
+            return analyze_files(self.source, chunk)
+        return await self.pool.run(analyze_files, os.path.abspath(self.source), chunk)
+    
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the analysis, yielding progress events and finally the report.
+        
+        Yields:
+            {"event": "analysis:progress", "data": {...}} after each chunk, then
+            {"event": "analysis:completed", "data": report}
+        """
+        self._reset()
+        self.files_total = None
+        started = time.perf_counter()
+        max_in_flight = 2 * self.pool.max_workers if self.pool else 1
+        chunks = self._chunks()
+        in_flight: Dict[asyncio.Future, List[Tuple[str, str]]] = {}
+        exhausted = False
+        
+        def submit() -> None:
+            nonlocal exhausted
+            while not exhausted and len(in_flight) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    self.files_total = self.files_discovered
+                else:
+                    in_flight[asyncio.ensure_future(self._analyze_chunk(chunk))] = chunk
+        
+        try:
+            submit()
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    chunk = in_flight.pop(task)
+                    try:
+                        summaries = task.result()
+                    except Exception as e:
+                        # A timed out or crashed worker fails its whole chunk
+                        summaries = [{"path": name, "language": language, "error": str(e) or type(e).__name__}
+                                     for name, language in chunk]
+                    for summary in summaries:
+                        self._add(summary)
+                # Refilled first, so the last progress event knows the total
+                submit()
+                yield {"event": "analysis:progress", "data": self._progress(started)}
+        finally:
+            for task in in_flight:
+                task.cancel()
+        
+        yield {"event": "analysis:completed", "data": self.report(time.perf_counter() - started)}
+    
+    async def run(self) -> Dict[str, Any]:
+        """Run the analysis and return the report"""
+        async for event in self.events():
+            if event["event"] == "analysis:completed":
+                return event["data"]
+    
+    def _add(self, summary: Dict[str, Any]) -> None:
+        self.files_processed += 1
+        path = summary["path"]
+        if "error" in summary:
+            self.files_failed += 1
+            self.errors.append({"path": path, "error": summary["error"]})
+            return
+        if "skipped" in summary:
+            self.files_skipped += 1
+            return
+        
+        self.files_analyzed += 1
+        self.bytes += summary["bytes"]
+        self.metrics.update(summary["metrics"])
+        language = self.languages.setdefault(summary["language"], Counter())
+        language.update({"files": 1, "lines_of_code": summary["metrics"]["lines_of_code"]})
+        self.severities.update(summary["severities"])
+        self.types.update(summary["types"])
+        self.imports.update(summary["imports"])
+        room = self.max_reported_issues - len(self.high_issues)
+        if room > 0:
+            self.high_issues.extend({**issue, "path": path} for issue in summary["high_issues"][:room])
+        
+        score = sum(SEVERITY_WEIGHTS.get(severity, 2) * count for severity, count in summary["severities"].items())
+        if score:
+            self._keep_top(self._worst_files, (score, path))
+        for complexity, name, line in summary["functions"]:
+            self._keep_top(self._complex_functions, (complexity, path, name, line))
+    
+    def _keep_top(self, heap: List[tuple], item: tuple) -> None:
+        if len(heap) < self.TOP_N:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    
+    def _progress(self, started: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        return {
+            "source": self.source,
+            "files_processed": self.files_processed,
+            "files_total": self.files_total,
+            "files_failed": self.files_failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_second": round(self.files_processed / elapsed, 1) if elapsed else 0.0
+        }
+    
+    def report(self, elapsed: float = 0.0) -> Dict[str, Any]:
+        """Aggregate what has been analyzed so far into one report"""
+        return {
+            "source": self.source,
+            "files": self.files_analyzed,
+            "failed": self.files_failed,
+            "skipped": self.files_skipped,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(elapsed, 3),
+            "metrics": dict(self.metrics),
+            "languages": {name: dict(counts) for name, counts in sorted(self.languages.items())},
+            "issues": {
+                "total": sum(self.severities.values()),
+                "by_severity": dict(self.severities),
+                "by_type": dict(self.types)
+            },
+            "high_severity_issues": self.high_issues,
+            "worst_files": [
+                {"path": path, "issue_score": score} for score, path in sorted(self._worst_files, reverse=True)
+            ],
+            "most_complex_functions": [
+                {"path": path, "name": name, "line": line, "complexity": complexity}
+                for complexity, path, name, line in sorted(self._complex_functions, reverse=True)
+            ],
+            "most_imported": [{"module": module, "files": count} for module, count in self.imports.most_common(self.TOP_N)],
+            "errors": self.errors
+        }
@@ -0,0 +1,167 @@
+"""
+Serialization - Codec registry shared by every layer of the YMERA system
+
+Picks the fastest JSON implementation that is installed (orjson, then the
+standard library) and offers msgpack as a binary codec for internal hops.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Union
+import json
+import logging
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# The logger module serializes through this registry, so use plain logging here
+logger = logging.getLogger(__name__)
+
+# Header naming the codec of a binary message payload
+CONTENT_TYPE_HEADER = "Content-Type"
+
+
+class Codec(ABC):
+    """Serialization codec interface"""
+    
+    name = "codec"
+    content_type = "application/octet-stream"
+    
+    @abstractmethod
+    def encode(self, obj: Any) -> bytes:
+        """Serialize an object to bytes"""
+        pass
+    
+    @abstractmethod
+    def decode(self, data: Union[bytes, str]) -> Any:
+        """Deserialize bytes (or text) to an object"""
+        pass
+
+
+class StdlibJSONCodec(Codec):
+    """JSON codec backed by the standard library"""
+    
+    name = "json-stdlib"
+    content_type = "application/json"
+    
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+    
+    def decode(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+    
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        return json.dumps(obj, indent=2 if indent else None)
+
+
+class OrjsonCodec(StdlibJSONCodec):
+    """
+    JSON codec backed by orjson.
+    
+    Objects orjson refuses (e.g. integers above 64 bits) fall back to the
+    standard library, so it is a drop-in replacement.
+    """
+    
+    name = "orjson"
+    
+    def encode(self, obj: Any, option: int = 0) -> bytes:
+        try:
+            return orjson.dumps(obj, option=option | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super().encode(obj)
+    
+    def decode(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+    
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        return self.encode(obj, orjson.OPT_INDENT_2 if indent else 0).decode()
+
+
+class MsgpackCodec(Codec):
+    """Binary msgpack codec for internal hops"""
+    
+    name = "msgpack"
+    content_type = "application/msgpack"
+    
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+    
+    def decode(self, data: Union[bytes, str]) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+_codecs: Dict[str, Codec] = {}
+_content_types: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Register a codec under its name and content type"""
+    _codecs[codec.name] = codec
+    _content_types.setdefault(codec.content_type, codec)
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Get a codec by name.
+    
+    Args:
+        name: Codec name ("json", "json-stdlib", "orjson", "msgpack");
+            None or "json" returns the fastest installed JSON codec
+    
+    Returns:
+        The codec, or the JSON codec if the requested one is not installed
+    """
+    if name in (None, "json"):
+        return json_codec
+    if name not in _codecs:
+        logger.warning(f"Codec '{name}' not available. Falling back to {json_codec.name}.")
+        return json_codec
+    return _codecs[name]
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """Get all registered codecs by name"""
+    return dict(_codecs)
+
+
+def get_codec_for_content_type(content_type: Optional[str]) -> Codec:
+    """Get the codec for a Content-Type header (JSON if missing)"""
+    if not content_type:
+        return json_codec
+    if content_type == json_codec.content_type:
+        return json_codec
+    if content_type not in _content_types:
+        raise ValueError(f"Unsupported content type: {content_type}")
+    return _content_types[content_type]
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize an object to a JSON string with the fastest installed JSON codec"""
+    return json_codec.dumps(obj, indent=indent)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Deserialize a JSON string or bytes with the fastest installed JSON codec"""
+    return json_codec.decode(data)
+
+
+def dumpb(obj: Any) -> bytes:
+    """Serialize an object to JSON bytes"""
+    return json_codec.encode(obj)
+
+
+register_codec(StdlibJSONCodec())
+if ORJSON_AVAILABLE:
+    register_codec(OrjsonCodec())
+if MSGPACK_AVAILABLE:
+    register_codec(MsgpackCodec())
+
+# Fastest JSON implementation available
+json_codec: StdlibJSONCodec = _codecs["orjson"] if ORJSON_AVAILABLE else _codecs["json-stdlib"]
@@ -0,0 +1,499 @@
+"""
+Sharding - Consistent-hash ring and a sharded message broker built on CommunicationAgent
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from bisect import bisect
+import asyncio
+import hashlib
+import multiprocessing
+import pickle
+import threading
+
+from agent_communication import CommunicationAgent
+from logger import logger
+
+
+def stable_hash(key: str) -> int:
+    """64-bit hash that is identical across processes (unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring with virtual nodes.
+    
+    Every node owns `vnodes` points on the ring and a key belongs to the node
+    owning the first point at or after the key's hash. Adding or removing a
+    node only moves the keys of the affected arcs (about 1/N of them). Lookups
+    are cached until the ring changes.
+    """
+    
+    DEFAULT_VNODES = 128
+    DEFAULT_CACHE_SIZE = 65536
+    
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = DEFAULT_VNODES,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        self.vnodes = vnodes
+        self.cache_size = cache_size
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._cache: Dict[str, str] = {}
+        self.stats = {"lookups": 0, "cache_hits": 0}
+        for node in nodes:
+            self.add_node(node)
+    
+    def add_node(self, node: str) -> None:
+        """Add a node to the ring"""
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        self._rebuild()
+    
+    def remove_node(self, node: str) -> None:
+        """Remove a node from the ring"""
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        self._rebuild()
+    
+    def get_node(self, key: str) -> str:
+        """
+        Get the node owning a key.
+        
+        Raises:
+            ValueError: If the ring has no nodes
+        """
+        self.stats["lookups"] += 1
+        node = self._cache.get(key)
+        if node is not None:
+            self.stats["cache_hits"] += 1
+            return node
+        if not self._points:
+            raise ValueError("Hash ring has no nodes")
+        
+        index = bisect(self._points, stable_hash(key)) % len(self._points)
+        node = self._owners[index]
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = node
+        return node
+    
+    def _rebuild(self) -> None:
+        ring = sorted(
+            (stable_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(self.vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+        self._cache.clear()
+
+
+class ShardError(RuntimeError):
+    """A shard process failed a call or exited"""
+
+
+class LocalShard:
+    """
+    A broker shard served by a CommunicationAgent in this process.
+    
+    Agent state only crosses the shard boundary through these methods, so the
+    same interface is served in a shard process (see ShardProcess).
+    """
+    
+    def __init__(self, agent: CommunicationAgent):
+        self.agent = agent
+    
+    async def start(self) -> None:
+        """Nothing to start: the agent is initialized by whoever created it"""
+    
+    async def register_agent(self, agent_id: str, agent_type: Optional[str] = None, ordered: bool = False) -> None:
+        """Register an agent on this shard"""
+        await self.agent.register_agent(agent_id, agent_type, ordered=ordered)
+    
+    async def unregister_agent(self, agent_id: str) -> None:
+        """Unregister an agent from this shard"""
+        await self.agent.unregister_agent(agent_id)
+    
+    async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Route a message through this shard's agent"""
+        return await self.agent.process_message(message)
+    
+    async def pick_agent(self, agent_type: str) -> Optional[Tuple[int, str]]:
+        """Get the least loaded local agent of a type and its queue depth"""
+        agent_id = self.agent._pick_agent_of_type(agent_type)
+        return (self.agent.message_broker[agent_id].qsize(), agent_id) if agent_id else None
+    
+    async def agent_ids(self) -> List[str]:
+        """Get the IDs of the agents registered on this shard"""
+        return list(self.agent.message_broker)
+    
+    async def queue_size(self, agent_id: str) -> int:
+        """Get the number of queued messages of an agent"""
+        return self.agent.message_broker[agent_id].qsize()
+    
+    async def receive(self, agent_id: str, max_messages: int = 100) -> List[Dict[str, Any]]:
+        """Take up to max_messages queued messages of an agent without waiting"""
+        queue = self.agent.message_broker[agent_id]
+        return [queue.get_nowait() for _ in range(min(max_messages, queue.qsize()))]
+    
+    async def export_agent(self, agent_id: str) -> Dict[str, Any]:
+        """Unregister an agent and return its registration and queued messages"""
+        state = {
+            "agent_id": agent_id,
+            "agent_type": self.agent.agent_types.get(agent_id),
+            "ordered": agent_id in self.agent.ordered_agents,
+            "messages": await self.receive(agent_id, self.agent.message_broker[agent_id].qsize())
+        }
+        await self.agent.unregister_agent(agent_id)
+        self.agent.agent_types.pop(agent_id, None)
+        self.agent.ordered_agents.discard(agent_id)
+        return state
+    
+    async def import_agent(self, state: Dict[str, Any]) -> None:
+        """Register an exported agent here, queued messages first"""
+        await self.register_agent(state["agent_id"], state["agent_type"], ordered=state["ordered"])
+        queue = self.agent.message_broker[state["agent_id"]]
+        for message in state["messages"]:
+            queue.put_nowait(message)
+    
+    async def get_statistics(self) -> Dict[str, Any]:
+        """Get the shard's agent and message counts"""
+        return {
+            "registered_agents": len(self.agent.message_broker),
+            "total_messages": len(self.agent.message_history)
+        }
+    
+    async def cleanup(self) -> None:
+        """Clean up the shard's agent"""
+        await self.agent.cleanup()
+
+
+def _picklable(value: Any) -> bool:
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
+
+
+def _serve_shard(conn, name: str, config: Dict[str, Any]) -> None:
+    """Shard process entry point"""
+    asyncio.run(_serve_shard_async(conn, name, config))
+
+
+async def _serve_shard_async(conn, name: str, config: Dict[str, Any]) -> None:
+    agent = CommunicationAgent(name, config)
+    await agent.initialize()
+    shard = LocalShard(agent)
+    loop = asyncio.get_running_loop()
+    requests: asyncio.Queue = asyncio.Queue()
+    
+    def read() -> None:
+        # Reading on a thread keeps the pipe drained while replies are sent,
+        # so neither side can block the other on a full pipe
+        while True:
+            try:
+                batch = conn.recv()
+            except (EOFError, OSError):
+                batch = None
+            loop.call_soon_threadsafe(requests.put_nowait, batch)
+            if batch is None:
+                return
+    
+    threading.Thread(target=read, name=f"{name}-reader", daemon=True).start()
+    while True:
+        batch = await requests.get()
+        if batch is None:
+            break
+        replies = []
+        for call_id, method, args in batch:
+            try:
+                replies.append((call_id, True, await getattr(shard, method)(*args)))
+            except Exception as e:
+                replies.append((call_id, False, e if _picklable(e) else ShardError(f"{type(e).__name__}: {e}")))
+        conn.send(replies)
+    await agent.cleanup()
+    conn.close()
+
+
+class ShardProcess:
+    """
+    A broker shard served by a CommunicationAgent in its own process.
+    
+    The shard's agent has its own event loop, CPU and broker connection (it
+    connects to nats_servers itself). Calls made in the same event loop
+    iteration are pickled and sent as one batch, and replies come back the
+    same way, so the pipe costs little per message when many are in flight.
+    """
+    
+    MAX_BATCH = 512  # calls per pipe write
+    
+    def __init__(self, name: str, config: Optional[Dict[str, Any]] = None, mp_context=None):
+        """
+        Initialize the shard; the process starts with start().
+        
+        Args:
+            name: Shard name, also the ID of the shard's communication agent
+            config: CommunicationAgent config for the shard (must be picklable)
+            mp_context: multiprocessing context for the shard process
+        """
+        self.name = name
+        self.config = dict(config or {})
+        self._mp_context = mp_context or multiprocessing.get_context()
+        self._process = None
+        self._conn = None
+        self._calls: Dict[int, asyncio.Future] = {}
+        self._outgoing: List[Tuple[int, str, tuple]] = []
+        self._next_call = 0
+        self.stats = {"calls": 0, "batches": 0}
+    
+    async def start(self) -> None:
+        """Start the shard process and wait until its agent is initialized"""
+        if self._process:
+            return
+        conn, child_conn = self._mp_context.Pipe()
+        self._process = self._mp_context.Process(
+            target=_serve_shard, args=(child_conn, self.name, self.config), name=f"shard-{self.name}", daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = conn
+        asyncio.get_running_loop().add_reader(conn.fileno(), self._read_replies)
+        await self.get_statistics()
+    
+    def _call(self, method: str, *args: Any) -> asyncio.Future:
+        if not self._conn:
+            raise ShardError(f"Shard {self.name} is not running")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._next_call += 1
+        self._calls[self._next_call] = future
+        if not self._outgoing:
+            loop.call_soon(self._flush)
+        self._outgoing.append((self._next_call, method, args))
+        self.stats["calls"] += 1
+        if len(self._outgoing) >= self.MAX_BATCH:
+            self._flush()
+        return future
+    
+    def _flush(self) -> None:
+        if not self._outgoing or not self._conn:
+            return
+        batch, self._outgoing = self._outgoing, []
+        self.stats["batches"] += 1
+        try:
+            self._conn.send(batch)
+        except OSError as e:
+            self._fail_calls(f"Shard {self.name} is unreachable: {e}")
+    
+    def _read_replies(self) -> None:
+        try:
+            replies = self._conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(self._conn.fileno())
+            self._fail_calls(f"Shard {self.name} exited")
+            return
+        for call_id, ok, result in replies:
+            future = self._calls.pop(call_id, None)
+            if future is None or future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                # The shard's own exception, e.g. KeyError for an unknown agent
+                future.set_exception(result)
+    
+    def _fail_calls(self, error: str) -> None:
+        calls, self._calls = self._calls, {}
+        for future in calls.values():
+            if not future.done():
+                future.set_exception(ShardError(error))
+    
+    async def register_agent(self, agent_id: str, agent_type: Optional[str] = None, ordered: bool = False) -> None:
+        await self._call("register_agent", agent_id, agent_type, ordered)
+    
+    async def unregister_agent(self, agent_id: str) -> None:
+        await self._call("unregister_agent", agent_id)
+    
+    async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("process_message", message)
+    
+    async def pick_agent(self, agent_type: str) -> Optional[Tuple[int, str]]:
+        return await self._call("pick_agent", agent_type)
+    
+    async def agent_ids(self) -> List[str]:
+        return await self._call("agent_ids")
+    
+    async def queue_size(self, agent_id: str) -> int:
+        return await self._call("queue_size", agent_id)
+    
+    async def receive(self, agent_id: str, max_messages: int = 100) -> List[Dict[str, Any]]:
+        return await self._call("receive", agent_id, max_messages)
+    
+    async def export_agent(self, agent_id: str) -> Dict[str, Any]:
+        return await self._call("export_agent", agent_id)
+    
+    async def import_agent(self, state: Dict[str, Any]) -> None:
+        await self._call("import_agent", state)
+    
+    async def get_statistics(self) -> Dict[str, Any]:
+        return {**await self._call("get_statistics"), **self.stats}
+    
+    async def cleanup(self) -> None:
+        """Stop the shard's agent and wait for the process to exit"""
+        if not self._conn:
+            return
+        self._flush()
+        # Let calls in flight finish before the shard stops
+        if self._calls:
+            await asyncio.wait(list(self._calls.values()), timeout=10)
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        await asyncio.to_thread(self._process.join, 10)
+        if self._process.is_alive():
+            self._process.terminate()
+        asyncio.get_running_loop().remove_reader(self._conn.fileno())
+        self._fail_calls(f"Shard {self.name} stopped")
+        self._conn.close()
+        self._conn = None
+        self._process = None
+
+
+Shard = Union[LocalShard, ShardProcess]
+
+
+class ShardedBroker:
+    """
+    Routes messages across several broker shards.
+    
+    Each agent is registered on the shard that owns its ID on the hash ring,
+    so every shard holds only its part of the broker map and routes only its
+    part of the traffic. Shards are either CommunicationAgents in this process
+    or ShardProcesses, which route on their own CPU and broker connection.
+    Shards can be added or removed at runtime; only the agents whose owner
+    changed are moved, together with their queued messages.
+    """
+    
+    def __init__(self, shards: Dict[str, Union[CommunicationAgent, Shard]], vnodes: int = HashRing.DEFAULT_VNODES):
+        """
+        Initialize the broker.
+        
+        Args:
+            shards: Shards keyed by name (CommunicationAgents must be initialized)
+            vnodes: Virtual nodes per shard on the hash ring
+        """
+        self.shards: Dict[str, Shard] = {name: self._as_shard(shard) for name, shard in shards.items()}
+        self.ring = HashRing(self.shards, vnodes=vnodes)
+        self.stats = {"routed": 0, "broadcasts": 0, "agents_moved": 0}
+    
+    @staticmethod
+    def _as_shard(shard: Union[CommunicationAgent, Shard]) -> Shard:
+        return LocalShard(shard) if isinstance(shard, CommunicationAgent) else shard
+    
+    async def start(self) -> None:
+        """Start the shard processes"""
+        await asyncio.gather(*(shard.start() for shard in self.shards.values()))
+    
+    def shard_for(self, agent_id: str) -> Shard:
+        """Get the shard owning an agent"""
+        return self.shards[self.ring.get_node(agent_id)]
+    
+    async def register_agent(self, agent_id: str, agent_type: Optional[str] = None, ordered: bool = False) -> None:
+        """Register an agent on its owning shard"""
+        await self.shard_for(agent_id).register_agent(agent_id, agent_type, ordered=ordered)
+    
+    async def unregister_agent(self, agent_id: str) -> None:
+        """Unregister an agent from its owning shard"""
+        await self.shard_for(agent_id).unregister_agent(agent_id)
+    
+    async def receive(self, agent_id: str, max_messages: int = 100) -> List[Dict[str, Any]]:
+        """Take up to max_messages queued messages of an agent"""
+        return await self.shard_for(agent_id).receive(agent_id, max_messages)
+    
+    async def queue_size(self, agent_id: str) -> int:
+        """Get the number of queued messages of an agent"""
+        return await self.shard_for(agent_id).queue_size(agent_id)
+    
+    async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Route a message through the shard owning its target.
+        
+        Messages addressed to an agent type go to the least loaded agent of
+        that type across all shards; broadcasts go to every shard.
+        """
+        self.stats["routed"] += 1
+        target = message.get("to")
+        if target:
+            return await self.shard_for(target).process_message(message)
+        
+        if message.get("to_type"):
+            picks = await asyncio.gather(*(shard.pick_agent(message["to_type"]) for shard in self.shards.values()))
+            candidates = [(*pick, name) for name, pick in zip(self.shards, picks) if pick]
+            if not candidates:
+                return {"status": "error", "error": f"No agent of type registered: {message['to_type']}"}
+            _, agent_id, name = min(candidates)
+            return await self.shards[name].process_message({**message, "to": agent_id})
+        
+        self.stats["broadcasts"] += 1
+        results = await asyncio.gather(*(shard.process_message(dict(message)) for shard in self.shards.values()))
+        recipients = sum(result.get("recipients", 0) for result in results)
+        return {"status": "broadcast", "message_id": message.get("message_id", "unknown"), "recipients": recipients}
+    
+    async def add_shard(self, name: str, shard: Union[CommunicationAgent, Shard]) -> int:
+        """
+        Add a shard and move the agents it now owns.
+        
+        Returns:
+            Number of agents moved
+        """
+        shard = self._as_shard(shard)
+        await shard.start()
+        self.shards[name] = shard
+        self.ring.add_node(name)
+        return await self._rebalance()
+    
+    async def remove_shard(self, name: str) -> int:
+        """
+        Remove a shard and move its agents to their new owners.
+        
+        Returns:
+            Number of agents moved
+        """
+        self.ring.remove_node(name)
+        moved = await self._rebalance()
+        shard = self.shards.pop(name)
+        await shard.cleanup()
+        return moved
+    
+    async def _rebalance(self) -> int:
+        moved = 0
+        for name, shard in self.shards.items():
+            for agent_id in await shard.agent_ids():
+                owner = self.ring.get_node(agent_id)
+                if owner == name:
+                    continue
+                # Queued messages follow the agent
+                await self.shards[owner].import_agent(await shard.export_agent(agent_id))
+                moved += 1
+        self.stats["agents_moved"] += moved
+        if moved:
+            logger.info(f"Rebalanced {moved} agents across {len(self.shards)} shards")
+        return moved
+    
+    async def cleanup(self) -> None:
+        """Clean up all shards"""
+        for shard in self.shards.values():
+            await shard.cleanup()
+    
+    async def get_statistics(self) -> Dict[str, Any]:
+        """Get routing statistics per shard"""
+        shard_stats = await asyncio.gather(*(shard.get_statistics() for shard in self.shards.values()))
+        return {
+            **self.stats,
+            "ring": {"nodes": len(self.ring.nodes), "vnodes": self.ring.vnodes, **self.ring.stats},
+            "shards": dict(zip(self.shards, shard_stats))
+        }
@@ -0,0 +1,340 @@
+"""
+Shared Memory Transport - Same-host message passing between agent processes over ring buffers
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import asyncio
+import os
+import random
+import struct
+import time
+
+from logger import logger
+from serialization import Codec, get_codec
+
+
+_U64 = struct.Struct("<Q")
+_U32 = struct.Struct("<I")
+
+
+class SharedMemoryRing:
+    """
+    Single-producer single-consumer byte ring in a named shared memory segment.
+    
+    The segment starts with the write counter and the read counter on
+    separate cache lines (the creator also stores the data area size and a
+    random epoch next to the write counter), followed by the data area.
+    Records are a 4-byte length and the payload, padded to 8 bytes; a record
+    that does not fit before the end of the data area is preceded by a wrap
+    marker. Counters only grow, so head == tail means empty and head - tail
+    is the fill level. Removing the segment zeroes its epoch, which tells a
+    peer still mapping it that the ring is `stale`.
+    """
+    
+    HEAD_OFFSET = 0
+    CAPACITY_OFFSET = 8
+    EPOCH_OFFSET = 16
+    TAIL_OFFSET = 64
+    DATA_OFFSET = 128
+    WRAP_MARKER = 0xFFFFFFFF
+    DEFAULT_CAPACITY = 1 << 20  # bytes
+    ATTACH_TIMEOUT = 1.0  # seconds to wait for the creator to write the header
+    
+    def __init__(self, name: str, capacity: int = DEFAULT_CAPACITY):
+        """
+        Create the segment, or attach to it if the peer created it first.
+        
+        Args:
+            name: Segment name shared by both processes
+            capacity: Data area size in bytes (multiple of 8)
+        
+        Raises:
+            ValueError: If the capacity is not a positive multiple of 8
+        """
+        if capacity <= 0 or capacity % 8:
+            raise ValueError(f"Ring capacity must be a positive multiple of 8, got {capacity}")
+        self.name = name
+        self.capacity = capacity
+        try:
+            self._shm = SharedMemory(name=name, create=True, size=self.DATA_OFFSET + capacity)
+            self.epoch = random.getrandbits(63) | 1
+            _U64.pack_into(self._shm.buf, self.EPOCH_OFFSET, self.epoch)
+            # Written last: attachers wait for it before reading the epoch
+            _U64.pack_into(self._shm.buf, self.CAPACITY_OFFSET, capacity)
+        except FileExistsError:
+            self._shm = SharedMemory(name=name)
+            # The segment size may be rounded up to a page, so use the size
+            # the creator recorded
+            self.capacity = self._wait_for_capacity()
+            self.epoch = _U64.unpack_from(self._shm.buf, self.EPOCH_OFFSET)[0]
+        # The resource tracker keys POSIX segments by their name with the
+        # leading slash, which SharedMemory.name strips
+        self._tracker_name = "/" + self._shm.name if os.name == "posix" else None
+        # The consumer unlinks the segment; keep the resource tracker from
+        # unlinking it when whichever process created it exits
+        if self._tracker_name:
+            resource_tracker.unregister(self._tracker_name, "shared_memory")
+        self._buf = self._shm.buf
+        self._read_end: Optional[int] = None
+    
+    def _wait_for_capacity(self) -> int:
+        """Read the data area size, waiting for a creator that has not stored it yet"""
+        deadline = time.monotonic() + self.ATTACH_TIMEOUT
+        while True:
+            capacity = _U64.unpack_from(self._shm.buf, self.CAPACITY_OFFSET)[0]
+            if capacity:
+                return capacity
+            if time.monotonic() > deadline:
+                self._shm.close()
+                raise RuntimeError(f"Shared memory ring {self.name} has no capacity header")
+            time.sleep(0.001)
+    
+    @property
+    def stale(self) -> bool:
+        """Whether the segment was removed (the consumer closed it) since it was attached"""
+        return _U64.unpack_from(self._buf, self.EPOCH_OFFSET)[0] != self.epoch
+    
+    def write(self, data: bytes) -> bool:
+        """
+        Append a record.
+        
+        Returns:
+            False if the ring does not have room or is stale (the record is not written)
+        """
+        if self.stale:
+            return False
+        size = len(data)
+        need = (4 + size + 7) & ~7
+        head = _U64.unpack_from(self._buf, self.HEAD_OFFSET)[0]
+        tail = _U64.unpack_from(self._buf, self.TAIL_OFFSET)[0]
+        pos = head % self.capacity
+        pad = self.capacity - pos if pos + need > self.capacity else 0
+        if head + pad + need - tail > self.capacity:
+            return False
+        
+        if pad:
+            _U32.pack_into(self._buf, self.DATA_OFFSET + pos, self.WRAP_MARKER)
+            head += pad
+            pos = 0
+        start = self.DATA_OFFSET + pos
+        _U32.pack_into(self._buf, start, size)
+        self._buf[start + 4:start + 4 + size] = data
+        # Publish the record only after its bytes are in place
+        _U64.pack_into(self._buf, self.HEAD_OFFSET, head + need)
+        return True
+    
+    def read(self) -> Optional[memoryview]:
+        """
+        Get the oldest record without copying it.
+        
+        The returned view points into shared memory and stays valid until
+        `release()` is called, which frees the space for the producer. The
+        caller must release the view (or drop it) before the ring is closed.
+        
+        Returns:
+            View of the payload bytes, or None if the ring is empty
+        """
+        head = _U64.unpack_from(self._buf, self.HEAD_OFFSET)[0]
+        tail = _U64.unpack_from(self._buf, self.TAIL_OFFSET)[0]
+        if tail == head:
+            return None
+        
+        pos = tail % self.capacity
+        size = _U32.unpack_from(self._buf, self.DATA_OFFSET + pos)[0]
+        if size == self.WRAP_MARKER:
+            tail += self.capacity - pos
+            _U64.pack_into(self._buf, self.TAIL_OFFSET, tail)
+            return self.read()
+        
+        self._read_end = tail + ((4 + size + 7) & ~7)
+        start = self.DATA_OFFSET + pos + 4
+        return self._buf[start:start + size]
+    
+    def release(self) -> None:
+        """Free the record returned by the last `read()`"""
+        if self._read_end is not None:
+            _U64.pack_into(self._buf, self.TAIL_OFFSET, self._read_end)
+            self._read_end = None
+    
+    def depth(self) -> int:
+        """Bytes written but not yet consumed"""
+        head = _U64.unpack_from(self._buf, self.HEAD_OFFSET)[0]
+        tail = _U64.unpack_from(self._buf, self.TAIL_OFFSET)[0]
+        return head - tail
+    
+    def close(self, unlink: bool = False) -> None:
+        """Detach from the segment (and remove it if unlink is True)"""
+        if unlink:
+            _U64.pack_into(self._buf, self.EPOCH_OFFSET, 0)
+        self._buf = None
+        self._shm.close()
+        if unlink:
+            # unlink() unregisters from the resource tracker, so register first
+            if self._tracker_name:
+                resource_tracker.register(self._tracker_name, "shared_memory")
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedMemoryTransport:
+    """
+    Sends messages to agents hosted by other processes on the same host.
+    
+    Every process has a name, and `agent_hosts` maps agent IDs to the process
+    hosting them. Each ordered pair of processes gets its own ring, so every
+    ring has exactly one producer and one consumer and needs no locks.
+    Received payloads are decoded straight from shared memory.
+    """
+    
+    DEFAULT_NAMESPACE = "ymera"
+    POLL_BATCH = 256  # records per ring per poll
+    MAX_IDLE_SLEEP = 0.001  # seconds
+    BUSY_POLLS = 64  # polls without sleeping after the last message
+    
+    def __init__(
+        self,
+        process_name: str,
+        agent_hosts: Dict[str, str],
+        deliver: Callable[[Dict[str, Any]], Awaitable[Any]],
+        codec: Optional[Codec] = None,
+        capacity: int = SharedMemoryRing.DEFAULT_CAPACITY,
+        namespace: str = DEFAULT_NAMESPACE
+    ):
+        """
+        Initialize the transport.
+        
+        Args:
+            process_name: Name of this process
+            agent_hosts: Agent ID -> name of the process hosting it
+            deliver: Coroutine delivering a received message locally
+            codec: Payload codec (fastest JSON codec if None)
+            capacity: Ring size in bytes
+            namespace: Prefix of the shared memory segment names
+        """
+        self.process_name = process_name
+        self.agent_hosts = dict(agent_hosts)
+        self.deliver = deliver
+        self.codec = codec or get_codec()
+        self.capacity = capacity
+        self.namespace = namespace
+        self.inbox: Dict[str, SharedMemoryRing] = {}
+        self.outbox: Dict[str, SharedMemoryRing] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "sent": 0,
+            "received": 0,
+            "ring_full": 0,
+            "reattached": 0,
+            "bytes_sent": 0
+        }
+    
+    def _ring_name(self, source: str, destination: str) -> str:
+        return f"{self.namespace}_{source}_{destination}"
+    
+    def is_remote(self, agent_id: Optional[str]) -> bool:
+        """Check whether an agent is hosted by another process on this host"""
+        host = self.agent_hosts.get(agent_id) if agent_id else None
+        return host is not None and host != self.process_name
+    
+    def start(self) -> None:
+        """Open the inbox rings from every peer process and start polling them"""
+        for peer in set(self.agent_hosts.values()) - {self.process_name}:
+            if peer not in self.inbox:
+                self.inbox[peer] = SharedMemoryRing(self._ring_name(peer, self.process_name), self.capacity)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+    
+    def send(self, message: Dict[str, Any]) -> bool:
+        """
+        Write a message to the ring of the process hosting its target.
+        
+        Returns:
+            False if the ring is full or the message does not fit (send it another way)
+        """
+        host = self.agent_hosts[message["to"]]
+        ring = self.outbox.get(host)
+        if ring is not None and ring.stale:
+            # The peer removed its inbox (e.g. it restarted); writing to the old
+            # segment would lose every message, so attach to the current one
+            ring.close()
+            ring = None
+            self.stats["reattached"] += 1
+        if ring is None:
+            ring = self.outbox[host] = SharedMemoryRing(self._ring_name(self.process_name, host), self.capacity)
+        
+        data = self.codec.encode(message)
+        if not ring.write(data):
+            self.stats["ring_full"] += 1
+            return False
+        self.stats["sent"] += 1
+        self.stats["bytes_sent"] += len(data)
+        return True
+    
+    def poll_once(self, limit: int = POLL_BATCH) -> list:
+        """Read and decode up to `limit` messages from each inbox ring"""
+        messages = []
+        for ring in self.inbox.values():
+            for _ in range(limit):
+                view = ring.read()
+                if view is None:
+                    break
+                try:
+                    messages.append(self._decode(view))
+                finally:
+                    view.release()
+                    ring.release()
+        self.stats["received"] += len(messages)
+        return messages
+    
+    def _decode(self, view: memoryview) -> Dict[str, Any]:
+        try:
+            return self.codec.decode(view)
+        except TypeError:
+            # The standard library json module does not read buffers
+            return self.codec.decode(bytes(view))
+    
+    async def _poll(self) -> None:
+        """Deliver received messages; spin briefly after traffic, then back off"""
+        idle = 0
+        while True:
+            messages = self.poll_once()
+            for message in messages:
+                try:
+                    await self.deliver(message)
+                except Exception as e:
+                    logger.error(f"Failed to deliver shared memory message: {e}", exc_info=True)
+            
+            if messages:
+                idle = 0
+                await asyncio.sleep(0)
+            else:
+                idle = min(idle + 1, self.BUSY_POLLS + 8)
+                delay = 0 if idle < self.BUSY_POLLS else min(self.MAX_IDLE_SLEEP, 1e-5 * 2 ** (idle - self.BUSY_POLLS))
+                await asyncio.sleep(delay)
+    
+    async def close(self) -> None:
+        """Stop polling and detach from all rings (inbox rings are removed)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for ring in self.inbox.values():
+            ring.close(unlink=True)
+        for ring in self.outbox.values():
+            ring.close()
+        self.inbox.clear()
+        self.outbox.clear()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get transport counters and ring fill levels"""
+        return {
+            **self.stats,
+            "inbox_depth": {peer: ring.depth() for peer, ring in self.inbox.items()},
+            "outbox_depth": {peer: ring.depth() for peer, ring in self.outbox.items()}
+        }
@@ -0,0 +1,126 @@
+"""
+Tests for micro-batching of outgoing messages
+"""
+import pytest
+import asyncio
+
+from agent_communication import CommunicationAgent
+from batching import AIMDController, MicroBatcher
+from fake_jetstream import FakeJetStreamServer
+
+
+def test_aimd_grows_additively_and_backs_off_multiplicatively():
+    """Test full fast batches grow the size and a slow publish halves it"""
+    controller = AIMDController(initial_size=1, max_size=8, target_latency=0.01)
+    for _ in range(10):
+        controller.observe(0.001, controller.size)
+    assert controller.size == 8
+    
+    controller.observe(0.05, 8)
+    assert controller.size == 4
+    
+    # A batch that did not fill is no reason to grow
+    controller.observe(0.001, 1)
+    assert controller.size == 4
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_coalesces_concurrent_submits():
+    """Test items queue behind the batch in flight and each caller gets its own result"""
+    batches = []
+    
+    async def publish(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+    
+    batcher = MicroBatcher(publish, max_delay=0.01, controller=AIMDController(max_size=4))
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    
+    assert results == [i * 10 for i in range(10)]
+    # The first item goes out alone, the rest fill batches behind it
+    assert [len(batch) for batch in batches] == [1, 4, 4, 1]
+    stats = batcher.get_statistics()
+    assert (stats["flushed_idle"], stats["flushed_full"], stats["flushed_ack"]) == (1, 2, 1)
+    
+    # A lone sender is not delayed
+    assert await asyncio.wait_for(batcher.submit(7), timeout=0.005) == 70
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_fails_every_item_of_a_failed_batch():
+    """Test a publish error reaches every caller in the batch"""
+    async def publish(items):
+        raise ConnectionError("broker down")
+    
+    batcher = MicroBatcher(publish, controller=AIMDController(initial_size=2))
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert batcher.controller.size == 1
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_publishes_batches(tmp_path):
+    """Test batched messages are delivered and replayed individually and in order"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "send_batching": True,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "outbox_path": str(tmp_path / "outbox.jsonl")
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("worker")
+    
+    results = await asyncio.gather(*(
+        comm_agent.process_message({"from": "chatty", "to": "worker", "payload": {"n": i}})
+        for i in range(100)
+    ))
+    assert all(result["status"] == "published" for result in results)
+    
+    delivered = []
+    while len(delivered) < 100:
+        message = await asyncio.wait_for(comm_agent.message_broker["worker"].get(), timeout=1.0)
+        delivered.append(message["payload"]["n"])
+    assert delivered == list(range(100))
+    
+    stats = comm_agent.get_statistics()["send_batching"]
+    assert stats["messages"] == 100
+    assert stats["batches"] < 100
+    assert server.stats["published"] == stats["batches"]
+    
+    replayed = [message["payload"]["n"] async for message in comm_agent.replay_messages("worker")]
+    assert replayed == list(range(100))
+    
+    await comm_agent.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_dead_letters_each_message(tmp_path):
+    """Test a batch out of delivery attempts is terminated and its messages dead-lettered one by one"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "send_batching": True,
+        "max_delivery_attempts": 1,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "outbox_path": str(tmp_path / "outbox.jsonl")
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("worker")
+    
+    async def failing_route(message):
+        raise RuntimeError("worker crashed")
+    
+    comm_agent._route_message = failing_route
+    await asyncio.gather(*(
+        comm_agent.process_message({"from": "chatty", "to": "worker", "payload": {"n": i}})
+        for i in range(5)
+    ))
+    await asyncio.sleep(0.1)
+    
+    dead = comm_agent.dead_letters.list()
+    assert sorted(record["message"]["payload"]["n"] for record in dead) == list(range(5))
+    assert all(record["last_error"] == "worker crashed" for record in dead)
+    assert comm_agent.get_statistics()["send_batching"]["batches"] < 5
+    
+    await comm_agent.cleanup()
@@ -0,0 +1,151 @@
+"""
+Tests for the content-addressed blob store and claim check
+"""
+import pytest
+import os
+import time
+
+from agent_communication import CommunicationAgent
+from blob_store import BLOB_REF_KEY, BLOB_REFS_FIELD, BlobStore, ClaimCheck
+from dead_letter import DeadLetterQueue
+
+
+def test_blob_store_deduplicates_identical_content(tmp_path):
+    """Test identical blobs are stored once under their digest"""
+    store = BlobStore(str(tmp_path / "blobs"))
+    first = store.put(b"x" * 1000)
+    second = store.put(b"x" * 1000)
+    other = store.put(b"y" * 1000)
+    
+    assert first == second != other
+    assert store.get(first) == b"x" * 1000
+    assert store.stats["stored"] == 2
+    assert store.stats["bytes_deduplicated"] == 1000
+    
+    # Another process sharing the directory sees the blob
+    assert BlobStore(str(tmp_path / "blobs")).contains(first)
+    assert store.delete(first)
+    with pytest.raises(KeyError):
+        store.get(first)
+    with pytest.raises(KeyError):
+        store.get("../" + first[3:])
+
+
+def test_blob_store_purges_expired_blobs(tmp_path):
+    """Test blobs expire a TTL after they were last stored and storing them again renews them"""
+    store = BlobStore(str(tmp_path), ttl=60)
+    old = store.put(b"old" * 100)
+    renewed = store.put(b"renewed" * 100)
+    an_hour_ago = time.time() - 3600
+    for digest in (old, renewed):
+        os.utime(store._blob_path(digest), (an_hour_ago, an_hour_ago))
+    store._known.clear()
+    store.put(b"renewed" * 100)
+    
+    assert store.purge_expired() == 1
+    assert not store.contains(old)
+    assert store.get(renewed) == b"renewed" * 100
+    assert store.stats["expired"] == 1
+    assert store.purge_expired(now=time.time() + 120) == 1
+
+
+def test_claim_check_round_trip(tmp_path):
+    """Test only large values are replaced and resolve back to the original"""
+    claim_check = ClaimCheck(BlobStore(str(tmp_path)), threshold=100)
+    code = "def f():\n    return 1\n" * 20
+    payload = {"task": "review", "files": [{"name": "a.py", "code": code}], "image": b"\x00" * 200}
+    
+    checked, refs = claim_check.check_in(payload)
+    assert checked["task"] == "review"
+    assert refs == [["files", 0, "code"], ["image"]]
+    assert checked["image"]["size"] == 200
+    assert payload["files"][0]["code"] == code
+    
+    assert claim_check.load(checked["files"][0]["code"]) == code
+    assert claim_check.resolve(checked, refs) == payload
+    
+    small = {"task": "ping"}
+    assert claim_check.check_in(small) == (small, [])
+    assert claim_check.check_in(small)[0] is small
+
+
+def test_claim_check_threshold_counts_bytes(tmp_path):
+    """Test the threshold applies to the UTF-8 encoded size of strings"""
+    claim_check = ClaimCheck(BlobStore(str(tmp_path)), threshold=100)
+    _, refs = claim_check.check_in({"ascii": "a" * 60, "accented": "é" * 60})
+    assert refs == [["accented"]]
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_sends_references(tmp_path):
+    """Test repeated large payloads are stored once and history holds only references"""
+    comm_agent = CommunicationAgent(config={
+        "use_jetstream": False,
+        "claim_check": True,
+        "blob_store_path": str(tmp_path / "blobs"),
+        "claim_check_threshold": 1024,
+        "dlq_path": str(tmp_path / "dlq.jsonl")
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("reviewer")
+    
+    code = "x = 1\n" * 10000
+    for _ in range(5):
+        await comm_agent.process_message({"from": "coder", "to": "reviewer", "payload": {"code": code}})
+    
+    sent = comm_agent.message_history[-1]
+    assert sent[BLOB_REFS_FIELD] == [["code"]]
+    assert BLOB_REF_KEY in sent["payload"]["code"]
+    # The recipient gets the value
+    message = comm_agent.message_broker["reviewer"].get_nowait()
+    assert message["payload"] == {"code": code}
+    assert BLOB_REFS_FIELD not in message
+    
+    # Payloads shaped like references are only data unless the sender made them
+    forged = {"code": {BLOB_REF_KEY: sent["payload"]["code"][BLOB_REF_KEY], "size": 1, "type": "str"}}
+    await comm_agent.process_message({"from": "user", "to": "reviewer", "payload": forged, BLOB_REFS_FIELD: [["code"]]})
+    mailbox = comm_agent.message_broker["reviewer"]
+    while mailbox.qsize() > 1:
+        mailbox.get_nowait()
+    message = mailbox.get_nowait()
+    assert BLOB_REFS_FIELD not in message
+    assert message["payload"] == forged
+    
+    store = comm_agent.get_statistics()["claim_check"]["store"]
+    assert store["stored"] == 1
+    assert store["deduplicated"] == 4
+    
+    await comm_agent.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_durable_records_outlive_the_blobs(tmp_path):
+    """Test dead letters and persisted messages hold the values, so purging blobs does not break them"""
+    rows = []
+    
+    async def writer(batch):
+        rows.extend(batch)
+    
+    comm_agent = CommunicationAgent(config={
+        "use_jetstream": False,
+        "claim_check": True,
+        "blob_store_path": str(tmp_path / "blobs"),
+        "claim_check_threshold": 1024,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "max_delivery_attempts": 1,
+        "persist_messages": True,
+        "message_writer": writer
+    })
+    await comm_agent.initialize()
+    
+    code = "x = 1\n" * 1000
+    await comm_agent.process_message({"from": "coder", "to": "missing", "payload": {"code": code}})
+    assert BLOB_REF_KEY in comm_agent.message_history[-1]["payload"]["code"]
+    await comm_agent.message_store.flush()
+    assert comm_agent.claim_check.store.purge_expired(now=time.time() + 10 * BlobStore.DEFAULT_TTL) == 1
+    
+    assert rows[0]["payload"] == {"code": code}
+    dead = DeadLetterQueue(lambda message: None, path=str(tmp_path / "dlq.jsonl")).list()
+    assert dead[0]["message"]["payload"] == {"code": code}
+    assert BLOB_REFS_FIELD not in dead[0]["message"]
+    await comm_agent.cleanup()
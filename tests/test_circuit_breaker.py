@@ -0,0 +1,117 @@
+"""
+Tests for the circuit breaker, durable outbox and broker outage handling
+"""
+import pytest
+import asyncio
+import json
+import time
+
+from agent_communication import CommunicationAgent
+from circuit_breaker import CircuitBreaker, CircuitState
+from fake_jetstream import FakeJetStreamServer
+from outbox import DurableOutbox
+
+
+def test_circuit_breaker_trips_and_recovers():
+    """Test the breaker opens after consecutive failures and half-opens after the timeout"""
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0.05)
+    
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+    
+    time.sleep(0.06)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    # Only one probe at a time
+    assert not breaker.allow_request()
+    
+    # A failed probe re-opens immediately
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+    assert breaker.stats["trips"] == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_drains_in_order_and_resumes(tmp_path):
+    """Test the outbox drains in order, stops at a failure and resumes after a restart"""
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = DurableOutbox(path)
+    for i in range(5):
+        outbox.append({"n": i})
+    
+    published = []
+    
+    async def fail_after_two(message):
+        if len(published) >= 2:
+            return False
+        published.append(message["n"])
+        return True
+    
+    assert await outbox.drain(fail_after_two) == 2
+    assert outbox.pending == 3
+    
+    restored = DurableOutbox(path)
+    assert restored.pending == 3
+    
+    async def publish(message):
+        published.append(message["n"])
+        return True
+    
+    assert await restored.drain(publish) == 3
+    assert published == [0, 1, 2, 3, 4]
+    assert restored.pending == 0
+    
+    # Without a path the outbox lives in memory
+    memory = DurableOutbox()
+    for i in range(3):
+        memory.append({"n": i})
+    published.clear()
+    assert await memory.drain(fail_after_two) == 2
+    assert memory.pending == 1
+    assert await memory.drain(publish) == 1
+    assert published == [0, 1, 2] and memory.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_buffers_during_outage(tmp_path):
+    """Test publishes stop after the breaker trips and the outbox drains once NATS is back"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "outbox_path": str(tmp_path / "outbox.jsonl"),
+        "circuit_failure_threshold": 2,
+        "circuit_recovery_timeout": 0.05,
+        "reconnect_time_wait": 0.01
+    })
+    assert await comm_agent.initialize()
+    
+    server.available = False
+    for i in range(10):
+        response = await comm_agent.process_message({"to": "remote_agent", "payload": {"n": i}})
+        assert response["status"] == "buffered"
+    
+    # Only the first publish hit the broker; later messages queue behind it in the outbox
+    assert comm_agent.circuit_breaker.stats["failures"] == 1
+    assert comm_agent.outbox.pending == 10
+    
+    server.available = True
+    for _ in range(100):
+        if not comm_agent.outbox.pending:
+            break
+        await asyncio.sleep(0.01)
+    
+    assert comm_agent.outbox.pending == 0
+    stream = server.streams["AGENT_MESSAGES"]
+    assert [json.loads(m.data)["payload"]["n"] for m in stream.messages.values()] == list(range(10))
+    await comm_agent.cleanup()
@@ -0,0 +1,82 @@
+"""
+Tests for the single-pass code analyzer
+"""
+import pytest
+
+from agent_code_generation import CodeGenerationAgent
+from code_analysis import IncrementalAnalyzer, analyze_source, rules_for, scan_code, split_blocks
+from generation_cache import GenerationCache
+
+
+def test_scan_computes_every_metric_in_one_pass():
+    """Test line counts and long lines match a line-by-line reading of the code"""
+    code = "# header\n\ndef f():\n    // not a comment in python\n    return 1  # trailing\n" + "x" * 121 + "\n   \n"
+    scan = scan_code(code, "python")
+    assert scan["metrics"] == {"lines_of_code": 8, "blank_lines": 3, "comment_lines": 1, "long_lines": 1}
+    assert scan["issues"] == [
+        {"type": "style", "severity": "low", "line": 6, "message": "Line too long (>120 characters)"}
+    ]
+    assert scan_code(code, "go")["metrics"]["comment_lines"] == 1
+
+
+def test_language_rules_skip_comments():
+    """Test rules fire on code lines only and unknown languages fall back to C-style comments"""
+    code = "try:\n    x = eval(text)\n# eval(text) is unsafe\nexcept:\n    pass\n"
+    issues = scan_code(code, "python")["issues"]
+    assert [(issue["line"], issue["severity"]) for issue in issues] == [(2, "high"), (4, "medium")]
+    
+    assert [issue["line"] for issue in scan_code("var a = 1;\n// var b = 2;\nlet variance = 3;", "javascript")["issues"]] == [1]
+    assert rules_for("cobol").comment_prefixes == ("//",)
+
+
+@pytest.mark.asyncio
+async def test_analyze_code_uses_scanner():
+    """Test the agent reports the scanner's metrics and issues"""
+    agent = CodeGenerationAgent("test_code_gen")
+    code = "def f(data):\n    return eval(data)\n"
+    response = await agent.analyze_code("python", code, {})
+    analysis = response["analysis"]
+    assert analysis["metrics"] == scan_code(code, "python")["metrics"]
+    assert analysis["issues"][0]["type"] == "security"
+    assert analysis["quality_score"] == 80.0
+
+
+def test_split_blocks_keeps_decorators_and_strings_together():
+    """Test blocks start at top-level statements only and join back to the code"""
+    code = '"""\nModule docstring\n"""\nimport os\n\n@decorator\ndef f():\n    pass\n\nif x:\n    y = 1\nelse:\n    y = 2\n'
+    blocks = split_blocks(code)
+    assert [line for line, _ in blocks] == [1, 4, 6, 10]
+    assert blocks[2][1].startswith("@decorator\ndef f():")
+    assert "\n".join(text for _, text in blocks) == code
+
+
+@pytest.mark.asyncio
+async def test_incremental_analysis_recomputes_only_changed_blocks():
+    """Test a one-line edit of a large file re-analyzes one block and matches a full analysis"""
+    functions = [f"def f{i}(x):\n    if x > {i}:\n        return eval(x)\n    return x\n" for i in range(2500)]
+    code = "import os\n\n" + "\n".join(functions)
+    analyzer = IncrementalAnalyzer(GenerationCache(max_entries=10000, ttl=0))
+    assert await analyzer.analyze(code, "python") == analyze_source(code, "python")
+    assert analyzer.stats["blocks_analyzed"] == 2501
+    
+    edited = code.replace("if x > 1234:", "if x > 1234 and x < 9999:")
+    result = await analyzer.analyze(edited, "python")
+    assert result == analyze_source(edited, "python")
+    assert analyzer.stats["blocks_analyzed"] == 2502
+    
+    # Inserting lines above only shifts the reused blocks
+    shifted = "# header\n" + edited
+    result = await analyzer.analyze(shifted, "python")
+    assert result == analyze_source(shifted, "python")
+    assert result["issues"][0]["line"] == 6
+    assert analyzer.stats["blocks_analyzed"] == 2503
+    assert analyzer.stats["fallbacks"] == 0
+
+
+@pytest.mark.asyncio
+async def test_incremental_analysis_falls_back_when_a_block_does_not_parse():
+    """Test a cut inside brackets is detected and the file analyzed whole"""
+    code = "VALUES = [\n1,\n2,\n]\n\ndef f():\n    return VALUES\n"
+    analyzer = IncrementalAnalyzer(GenerationCache(ttl=0))
+    assert await analyzer.analyze(code, "python") == analyze_source(code, "python")
+    assert analyzer.stats["fallbacks"] == 1
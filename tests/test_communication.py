@@ -0,0 +1,84 @@
+"""
+Tests for Communication Agent routing features
+"""
+import pytest
+import json
+from types import SimpleNamespace
+
+from agent_communication import CommunicationAgent
+
+
+class FakeJetStreamMsg:
+    """Minimal stand-in for a JetStream message delivered to a callback"""
+    def __init__(self, subject: str, message: dict, stream_seq: int = 1, num_pending: int = 0):
+        self.subject = subject
+        self.data = json.dumps(message).encode()
+        self.metadata = SimpleNamespace(
+            sequence=SimpleNamespace(stream=stream_seq, consumer=stream_seq),
+            num_pending=num_pending,
+            num_delivered=1
+        )
+        self.acked = False
+        self.nacked = False
+    
+    async def ack(self):
+        self.acked = True
+    
+    async def nak(self, delay=None):
+        self.nacked = True
+
+
+@pytest.mark.asyncio
+async def test_subject_per_agent_type():
+    """Test messages are published on per-agent-type subjects"""
+    comm_agent = CommunicationAgent(config={"use_jetstream": False})
+    await comm_agent.register_agent("code_gen_1", agent_type="CodeGenerationAgent")
+    
+    assert comm_agent.get_subject({"to": "code_gen_1"}) == "AGENT_MESSAGES.CodeGenerationAgent.code_gen_1"
+    assert comm_agent.get_subject({"to": "unknown"}) == "AGENT_MESSAGES.generic.unknown"
+    assert comm_agent.get_subject({"to_type": "DevOpsAgent"}) == "AGENT_MESSAGES.DevOpsAgent.any"
+    assert comm_agent.get_subject({}) == "AGENT_MESSAGES.broadcast"
+    assert comm_agent._consumed_agent_types() == ["CodeGenerationAgent"]
+
+
+@pytest.mark.asyncio
+async def test_route_to_agent_type_picks_least_loaded():
+    """Test type-addressed messages go to the least-loaded agent of that type"""
+    comm_agent = CommunicationAgent(config={"use_jetstream": False})
+    await comm_agent.initialize()
+    await comm_agent.register_agent("code_gen_1", agent_type="CodeGenerationAgent")
+    await comm_agent.register_agent("code_gen_2", agent_type="CodeGenerationAgent")
+    await comm_agent.register_agent("devops_1", agent_type="DevOpsAgent")
+    
+    await comm_agent.process_message({"to_type": "CodeGenerationAgent", "payload": {}})
+    await comm_agent.process_message({"to_type": "CodeGenerationAgent", "payload": {}})
+    
+    assert comm_agent.message_broker["code_gen_1"].qsize() == 1
+    assert comm_agent.message_broker["code_gen_2"].qsize() == 1
+    assert comm_agent.message_broker["devops_1"].qsize() == 0
+    
+    response = await comm_agent.process_message({"to_type": "MonitoringAgent", "payload": {}})
+    assert response["status"] == "error"
+    await comm_agent.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_jetstream_message_updates_subject_lag():
+    """Test delivered JetStream messages update per-subject lag"""
+    comm_agent = CommunicationAgent(config={"use_jetstream": False})
+    await comm_agent.register_agent("code_gen_1", agent_type="CodeGenerationAgent")
+    
+    msg = FakeJetStreamMsg(
+        "AGENT_MESSAGES.CodeGenerationAgent.code_gen_1",
+        {"to": "code_gen_1", "payload": {}},
+        stream_seq=7,
+        num_pending=3
+    )
+    await comm_agent._handle_jetstream_message(msg)
+    
+    assert msg.acked
+    lag = await comm_agent.get_subject_lag()
+    assert lag["CodeGenerationAgent"]["delivered"] == 1
+    assert lag["CodeGenerationAgent"]["pending"] == 3
+    assert lag["CodeGenerationAgent"]["ack_pending"] == 0
+    assert comm_agent.subject_stats["CodeGenerationAgent"]["last_delivered_seq"] == 7
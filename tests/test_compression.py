@@ -0,0 +1,68 @@
+"""
+Tests for threshold-based payload compression
+"""
+import pytest
+import asyncio
+import os
+
+from agent_communication import CommunicationAgent
+from compression import PayloadCompressor, ENCODING_HEADER
+from fake_jetstream import FakeJetStreamServer
+
+
+def test_compressor_threshold_and_roundtrip():
+    """Test only large, compressible payloads are compressed and they round-trip"""
+    compressor = PayloadCompressor(algorithm="zlib", threshold=1024)
+    
+    small, headers = compressor.encode(b"x" * 100, "CodeGenerationAgent")
+    assert small == b"x" * 100 and headers is None
+    
+    source = b"def handler(request):\n    return request\n" * 500
+    compressed, headers = compressor.encode(source, "CodeGenerationAgent")
+    assert headers == {ENCODING_HEADER: "zlib"}
+    assert len(compressed) < len(source)
+    assert compressor.decode(compressed, headers, "CodeGenerationAgent") == source
+    
+    # Random bytes do not shrink, so they are sent as-is
+    noise = os.urandom(4096)
+    assert compressor.encode(noise, "DevOpsAgent") == (noise, None)
+    
+    stats = compressor.get_statistics()
+    assert stats["CodeGenerationAgent"]["compressed"] == 1
+    assert stats["CodeGenerationAgent"]["ratio"] > 1
+    assert stats["DevOpsAgent"]["incompressible"] == 1
+    
+    # Messages without the header are plain payloads
+    assert compressor.decode(b"{}", None) == b"{}"
+    
+    # Off unless enabled, so consumers that predate the header keep working
+    source = b"def main():\n    pass\n" * 1000
+    assert PayloadCompressor(threshold=1024).encode(source) == (source, None)
+
+
+@pytest.mark.asyncio
+async def test_large_messages_compressed_over_jetstream(tmp_path):
+    """Test large payloads travel compressed and are decoded before delivery"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "outbox_path": str(tmp_path / "outbox.jsonl"),
+        "compression_algorithm": "zlib",
+        "compression_threshold": 1024
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("code_gen_1", agent_type="CodeGenerationAgent")
+    
+    code = "def main():\n    pass\n" * 1000
+    await comm_agent.process_message({"to": "code_gen_1", "payload": {"refactored_code": code}})
+    delivered = await asyncio.wait_for(comm_agent.message_broker["code_gen_1"].get(), timeout=1.0)
+    assert delivered["payload"]["refactored_code"] == code
+    
+    stored = next(iter(server.streams["AGENT_MESSAGES"].messages.values()))
+    assert stored.headers == {ENCODING_HEADER: "zlib"}
+    assert len(stored.data) < len(code)
+    
+    stats = comm_agent.get_statistics()["compression"]["CodeGenerationAgent"]
+    assert stats["compressed"] == 1 and stats["decompressed"] == 1
+    await comm_agent.cleanup()
@@ -0,0 +1,101 @@
+"""
+Tests for the dead letter queue and retry scheduling
+"""
+import pytest
+import asyncio
+
+from dead_letter import DeadLetterQueue
+from agent_communication import CommunicationAgent
+
+
+@pytest.mark.asyncio
+async def test_backoff_delay_grows_exponentially():
+    """Test backoff delays double per attempt and respect the cap"""
+    async def deliver(message):
+        return True
+    
+    dlq = DeadLetterQueue(deliver, base_delay=1.0, max_delay=4.0, jitter=False)
+    assert [dlq.backoff_delay(attempt) for attempt in range(1, 5)] == [1.0, 2.0, 4.0, 4.0]
+    
+    jittered = DeadLetterQueue(deliver, base_delay=1.0, max_delay=4.0)
+    assert 2.0 <= jittered.backoff_delay(3) <= 4.0
+
+
+@pytest.mark.asyncio
+async def test_retry_recovers_message():
+    """Test a failed delivery is retried in the background until it succeeds"""
+    attempts = []
+    
+    async def deliver(message):
+        attempts.append(message["message_id"])
+        return len(attempts) >= 2
+    
+    dlq = DeadLetterQueue(deliver, base_delay=0.01, max_delay=0.02)
+    dlq.schedule({"message_id": "msg_1"}, "Target agent not found")
+    assert "msg_1" in dlq.pending
+    
+    await asyncio.sleep(0.2)
+    await dlq.stop()
+    
+    assert attempts == ["msg_1", "msg_1"]
+    assert not dlq.pending
+    assert dlq.stats["recovered"] == 1
+
+
+@pytest.mark.asyncio
+async def test_dead_letter_persist_replay_purge(tmp_path):
+    """Test exhausted messages are persisted, replayed and purged"""
+    path = str(tmp_path / "dlq.jsonl")
+    healthy = False
+    
+    async def deliver(message):
+        return healthy
+    
+    dlq = DeadLetterQueue(deliver, path=path, max_attempts=2, base_delay=0.01, max_delay=0.01)
+    dlq.schedule({"message_id": "msg_1"}, "down")
+    dlq.schedule({"message_id": "msg_2"}, "down")
+    await asyncio.sleep(0.2)
+    await dlq.stop()
+    
+    assert sorted(record["message_id"] for record in dlq.list()) == ["msg_1", "msg_2"]
+    
+    # Dead letters survive a restart
+    restored = DeadLetterQueue(deliver, path=path)
+    assert len(restored.list()) == 2
+    
+    healthy = True
+    result = await restored.replay(["msg_1"])
+    assert result["replayed"] == 1
+    assert restored.purge() == 1
+    assert DeadLetterQueue(deliver, path=path).list() == []
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_retries_unknown_target(tmp_path):
+    """Test undeliverable messages are retried once the target registers"""
+    comm_agent = CommunicationAgent(config={
+        "use_jetstream": False,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "retry_base_delay": 0.01
+    })
+    await comm_agent.initialize()
+    
+    response = await comm_agent.process_message({"to": "late_agent", "payload": {}})
+    assert response["status"] == "error"
+    assert response["retry_scheduled"]
+    assert len(comm_agent.pending_acks) == 1
+    
+    await comm_agent.register_agent("late_agent")
+    await asyncio.sleep(0.2)
+    
+    assert comm_agent.message_broker["late_agent"].qsize() == 1
+    assert not comm_agent.pending_acks
+    await comm_agent.cleanup()
+
+
+def test_dead_letter_store_defaults_to_memory(tmp_path):
+    """Test the dead letter store is only written to a configured data directory"""
+    assert CommunicationAgent(config={"use_jetstream": False}).dead_letters.path is None
+    
+    comm_agent = CommunicationAgent("replica_1", config={"use_jetstream": False, "data_dir": str(tmp_path / "data")})
+    assert comm_agent.dead_letters.path == str(tmp_path / "data" / "dlq_replica_1.jsonl")
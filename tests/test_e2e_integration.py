@@ -5,9 +5,13 @@ Tests the full integration between backend and frontend
 import pytest
 import asyncio
 import httpx
+from agent_code_generation import CodeGenerationAgent
 from agent_communication import CommunicationAgent
 from agent_monitoring import MonitoringAgent
 from main import app
+import main
+import serialization
+from sharding import ShardedBroker
 from fastapi.testclient import TestClient
 
 
@@ -15,6 +19,30 @@ from fastapi.testclient import TestClient
 client = TestClient(app)
 
 
+@pytest.fixture(scope="module", autouse=True)
+def code_agent():
+    """Install the code generation agent the lifespan creates (the lifespan also needs a database)"""
+    agent = CodeGenerationAgent("test_api_code_generation_agent")
+    app.state.code_agent = agent
+    yield agent
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(agent.cleanup())
+    loop.close()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def broker():
+    """Install the message broker the lifespan creates, with in-process shards"""
+    broker = ShardedBroker({
+        f"test_shard_{i}": CommunicationAgent(f"test_shard_{i}", {"use_jetstream": False}) for i in range(2)
+    })
+    app.state.broker = broker
+    yield broker
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(broker.cleanup())
+    loop.close()
+
+
 class TestE2EIntegration:
     """End-to-End integration tests"""
     
@@ -58,6 +86,23 @@ class TestE2EIntegration:
         assert data["success"] is True
         assert data["data"]["id"] == "test_agent_e2e"
     
+    def test_agent_messages_through_broker(self):
+        """Test messages sent to a created agent can be received from its queue"""
+        client.post("/api/v1/agents", json={"agent_id": "test_agent_inbox", "type": "coder"})
+        response = client.post("/api/v1/messages", json={"from": "client", "to": "test_agent_inbox", "payload": {"n": 1}})
+        assert response.status_code == 200
+        assert response.json()["data"]["status"] == "delivered"
+        
+        response = client.get("/api/v1/agents/test_agent_inbox/messages")
+        assert response.status_code == 200
+        assert [message["payload"] for message in response.json()["data"]["messages"]] == [{"n": 1}]
+        
+        response = client.post("/api/v1/messages", json={"from": "client", "to_type": "unknown", "payload": {}})
+        assert response.status_code == 404
+        client.delete("/api/v1/agents/test_agent_inbox")
+        response = client.get("/api/v1/agents/test_agent_inbox/messages")
+        assert response.status_code == 404
+    
     def test_get_agent_endpoint(self):
         """Test get agent endpoint"""
         response = client.get("/api/v1/agents/test_agent_123")
@@ -102,6 +147,20 @@ class TestE2EIntegration:
             data = websocket.receive_json()
             assert data["type"] == "subscribed"
             assert data["channel"] == "agents"
+    
+    def test_websocket_code_generation_stream(self):
+        """Test code generation streams chunk frames followed by a done frame"""
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_json({"type": "generate_code", "id": "req-1", "language": "python", "specification": "hello"})
+            frames = [websocket.receive_json()]
+            while frames[-1]["type"] == "code:chunk":
+                frames.append(websocket.receive_json())
+            assert frames[-1]["type"] == "code:done"
+            assert all(frame["id"] == "req-1" for frame in frames)
+            assert "def main" in "".join(frame["data"] for frame in frames[:-1])
+            
+            websocket.send_json({"type": "generate_code", "language": "cobol"})
+            assert websocket.receive_json()["type"] == "code:error"
 
 
 @pytest.mark.asyncio
@@ -199,6 +258,64 @@ class TestE2EAPIIntegration:
         # Missing agent_id
         response = client.post("/api/v1/agents", json={"name": "Test"})
         assert response.status_code == 400
+    
+    def test_code_generation_batch_streams_ndjson(self):
+        """Test batch code generation streams one line per unique request"""
+        requests = [
+            {"language": "python", "specification": "add two numbers"},
+            {"language": "python", "specification": "add two numbers"},
+            {"language": "javascript", "specification": "add two numbers"}
+        ]
+        response = client.post("/api/v1/code/generate/batch", json={"requests": requests})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        
+        results = [serialization.loads(line) for line in response.text.splitlines()]
+        assert sorted(index for result in results for index in result["indexes"]) == [0, 1, 2]
+        assert len(results) == 2
+        assert all(result["status"] == "success" for result in results)
+        
+        response = client.post("/api/v1/code/generate/batch", json={"requests": []})
+        assert response.status_code == 400
+        response = client.post("/api/v1/code/generate/batch", json={"requests": requests, "concurrency": "8"})
+        assert response.status_code == 400
+    
+    def test_repository_analysis_streams_progress_and_report(self):
+        """Test repository analysis of the bundled archive streams NDJSON events"""
+        response = client.post("/api/v1/code/analyze/repository", json={"path": "ymera_enterprise_enhanced.zip"})
+        assert response.status_code == 200
+        
+        events = [serialization.loads(line) for line in response.text.splitlines()]
+        assert events[0]["event"] == "analysis:progress"
+        assert events[-1]["event"] == "analysis:completed"
+        assert events[-1]["data"]["files"] > 0
+        
+        response = client.post("/api/v1/code/analyze/repository", json={"path": "/etc"})
+        assert response.status_code == 403
+    
+    def test_lifespan_stops_code_agent_workers(self, monkeypatch):
+        """Test the code generation agent is created on startup and its worker processes stopped on shutdown"""
+        async def no_database():
+            pass
+        
+        monkeypatch.setattr(main, "init_db", no_database)
+        monkeypatch.setattr(main, "close_db", no_database)
+        monkeypatch.setattr(app.state, "code_agent", app.state.code_agent)
+        monkeypatch.setattr(app.state, "broker", app.state.broker)
+        with TestClient(app) as lifespan_client:
+            agent = app.state.code_agent
+            response = lifespan_client.post("/api/v1/code/analyze/repository", json={"path": "tests"})
+            assert response.status_code == 200
+            assert agent.process_pool.get_statistics()["completed"] > 0
+            assert agent.process_pool._executor is not None
+            
+            # Messages go through the shard processes
+            shards = list(app.state.broker.shards.values())
+            lifespan_client.post("/api/v1/agents", json={"agent_id": "lifespan_agent"})
+            response = lifespan_client.post("/api/v1/messages", json={"to": "lifespan_agent", "payload": {}})
+            assert response.json()["data"]["status"] == "delivered"
+        assert agent.process_pool._executor is None
+        assert all(shard._process is None for shard in shards)
 
 
 class TestE2EPerformance:
@@ -0,0 +1,91 @@
+"""
+Tests for weighted fair queuing across tenants
+"""
+import pytest
+import asyncio
+
+from agent_communication import CommunicationAgent
+from fair_queue import FairQueue, TenantQuotaExceeded, tenant_of
+
+
+def test_tenant_of_prefers_tenant_then_project_then_sender():
+    """Test the tenant key falls back from tenant to payload project to sender"""
+    assert tenant_of({"tenant": "acme", "from": "a", "payload": {"project": "p"}}) == "acme"
+    assert tenant_of({"from": "a", "payload": {"project": "p"}}) == "p"
+    assert tenant_of({"from": "a", "payload": "text"}) == "a"
+    assert tenant_of({}) == "default"
+
+
+def test_fair_queue_interleaves_backlogged_tenants_by_weight():
+    """Test a flooding tenant cannot starve others and weights set the service share"""
+    queue = FairQueue(weights={"gold": 2.0})
+    for i in range(100):
+        queue.put_nowait({"tenant": "noisy", "n": i})
+    for i in range(4):
+        queue.put_nowait({"tenant": "gold", "n": i})
+    queue.put_nowait({"tenant": "quiet", "n": 0})
+    
+    served = [queue.get_nowait()["tenant"] for _ in range(8)]
+    assert served.count("gold") == 4
+    assert "quiet" in served[:3]
+    assert queue.qsize() == 97
+    
+    # Each tenant's own messages stay in order
+    rest = [queue.get_nowait()["n"] for _ in range(97)]
+    assert rest == sorted(rest)
+    assert queue.empty()
+
+
+def test_fair_queue_quota_drops_only_the_offending_tenant():
+    """Test a tenant over its quota is rejected while others are still accepted"""
+    queue = FairQueue(quota=2)
+    queue.put_nowait({"tenant": "noisy"})
+    queue.put_nowait({"tenant": "noisy"})
+    with pytest.raises(TenantQuotaExceeded):
+        queue.put_nowait({"tenant": "noisy"})
+    queue.put_nowait({"tenant": "quiet"})
+    
+    stats = queue.get_statistics()
+    assert stats["noisy"]["dropped"] == 1
+    assert stats["noisy"]["queued"] == 2
+    assert stats["quiet"]["enqueued"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fair_queue_wakes_waiting_getter():
+    """Test a consumer blocked on get() is woken by a put"""
+    queue = FairQueue()
+    getter = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    await queue.put({"tenant": "acme"})
+    assert (await asyncio.wait_for(getter, timeout=1.0))["tenant"] == "acme"
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_isolates_tenants(tmp_path):
+    """Test a flooding project is shed at its quota and does not delay another project"""
+    comm_agent = CommunicationAgent(config={
+        "use_jetstream": False,
+        "fair_queuing": True,
+        "tenant_quota": 10,
+        "dlq_path": str(tmp_path / "dlq.jsonl")
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("codegen", agent_type="CodeGenerationAgent")
+    
+    results = [
+        await comm_agent.process_message({"from": "ui", "to": "codegen", "payload": {"project": "noisy"}})
+        for _ in range(15)
+    ]
+    assert [result["status"] for result in results].count("dropped") == 5
+    assert not comm_agent.dead_letters.pending
+    
+    await comm_agent.process_message({"from": "ui", "to": "codegen", "payload": {"project": "quiet"}})
+    served = [comm_agent.message_broker["codegen"].get_nowait()["payload"]["project"] for _ in range(2)]
+    assert "quiet" in served
+    
+    stats = comm_agent.get_statistics()["fair_queues"]["codegen"]
+    assert stats["noisy"]["dropped"] == 5
+    assert stats["quiet"]["dequeued"] == 1
+    
+    await comm_agent.cleanup()
@@ -0,0 +1,211 @@
+"""
+Tests for the in-process JetStream stand-in and the JetStream code paths it exercises
+"""
+import pytest
+import asyncio
+from datetime import datetime, timezone
+
+from agent_communication import CommunicationAgent
+from fake_jetstream import FakeJetStreamServer, FakeJetStreamError, subject_matches
+
+
+def test_subject_matching():
+    """Test NATS wildcard matching"""
+    assert subject_matches("AGENT_MESSAGES.>", "AGENT_MESSAGES.generic.agent_1")
+    assert subject_matches("AGENT_MESSAGES.*.agent_1", "AGENT_MESSAGES.generic.agent_1")
+    assert not subject_matches("AGENT_MESSAGES.*", "AGENT_MESSAGES.generic.agent_1")
+    assert not subject_matches("AGENT_MESSAGES.>", "AGENT_MESSAGES")
+
+
+@pytest.mark.asyncio
+async def test_stream_limits_and_dedup():
+    """Test max_msgs eviction, discard-new rejection and Nats-Msg-Id deduplication"""
+    server = FakeJetStreamServer()
+    js = (await server.connect()).jetstream()
+    await js.add_stream(name="S", subjects=["S.>"], max_msgs=3)
+    
+    for i in range(5):
+        await js.publish("S.a", f"{i}".encode())
+    info = await js.stream_info("S")
+    assert info["messages"] == 3
+    assert info["first_seq"] == 3
+    
+    first = await js.publish("S.a", b"x", headers={"Nats-Msg-Id": "m1"})
+    again = await js.publish("S.a", b"x", headers={"Nats-Msg-Id": "m1"})
+    assert again.duplicate and again.seq == first.seq
+    
+    await js.add_stream(name="N", subjects=["N.>"], max_msgs=1, discard="new")
+    await js.publish("N.a", b"1")
+    with pytest.raises(FakeJetStreamError):
+        await js.publish("N.a", b"2")
+
+
+@pytest.mark.asyncio
+async def test_queue_group_ack_and_redelivery():
+    """Test queue group members share a durable consumer and nak'd messages are redelivered"""
+    server = FakeJetStreamServer()
+    client = await server.connect()
+    js = client.jetstream()
+    await js.add_stream(name="S", subjects=["S.>"])
+    received = {"a": [], "b": []}
+    
+    def handler(name):
+        async def cb(msg):
+            received[name].append(msg.data)
+            if msg.data == b"retry" and msg.metadata.num_delivered == 1:
+                await msg.nak()
+            else:
+                await msg.ack()
+        return cb
+    
+    sub_a = await js.subscribe("S.work.>", queue="workers", durable="workers", cb=handler("a"), manual_ack=True)
+    await js.subscribe("S.work.>", queue="workers", durable="workers", cb=handler("b"), manual_ack=True)
+    
+    for payload in [b"1", b"2", b"3", b"retry"]:
+        await js.publish("S.work.x", payload)
+    await js.publish("S.other", b"ignored")
+    await asyncio.sleep(0.05)
+    
+    assert received["a"] and received["b"]
+    assert sorted(received["a"] + received["b"]) == [b"1", b"2", b"3", b"retry", b"retry"]
+    info = await sub_a.consumer_info()
+    assert info.num_pending == 0
+    assert info.num_ack_pending == 0
+    assert info.num_redelivered == 1
+    
+    with pytest.raises(ValueError):
+        await js.subscribe("S.work.>", queue="workers", durable="other", cb=handler("a"), manual_ack=True)
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_over_fake_jetstream(tmp_path):
+    """Test publish, consume and ack through CommunicationAgent's JetStream path"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "dlq_path": str(tmp_path / "dlq.jsonl")
+    })
+    assert await comm_agent.initialize()
+    assert comm_agent.jetstream is not None
+    
+    await comm_agent.register_agent("code_gen_1", agent_type="CodeGenerationAgent")
+    response = await comm_agent.process_message({"to": "code_gen_1", "payload": {"n": 1}})
+    assert response["status"] == "published"
+    
+    delivered = await asyncio.wait_for(comm_agent.message_broker["code_gen_1"].get(), timeout=1.0)
+    assert delivered["payload"] == {"n": 1}
+    
+    lag = await comm_agent.get_subject_lag()
+    assert lag["CodeGenerationAgent"]["source"] == "jetstream"
+    assert lag["CodeGenerationAgent"]["published"] == 1
+    assert lag["CodeGenerationAgent"]["pending"] == 0
+    
+    await comm_agent.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_agent_messages_reach_only_the_hosting_replica(tmp_path):
+    """Test that replicas of one agent type never consume each other's agent-addressed messages"""
+    server = FakeJetStreamServer()
+    agent_types = {"code_gen_1": "CodeGenerationAgent", "code_gen_2": "CodeGenerationAgent"}
+    replicas = []
+    for name in ("a", "b"):
+        replica = CommunicationAgent(config={
+            "nats_connect": server.connect,
+            "agent_types": agent_types,
+            "dlq_path": str(tmp_path / f"dlq_{name}.jsonl")
+        })
+        assert await replica.initialize()
+        replicas.append(replica)
+    replica_a, replica_b = replicas
+    await replica_a.register_agent("code_gen_1")
+    await replica_b.register_agent("code_gen_2")
+    
+    for agent_id in ("code_gen_1", "code_gen_2"):
+        for i in range(10):
+            await replica_a.process_message({"to": agent_id, "payload": {"n": i}})
+    await asyncio.sleep(0.1)
+    
+    for replica, agent_id in ((replica_a, "code_gen_1"), (replica_b, "code_gen_2")):
+        queue = replica.message_broker[agent_id]
+        received = [queue.get_nowait()["payload"]["n"] for _ in range(queue.qsize())]
+        # Every message arrives at its host, in publish order
+        assert received == list(range(10))
+        assert replica.dead_letters.get_statistics()["dead_letters"] == 0
+        # ...without a detour through the other replica
+        assert replica.subject_stats["CodeGenerationAgent"]["nacked"] == 0
+    
+    # "to_type" messages are still shared by both replicas
+    await replica_a.process_message({"to_type": "CodeGenerationAgent", "payload": {"n": 10}})
+    await asyncio.sleep(0.05)
+    assert replica_a.message_broker["code_gen_1"].qsize() + replica_b.message_broker["code_gen_2"].qsize() == 1
+    
+    for replica in replicas:
+        await replica.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_replay_messages_from_jetstream(tmp_path):
+    """Test replay streams a target's messages from a sequence or time with bounded in-flight messages"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "outbox_path": str(tmp_path / "outbox.jsonl")
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("replica_a")
+    await comm_agent.register_agent("replica_b")
+    
+    for i in range(30):
+        await comm_agent.process_message({"to": "replica_a", "payload": {"n": i}})
+        await comm_agent.process_message({"to": "replica_b", "payload": {"n": i}})
+    
+    replayed = [message["payload"]["n"] async for message in comm_agent.replay_messages("replica_a")]
+    assert replayed == list(range(30))
+    assert [message async for message in comm_agent.replay_messages("nobody")] == []
+    
+    # Stream sequences interleave a and b: sequence 41 is replica_a's 21st message
+    replayed = [message["payload"]["n"] async for message in comm_agent.replay_messages("replica_a", start_seq=41)]
+    assert replayed == list(range(20, 30))
+    
+    stored = await comm_agent.jetstream.get_msg(comm_agent.stream_name, 51)
+    start_time = datetime.fromtimestamp(stored.timestamp, timezone.utc)
+    replayed = [message["payload"]["n"] async for message in comm_agent.replay_messages("replica_b", start_time=start_time)]
+    assert replayed == list(range(25, 30))
+    
+    # Only batch_size messages are pushed ahead of the caller
+    stream = server.streams[comm_agent.stream_name]
+    replay = comm_agent.replay_messages("replica_a", batch_size=4)
+    for _ in range(3):
+        await replay.__anext__()
+    await asyncio.sleep(0.05)
+    consumer = next(c for c in stream.consumers.values() if c.name.startswith("ephemeral"))
+    assert consumer.stats["delivered"] <= 3 + 4
+    await replay.aclose()
+    assert not any(c.name.startswith("ephemeral") for c in stream.consumers.values())
+    
+    await comm_agent.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_replay_messages_throttle(tmp_path):
+    """Test replay honours the rate limit"""
+    server = FakeJetStreamServer()
+    comm_agent = CommunicationAgent(config={
+        "nats_connect": server.connect,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "outbox_path": str(tmp_path / "outbox.jsonl")
+    })
+    await comm_agent.initialize()
+    for i in range(10):
+        await comm_agent.process_message({"to": "slow_reader", "payload": {"n": i}})
+    
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    replayed = [message async for message in comm_agent.replay_messages("slow_reader", rate=100)]
+    assert len(replayed) == 10
+    assert loop.time() - start >= 0.08
+    
+    await comm_agent.cleanup()
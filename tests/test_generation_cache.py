@@ -0,0 +1,399 @@
+"""
+Tests for the code generation cache
+"""
+import pytest
+import asyncio
+import subprocess
+import sys
+
+from agent_code_generation import CodeGenerationAgent
+from generation_cache import GenerationCache, InMemoryKeyValueStore, SingleFlight, cache_key
+
+
+def test_cache_key_is_stable_and_canonical():
+    """Test keys ignore option order and match across processes with different hash seeds"""
+    key = cache_key("python", "fibonacci", {"style": "pep8", "async": True})
+    assert key == cache_key("python", "fibonacci", {"async": True, "style": "pep8"})
+    assert key != cache_key("python", "fibonacci", {"style": "google", "async": True})
+    assert key != cache_key("javascript", "fibonacci", {"style": "pep8", "async": True})
+    
+    other = subprocess.run(
+        [sys.executable, "-c",
+         "from generation_cache import cache_key; "
+         "print(cache_key('python', 'fibonacci', {'style': 'pep8', 'async': True}))"],
+        capture_output=True, text=True, env={"PYTHONHASHSEED": "123"}, check=True
+    )
+    assert other.stdout.strip() == key
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    """Test the least recently used entries are evicted to stay within both bounds"""
+    cache = GenerationCache(max_entries=3, max_bytes=100, ttl=0)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.put("c", "x" * 10)
+    assert cache.get("a") is not None
+    cache.put("d", "x" * 10)
+    assert "b" not in cache
+    assert "a" in cache
+    
+    cache.put("e", "x" * 95)
+    assert len(cache) == 1
+    assert cache.bytes == 95
+    assert cache.stats["evictions"] == 4
+
+
+def test_ttl_expiry():
+    """Test entries expire on lookup and on purge"""
+    cache = GenerationCache(ttl=10)
+    cache.put("a", "code", now=100.0)
+    cache.put("b", "code", now=105.0)
+    assert cache.get("a", now=109.0) == "code"
+    assert cache.get("a", now=110.0) is None
+    assert cache.purge_expired(now=120.0) == 1
+    assert cache.get_statistics()["expirations"] == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_code_reads_through_cache():
+    """Test identical requests are generated once and served from the cache afterwards"""
+    agent = CodeGenerationAgent("test_code_gen")
+    await agent.initialize()
+    calls = []
+    generate = agent._generate_code_impl
+    
+    async def counting_generate(language, specification, options):
+        calls.append(specification)
+        async for chunk in generate(language, specification, options):
+            yield chunk
+    
+    agent._generate_code_impl = counting_generate
+    message = {"type": "generate_code", "language": "python", "specification": "fibonacci", "options": {}}
+    
+    first = await agent.process_message(dict(message))
+    second = await agent.process_message(dict(message))
+    assert calls == ["fibonacci"]
+    assert not first["metadata"]["cached"]
+    assert second["metadata"]["cached"]
+    assert second["code"] == first["code"]
+    assert second["metadata"]["cache_key"] == first["metadata"]["cache_key"]
+    
+    stats = agent.get_statistics()["cache"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def _counting(agent, calls, fail=False):
+    generate = agent._generate_code_impl
+    
+    async def counting_generate(language, specification, options):
+        calls.append((agent.agent_id, specification))
+        if fail:
+            raise RuntimeError("model unavailable")
+        async for chunk in generate(language, specification, options):
+            yield chunk
+    
+    agent._generate_code_impl = counting_generate
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_across_replicas():
+    """Test a replica serves code another replica generated, compressed in the shared store"""
+    shared = InMemoryKeyValueStore()
+    replicas = [CodeGenerationAgent(f"replica_{i}", {"l2_cache": shared}) for i in range(2)]
+    calls = []
+    for replica in replicas:
+        _counting(replica, calls)
+    message = {"type": "generate_code", "language": "python", "specification": "x" * 2000, "options": {}}
+    
+    first = await replicas[0].process_message(dict(message))
+    second = await replicas[1].process_message(dict(message))
+    third = await replicas[1].process_message(dict(message))
+    assert len(calls) == 1
+    assert (second["metadata"]["cache_level"], third["metadata"]["cache_level"]) == ("l2", "l1")
+    assert second["code"] == first["code"]
+    
+    stats = replicas[1].get_statistics()["l2_cache"]
+    assert stats["hits"] == 1
+    assert replicas[0].get_statistics()["l2_cache"]["compression_ratio"] > 1
+    
+    for replica in replicas:
+        await replica.l2_cache.flush_counters()
+    cluster = replicas[1].get_statistics()["l2_cache"]["cluster"]
+    assert (cluster["lookups"], cluster["hits"]) == (3, 2)
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_remembers_failures():
+    """Test a failed generation is not retried by other replicas until the negative TTL passes"""
+    shared = InMemoryKeyValueStore()
+    replicas = [CodeGenerationAgent(f"replica_{i}", {"l2_cache": shared, "l2_cache_negative_ttl": 60}) for i in range(2)]
+    calls = []
+    for replica in replicas:
+        _counting(replica, calls, fail=True)
+    message = {"type": "generate_code", "language": "python", "specification": "broken", "options": {}}
+    
+    first = await replicas[0].process_message(dict(message))
+    second = await replicas[1].process_message(dict(message))
+    assert first["status"] == second["status"] == "error"
+    assert second["error"] == "model unavailable"
+    assert second["metadata"]["cached"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_errors_fall_back_to_generation():
+    """Test an unreachable shared cache never fails a generation"""
+    class BrokenStore:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+        
+        async def set(self, key, value, ex=None):
+            raise ConnectionError("redis down")
+    
+    agent = CodeGenerationAgent("replica", {"l2_cache": BrokenStore()})
+    response = await agent.process_message({"type": "generate_code", "language": "python", "specification": "s"})
+    assert response["status"] == "success"
+    assert agent.get_statistics()["l2_cache"]["errors"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_generation():
+    """Test N concurrent identical requests call the generator once"""
+    agent = CodeGenerationAgent("test_code_gen")
+    calls = []
+    _counting(agent, calls)
+    message = {"type": "generate_code", "language": "python", "specification": "popular template"}
+    
+    responses = await asyncio.gather(*(agent.process_message(dict(message)) for _ in range(50)))
+    assert len(calls) == 1
+    assert all(response["status"] == "success" for response in responses)
+    assert sum(response["metadata"]["coalesced"] for response in responses) == 49
+    assert agent.get_statistics()["single_flight"] == {"calls": 1, "coalesced": 49, "abandoned": 0, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_failures_and_survives_cancelled_waiters():
+    """Test joined callers get the leader's exception and cancelling one does not cancel the call"""
+    flight = SingleFlight()
+    release = asyncio.Event()
+    
+    async def call():
+        await release.wait()
+        raise ValueError("boom")
+    
+    leader = asyncio.create_task(flight.do("k", call))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(flight.do("k", call)) for _ in range(3)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()
+    release.set()
+    
+    results = await asyncio.gather(leader, *waiters, return_exceptions=True)
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert all(isinstance(result, ValueError) for result in [results[0]] + results[2:])
+    assert flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_cancelled_leader():
+    """Test waiters elect a new leader when the caller running the call is cancelled"""
+    flight = SingleFlight()
+    calls = []
+    
+    async def call():
+        calls.append(len(calls))
+        await asyncio.sleep(0.05)
+        return len(calls)
+    
+    leader = asyncio.create_task(flight.do("k", call))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(flight.do("k", call)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    
+    results = await asyncio.gather(*waiters)
+    assert leader.cancelled()
+    assert calls == [0, 1]
+    assert sorted(results) == [(2, False), (2, True), (2, True)]
+    assert flight.stats["abandoned"] == 1
+    assert flight.in_flight == 0
+
+
+def _sleeping(agent, calls, delays):
+    async def sleeping_generate(language, specification, options):
+        calls.append(specification)
+        await asyncio.sleep(delays.get(specification, 0.01))
+        yield f"# {specification}"
+    
+    agent._generate_code_impl = sleeping_generate
+
+
+@pytest.mark.asyncio
+async def test_batch_deduplicates_and_streams_in_completion_order():
+    """Test duplicate specs are generated once and fast results are yielded before slow ones"""
+    agent = CodeGenerationAgent("test_code_gen")
+    calls = []
+    _sleeping(agent, calls, {"slow": 0.1, "fast": 0.0})
+    requests = [
+        {"language": "python", "specification": "slow"},
+        {"language": "python", "specification": "fast"},
+        {"language": "python", "specification": "slow", "options": {}},
+        {"language": "cobol", "specification": "fast"}
+    ]
+    
+    results = [result async for result in agent.generate_code_batch(requests, concurrency=4)]
+    assert sorted(calls) == ["fast", "slow"]
+    assert [result["indexes"] for result in results] == [[3], [1], [0, 2]]
+    assert results[0]["status"] == "error"
+    assert results[2]["code"] == "# slow"
+    
+    response = await agent.process_message({"type": "generate_code_batch", "requests": requests})
+    assert (response["total"], response["unique"], response["failed"]) == (4, 3, 1)
+
+
+@pytest.mark.asyncio
+async def test_batch_throughput_scales_with_concurrency():
+    """Test raising the concurrency limit shortens a batch of independent slow generations"""
+    elapsed = {}
+    for concurrency in (1, 10):
+        agent = CodeGenerationAgent("test_code_gen")
+        calls = []
+        _sleeping(agent, calls, {})
+        requests = [{"language": "python", "specification": f"spec {i}"} for i in range(20)]
+        started = asyncio.get_running_loop().time()
+        results = [result async for result in agent.generate_code_batch(requests, concurrency=concurrency)]
+        elapsed[concurrency] = asyncio.get_running_loop().time() - started
+        assert len(results) == len(calls) == 20
+    assert elapsed[1] > 3 * elapsed[10]
+
+
+@pytest.mark.asyncio
+async def test_batch_concurrency_is_validated_and_capped_across_batches():
+    """Test clients cannot lift the agent's limit, whether with one large value or many batches"""
+    agent = CodeGenerationAgent("test_code_gen", {"batch_concurrency": 3})
+    running = peak = 0
+    
+    async def counting_generate(language, specification, options):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        yield f"# {specification}"
+    
+    agent._generate_code_impl = counting_generate
+    
+    async def drain(prefix, concurrency):
+        requests = [{"language": "python", "specification": f"{prefix} {i}"} for i in range(10)]
+        return [result async for result in agent.generate_code_batch(requests, concurrency)]
+    
+    results = await asyncio.gather(drain("a", 100000), drain("b", None))
+    assert [len(batch) for batch in results] == [10, 10]
+    assert peak == 3
+    
+    with pytest.raises(ValueError):
+        await drain("c", "8")
+
+
+@pytest.mark.asyncio
+async def test_closing_batch_early_cancels_pending_generations():
+    """Test a consumer that stops reading does not leave generations running"""
+    agent = CodeGenerationAgent("test_code_gen")
+    calls = []
+    _sleeping(agent, calls, {f"spec {i}": 10.0 for i in range(1, 10)})
+    requests = [{"language": "python", "specification": f"spec {i}"} for i in range(10)]
+    
+    batch = agent.generate_code_batch(requests, concurrency=10)
+    first = await batch.__anext__()
+    assert first["indexes"] == [0]
+    await batch.aclose()
+    await asyncio.sleep(0)
+    assert agent.single_flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_first_chunk_before_generation_finishes():
+    """Test streamed chunks arrive early, join to the generated code and fill the cache"""
+    agent = CodeGenerationAgent("test_code_gen")
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    arrivals, chunks = [], []
+    async for frame in agent.generate_code_stream("python", "fibonacci", {}):
+        arrivals.append(loop.time() - started)
+        chunks.append(frame.get("data"))
+    
+    assert frame["type"] == "done"
+    assert not frame["metadata"]["cached"]
+    assert len(chunks) > 2
+    assert arrivals[0] < arrivals[-1] / 3
+    
+    code = "".join(chunks[:-1])
+    assert (await agent.generate_code("python", "fibonacci", {}))["code"] == code
+    frames = [frame async for frame in agent.generate_code_stream("python", "fibonacci", {})]
+    assert frames[0] == {"type": "chunk", "data": code}
+    assert frames[1]["metadata"]["cache_level"] == "l1"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams_share_one_generation():
+    """Test streams and plain requests for the same code join the stream generating it"""
+    agent = CodeGenerationAgent("test_code_gen")
+    calls = []
+    _counting(agent, calls)
+    
+    async def stream():
+        return [frame async for frame in agent.generate_code_stream("python", "shared", {})]
+    
+    async def generate():
+        # Arrives once the first stream's generation is under way
+        await asyncio.sleep(0)
+        return await agent.generate_code("python", "shared", {})
+    
+    streams = await asyncio.gather(stream(), stream(), stream(), generate())
+    response = streams.pop()
+    assert len(calls) == 1
+    assert len(streams[0]) > 2
+    assert [frame["data"] for frame in streams[1][:-1]] == [response["code"]]
+    assert all(frames[-1]["type"] == "done" for frames in streams)
+    assert sorted(frames[-1]["metadata"]["coalesced"] for frames in streams) == [False, True, True]
+    assert response["metadata"]["coalesced"]
+    assert agent.single_flight.stats == {"calls": 1, "coalesced": 3, "abandoned": 0}
+
+
+
+@pytest.mark.asyncio
+async def test_stalled_stream_does_not_hold_up_joined_requests():
+    """Test requests joining a stream's generation get their result while its consumer is not reading"""
+    agent = CodeGenerationAgent("test_code_gen")
+    calls = []
+    _counting(agent, calls)
+    
+    stream = agent.generate_code_stream("python", "shared", {})
+    first = await stream.__anext__()
+    response = await asyncio.wait_for(agent.generate_code("python", "shared", {}), timeout=1.0)
+    assert response["metadata"]["coalesced"]
+    assert len(calls) == 1
+    
+    rest = [frame async for frame in stream]
+    assert first["data"] + "".join(frame["data"] for frame in rest[:-1]) == response["code"]
+    assert rest[-1]["type"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_stream_counts_cached_failures_as_misses():
+    """Test a stream answered by a cached failure counts its lookup like generate_code"""
+    shared = InMemoryKeyValueStore()
+    replicas = [CodeGenerationAgent(f"replica_{i}", {"l2_cache": shared, "l2_cache_negative_ttl": 60}) for i in range(2)]
+    for replica in replicas:
+        _counting(replica, [], fail=True)
+    
+    frames = [frame async for frame in replicas[0].generate_code_stream("python", "broken", {})]
+    assert frames == [{"type": "error", "error": "model unavailable", "metadata": {"cache_key": frames[0]["metadata"]["cache_key"]}}]
+    frames = [frame async for frame in replicas[1].generate_code_stream("python", "broken", {})]
+    assert frames[0]["metadata"]["cached"]
+    
+    # As with generate_code, only the lookup answered by the cache is counted
+    for replica in replicas:
+        await replica.l2_cache.flush_counters()
+    assert replicas[1].get_statistics()["l2_cache"]["cluster"]["lookups"] == 1
+    assert replicas[1].get_statistics()["l2_cache"]["cluster"]["hits"] == 0
@@ -0,0 +1,205 @@
+"""
+Tests for write-behind message persistence
+"""
+import pytest
+import pytest_asyncio
+import asyncio
+from datetime import datetime
+
+from agent_communication import CommunicationAgent
+from message_store import MessageWriteBehind, SQLMessageWriter, message_to_row
+
+
+class RecordingWriter:
+    """Writer stand-in that records batches and can be made to fail"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.delay = delay
+        self.fail = False
+    
+    async def __call__(self, rows):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        self.batches.append(rows)
+
+
+@pytest_asyncio.fixture
+async def sqlite_engine():
+    """In-memory SQLite database with the application tables"""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import StaticPool
+    from database import Base
+    
+    # One shared connection, since every connection has its own in-memory database
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+def test_message_to_row():
+    """Test routed messages map onto the Message columns"""
+    row = message_to_row({
+        "message_id": "msg_1",
+        "from": "api",
+        "to_type": "coder",
+        "type": "generate_code",
+        "payload": {"spec": "x"},
+        "timestamp": "2026-01-01T12:00:00+00:00"
+    }, "published")
+    
+    assert row["to_agent"] == "coder"
+    assert row["status"] == "published"
+    assert row["payload"] == {"spec": "x"}
+    assert row["created_at"].tzinfo is None
+    assert row["created_at"].hour == 12
+
+
+@pytest.mark.asyncio
+async def test_write_behind_batches_by_size_and_interval():
+    """Test rows are flushed when a batch fills up or the interval passes"""
+    writer = RecordingWriter()
+    store = MessageWriteBehind(writer, batch_size=3, flush_interval=0.05)
+    
+    for i in range(3):
+        store.add({"message_id": f"msg_{i}", "from": "a", "to": "b"}, "delivered")
+    await asyncio.sleep(0.01)
+    assert [len(batch) for batch in writer.batches] == [3]
+    
+    store.add({"message_id": "msg_3", "from": "a", "to": "b"}, "delivered")
+    await asyncio.sleep(0.01)
+    assert [len(batch) for batch in writer.batches] == [3]
+    
+    await asyncio.sleep(0.08)
+    assert [len(batch) for batch in writer.batches] == [3, 1]
+    assert store.get_statistics()["written"] == 4
+    
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_is_bounded_and_survives_failures():
+    """Test a failing database drops the oldest rows instead of growing without bound"""
+    writer = RecordingWriter()
+    writer.fail = True
+    store = MessageWriteBehind(writer, max_buffer=5, batch_size=2, flush_interval=0.01)
+    
+    for i in range(8):
+        store.add({"message_id": f"msg_{i}", "from": "a", "to": "b"}, "delivered")
+    await asyncio.sleep(0.03)
+    
+    stats = store.get_statistics()
+    assert stats["pending"] <= 5
+    assert stats["flush_errors"] >= 1
+    assert stats["dropped"] >= 3
+    
+    writer.fail = False
+    await store.stop()
+    written = [row["message_id"] for batch in writer.batches for row in batch]
+    assert written == sorted(written)
+    assert "msg_7" in written
+    assert "msg_0" not in written
+
+
+@pytest.mark.asyncio
+async def test_routing_does_not_wait_on_database():
+    """Test messages are routed while persistence is still pending"""
+    writer = RecordingWriter(delay=0.5)
+    agent = CommunicationAgent("comm_persist", {
+        "use_jetstream": False,
+        "persist_messages": True,
+        "message_writer": writer,
+        "persist_batch_size": 2
+    })
+    await agent.initialize()
+    await agent.register_agent("target")
+    
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(10):
+        result = await agent.process_message({"from": "source", "to": "target", "payload": {}})
+        assert result["status"] == "delivered"
+    assert loop.time() - start < 0.1
+    
+    await agent.cleanup()
+    assert agent.get_statistics()["message_store"]["written"] == 10
+    assert len({row["message_id"] for batch in writer.batches for row in batch}) == 10
+
+
+@pytest.mark.asyncio
+async def test_write_behind_backs_off_only_while_failing():
+    """Test the failure backoff ends with the first successful write"""
+    writer = RecordingWriter()
+    writer.fail = True
+    store = MessageWriteBehind(writer, batch_size=1, flush_interval=0.05)
+    
+    store.add({"message_id": "msg_0", "from": "a", "to": "b"}, "delivered")
+    await asyncio.sleep(0.01)
+    await store.flush()
+    assert store.get_statistics()["consecutive_errors"] == 2
+    
+    writer.fail = False
+    await asyncio.sleep(0.08)
+    assert [row["message_id"] for batch in writer.batches for row in batch] == ["msg_0"]
+    stats = store.get_statistics()
+    assert (stats["consecutive_errors"], stats["flush_errors"]) == (0, 2)
+    
+    # A full batch is written right away again
+    store.add({"message_id": "msg_1", "from": "a", "to": "b"}, "delivered")
+    await asyncio.sleep(0.01)
+    assert [row["message_id"] for batch in writer.batches for row in batch] == ["msg_0", "msg_1"]
+    
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_sql_writer_inserts_and_skips_duplicates(sqlite_engine):
+    """Test batches become rows of the messages table and redelivered messages are skipped"""
+    from sqlalchemy import func, select
+    from database import Message
+    
+    writer = SQLMessageWriter(sqlite_engine)
+    rows = [message_to_row({"message_id": f"msg_{i}", "from": "a", "to": "b", "payload": {"n": i}}, "delivered")
+            for i in range(5)]
+    await writer(rows[:3])
+    await writer(rows[2:])
+    
+    async with sqlite_engine.connect() as conn:
+        assert (await conn.execute(select(func.count()).select_from(Message))).scalar() == 5
+        payloads = (await conn.execute(select(Message.payload).order_by(Message.id))).scalars().all()
+    assert payloads == [{"n": i} for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_replay_from_database_pages_by_key(sqlite_engine):
+    """Test replay without JetStream reads the messages table in order, page by page, from a start time"""
+    agent = CommunicationAgent("comm_replay", {
+        "use_jetstream": False,
+        "persist_messages": True,
+        "database_engine": sqlite_engine,
+        "persist_batch_size": 4
+    })
+    await agent.initialize()
+    await agent.register_agent("target")
+    await agent.register_agent("other")
+    
+    for i in range(10):
+        await agent.process_message({"from": "source", "to": "target", "payload": {"n": i}})
+        await agent.process_message({"from": "source", "to": "other", "payload": {"n": i}})
+    await agent.message_store.flush()
+    
+    replayed = [message async for message in agent.replay_messages("target", batch_size=3)]
+    assert [message["payload"]["n"] for message in replayed] == list(range(10))
+    assert replayed[0]["from"] == "source"
+    
+    start_time = datetime.fromisoformat(replayed[7]["timestamp"])
+    expected = [message["payload"]["n"] for message in replayed if datetime.fromisoformat(message["timestamp"]) >= start_time]
+    replayed = [message async for message in agent.replay_messages("target", start_time=start_time, batch_size=2)]
+    assert [message["payload"]["n"] for message in replayed] == expected
+    assert expected[-3:] == [7, 8, 9]
+    
+    await agent.cleanup()
@@ -0,0 +1,148 @@
+"""
+Tests for per-sender sequence numbers and the reorder buffer
+"""
+import pytest
+import asyncio
+import random
+
+from agent_communication import CommunicationAgent
+from ordering import ReorderBuffer, SequenceStamper
+
+
+def test_sequence_stamper_per_stream():
+    """Test each sender->recipient stream is numbered independently"""
+    stamper = SequenceStamper()
+    messages = [
+        {"from": "a", "to": "x"},
+        {"from": "a", "to": "x"},
+        {"from": "b", "to": "x"},
+        {"from": "a", "to": "y"},
+        {"from": "a", "to_type": "coder"}
+    ]
+    for message in messages:
+        stamper.stamp(message)
+    
+    assert [message.get("sequence") for message in messages] == [1, 2, 1, 1, None]
+    
+    # Retries keep their original stamp
+    stamper.stamp(messages[0])
+    assert messages[0]["sequence"] == 1
+    assert SequenceStamper.stream_key(messages[0]) == ("a", "x", stamper.epoch)
+
+
+def test_sequence_stamper_forgets_idle_streams():
+    """Test only recent streams are remembered and a forgotten one restarts under a new epoch"""
+    stamper = SequenceStamper(max_streams=2)
+    first = {"from": "a", "to": "x"}
+    stamper.stamp(first)
+    for target in ("y", "z"):
+        stamper.stamp({"from": "a", "to": target})
+    assert len(stamper._last) == 2
+    
+    again = {"from": "a", "to": "x"}
+    stamper.stamp(again)
+    assert again["sequence"] == 1
+    assert SequenceStamper.stream_key(again) != SequenceStamper.stream_key(first)
+
+
+def test_reorder_buffer_releases_in_order():
+    """Test held messages are released once the gap is filled and duplicates are dropped"""
+    buffer = ReorderBuffer()
+    
+    assert buffer.push("s", 1, "m1", now=0) == ["m1"]
+    assert buffer.push("s", 3, "m3", now=0) == []
+    assert buffer.push("s", 4, "m4", now=0) == []
+    assert buffer.push("s", 2, "m2", now=0) == ["m2", "m3", "m4"]
+    assert buffer.push("s", 3, "m3", now=0) == []
+    
+    stats = buffer.get_statistics()
+    assert stats["duplicates"] == 1
+    assert stats["open_gaps"] == 0
+    assert stats["held"] == 0
+
+
+def test_reorder_buffer_skips_gaps():
+    """Test a gap is skipped after the timeout or when too many messages are held"""
+    buffer = ReorderBuffer(max_held=3, gap_timeout=1.0)
+    
+    buffer.push("timeout", 2, "m2", now=10.0)
+    assert buffer.next_deadline() == 11.0
+    assert buffer.expire(now=10.5) == []
+    assert buffer.expire(now=11.0) == ["m2"]
+    # The skipped message is late when it finally arrives
+    assert buffer.push("timeout", 1, "m1", now=12.0) == []
+    assert buffer.was_skipped("timeout", 1) and not buffer.was_skipped("timeout", 2)
+    assert buffer.push("timeout", 2, "m2", now=12.0) == []
+    assert (buffer.stats["late"], buffer.stats["duplicates"]) == (1, 1)
+    
+    for seq in (2, 3, 4):
+        assert buffer.push("full", seq, f"m{seq}", now=0) == []
+    assert buffer.push("full", 6, "m6", now=0) == ["m2", "m3", "m4"]
+    assert buffer.get_statistics()["held"] == 1
+    
+    assert buffer.stats["gaps_skipped"] == 2
+    assert buffer.stats["messages_skipped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_ordered_agent_receives_sender_order(tmp_path):
+    """Test an ordered agent receives each sender's messages in order despite shuffled routing"""
+    comm_agent = CommunicationAgent(config={
+        "use_jetstream": False,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "reorder_gap_timeout": 0.05
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("ordered", ordered=True)
+    
+    messages = [{"from": sender, "to": "ordered", "n": n} for n in range(20) for sender in ("a", "b")]
+    for message in messages:
+        comm_agent.sequencer.stamp(message)
+    random.Random(7).shuffle(messages)
+    
+    statuses = [(await comm_agent._route_message(message))["status"] for message in messages]
+    assert "held" in statuses
+    
+    queue = comm_agent.message_broker["ordered"]
+    received = [queue.get_nowait() for _ in range(queue.qsize())]
+    for sender in ("a", "b"):
+        assert [m["n"] for m in received if m["from"] == sender] == list(range(20))
+    
+    # A lost message delays its successors only until the gap timeout
+    lost, late = {"message_id": "lost", "from": "a", "to": "ordered"}, {"from": "a", "to": "ordered"}
+    comm_agent.sequencer.stamp(lost)
+    comm_agent.sequencer.stamp(late)
+    assert (await comm_agent._route_message(late))["status"] == "held"
+    delivered = await asyncio.wait_for(queue.get(), timeout=1.0)
+    assert delivered is late
+    assert comm_agent.get_statistics()["reorder_buffer"]["gaps_skipped"] == 1
+    
+    # Retrying the lost message is pointless now: the DLQ counts it as late, not recovered
+    assert (await comm_agent._route_message(lost))["status"] == "late"
+    entry = comm_agent.dead_letters.schedule(lost, "Target agent not found: ordered")
+    await comm_agent.dead_letters._retry(entry)
+    stats = comm_agent.dead_letters.get_statistics()
+    assert (stats["late"], stats["recovered"], stats["pending_retries"]) == (1, 0, 0)
+    
+    await comm_agent.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_only_messages_to_ordered_agents_are_stamped(tmp_path):
+    """Test senders stamp sequence numbers only for agents registered as ordered"""
+    comm_agent = CommunicationAgent(config={
+        "use_jetstream": False,
+        "dlq_path": str(tmp_path / "dlq.jsonl"),
+        "ordered_agents": ["ordered"]
+    })
+    await comm_agent.initialize()
+    await comm_agent.register_agent("ordered")
+    await comm_agent.register_agent("plain")
+    
+    await comm_agent.process_message({"from": "a", "to": "ordered", "payload": {}})
+    await comm_agent.process_message({"from": "a", "to": "plain", "payload": {}})
+    assert comm_agent.message_broker["ordered"].get_nowait()["sequence"] == 1
+    assert "sequence" not in comm_agent.message_broker["plain"].get_nowait()
+    assert len(comm_agent.sequencer._last) == 1
+    
+    await comm_agent.cleanup()
@@ -0,0 +1,106 @@
+"""
+Tests for the process pool used for CPU-bound analysis
+"""
+import pytest
+import asyncio
+import time
+
+from agent_code_generation import CodeGenerationAgent
+from code_analysis import collapse_blank_lines, scan_code
+from process_pool import ProcessPool, TaskTimeout
+
+
+def spin(seconds):
+    """Keep a CPU busy"""
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        count += 1
+    return count
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_during_cpu_bound_task():
+    """Test the loop keeps running other coroutines while a worker is busy"""
+    pool = ProcessPool(max_workers=1)
+    ticks = 0
+    
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+    
+    ticking = asyncio.create_task(ticker())
+    assert await pool.run(spin, 0.3) > 0
+    ticking.cancel()
+    assert ticks >= 5
+    
+    stats = pool.get_statistics()
+    assert (stats["submitted"], stats["completed"], stats["queue_depth"], stats["running"]) == (1, 1, 0, 0)
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_restarts_workers():
+    """Test a runaway task times out and later tasks get fresh workers"""
+    pool = ProcessPool(max_workers=1, timeout=0.2)
+    with pytest.raises(TaskTimeout):
+        await pool.run(time.sleep, 30)
+    assert await pool.run(sum, [1, 2, 3]) == 6
+    
+    stats = pool.get_statistics()
+    assert (stats["timeouts"], stats["restarts"], stats["completed"]) == (1, 1, 1)
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_task_never_starts():
+    """Test tasks queue behind busy workers and can be cancelled before they start"""
+    pool = ProcessPool(max_workers=1)
+    running = asyncio.create_task(pool.run(spin, 0.2))
+    queued = asyncio.create_task(pool.run(spin, 0.2))
+    await asyncio.sleep(0.05)
+    assert pool.get_statistics()["queue_depth"] == 1
+    
+    queued.cancel()
+    await running
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    
+    stats = pool.get_statistics()
+    assert (stats["completed"], stats["cancelled"], stats["peak_queue_depth"]) == (1, 1, 1)
+    pool.shutdown()
+
+
+
+@pytest.mark.asyncio
+async def test_cancelled_running_task_keeps_its_slot():
+    """Test the next task waits for the worker of a cancelled task before its timeout starts"""
+    pool = ProcessPool(max_workers=1)
+    await pool.run(sum, [1])  # start the worker
+    running = asyncio.create_task(pool.run(spin, 0.4))
+    await asyncio.sleep(0.1)
+    running.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+    assert pool.get_statistics()["running"] == 1
+    
+    assert await pool.run(sum, [1, 2, 3], timeout=0.2) == 6
+    stats = pool.get_statistics()
+    assert (stats["timeouts"], stats["restarts"], stats["running"]) == (0, 0, 0)
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_agent_offloads_large_inputs_only():
+    """Test analysis and refactoring of large code run in the pool and small code inline"""
+    agent = CodeGenerationAgent("test_code_gen", {"offload_threshold": 1000, "process_pool_workers": 1})
+    code = "x = 1\n\n\n" * 500
+    small = await agent.analyze_code("python", "x = 1\n", {})
+    large = await agent.analyze_code("python", code, {})
+    refactored = await agent.refactor_code("python", code, {})
+    assert small["status"] == large["status"] == refactored["status"] == "success"
+    assert large["analysis"]["metrics"] == scan_code(code, "python")["metrics"]
+    assert refactored["refactored_code"] == collapse_blank_lines(code)
+    assert agent.get_statistics()["process_pool"]["completed"] == 2
+    await agent.cleanup()
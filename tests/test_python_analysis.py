@@ -0,0 +1,78 @@
+"""
+Tests for AST-based Python analysis
+"""
+import pytest
+
+from agent_code_generation import CodeGenerationAgent
+from python_analysis import analyze_python
+
+
+SOURCE = '''
+import os
+from . import sibling
+from .models import User
+
+class Service:
+    def handle(self, request, *args, retries=3, **kwargs):
+        """Handle a request"""
+        if request.valid and request.user or request.admin:
+            for item in request.items:
+                while item.pending:
+                    try:
+                        item.process()
+                    except ValueError:
+                        pass
+        elif request.retry:
+            return [x for x in request.items if x.ok]
+        else:
+            return None
+
+        def helper():
+            return 1 if os.sep else 2
+'''
+
+
+def test_per_function_complexity_nesting_and_size():
+    """Test each function gets its own metrics and elif does not deepen nesting"""
+    structure = analyze_python(SOURCE)
+    functions = {function["name"]: function for function in structure["functions"]}
+    handle = functions["Service.handle"]
+    # if, and/or, for, while, except, elif, comprehension with one condition
+    assert handle["complexity"] == 1 + 1 + 2 + 1 + 1 + 1 + 1 + 2
+    assert handle["nesting"] == 4
+    assert (handle["line"], handle["lines"], handle["parameters"], handle["docstring"]) == (7, 16, 5, True)
+    
+    helper = functions["Service.handle.helper"]
+    assert (helper["complexity"], helper["nesting"], helper["docstring"]) == (2, 0, False)
+    
+    assert structure["classes"] == 1
+    assert structure["imports"] == [".", ".models", "os"]
+    assert (structure["max_complexity"], structure["max_nesting"], structure["documented_ratio"]) == (10, 4, 0.5)
+    assert structure["issues"] == []
+
+
+def test_thresholds_and_syntax_errors_become_issues():
+    """Test overly complex functions and unparsable code are reported"""
+    branches = "".join(f"    if x == {i}:\n        return {i}\n" for i in range(25))
+    issues = analyze_python(f"def dispatch(x):\n{branches}")["issues"]
+    assert [(issue["type"], issue["severity"]) for issue in issues] == [("complexity", "high"), ("maintainability", "low")]
+    
+    broken = analyze_python("def f(:\n    pass\n")
+    assert broken["syntax_error"]["line"] == 1
+    assert broken["issues"][0]["type"] == "syntax"
+
+
+@pytest.mark.asyncio
+async def test_agent_scores_structure_and_caches_by_content():
+    """Test the quality score reflects complexity and identical code is analyzed once"""
+    agent = CodeGenerationAgent("test_code_gen")
+    simple = await agent.analyze_code("python", 'def f():\n    """Doc"""\n    return 1\n', {})
+    complex_ = await agent.analyze_code("python", SOURCE, {})
+    assert simple["analysis"]["quality_score"] == 100.0
+    assert complex_["analysis"]["quality_score"] == 91.0
+    assert complex_["analysis"]["structure"]["functions"][0]["name"] == "Service.handle"
+    
+    again = await agent.analyze_code("python", SOURCE, {})
+    assert again["analysis"] == complex_["analysis"]
+    stats = agent.get_statistics()["analysis_cache"]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
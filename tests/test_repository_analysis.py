@@ -0,0 +1,104 @@
+"""
+Tests for repository-scale analysis
+"""
+import pytest
+import zipfile
+
+from agent_code_generation import CodeGenerationAgent
+from process_pool import ProcessPool
+from repository_analysis import RepositoryAnalysisJob
+
+
+def _make_repository(root):
+    (root / "pkg").mkdir(parents=True)
+    (root / "node_modules" / "lib").mkdir(parents=True)
+    (root / "pkg" / "service.py").write_text(
+        "import os\nimport json\n\ndef run(x):\n    return eval(x)\n"
+    )
+    (root / "pkg" / "util.py").write_text("import os\n\ndef helper():\n    \"\"\"Help\"\"\"\n    return 1\n")
+    (root / "app.js").write_text("var a = 1;\n// comment\n" + "x" * 130 + "\n")
+    (root / "README.md").write_text("# not a source file\n")
+    (root / "blob.py").write_bytes(b"\x00\x01binary")
+    (root / "node_modules" / "lib" / "index.js").write_text("var vendored = 1;\n")
+
+
+@pytest.mark.asyncio
+async def test_directory_report_and_progress(tmp_path):
+    """Test sources are found, vendored and binary files left out and results aggregated"""
+    _make_repository(tmp_path)
+    job = RepositoryAnalysisJob(str(tmp_path), chunk_size=2)
+    events = [event async for event in job.events()]
+    
+    progress = [event["data"] for event in events if event["event"] == "analysis:progress"]
+    assert [data["files_processed"] for data in progress] == [2, 4]
+    assert progress[-1]["files_total"] == 4
+    assert events[-1]["event"] == "analysis:completed"
+    
+    report = events[-1]["data"]
+    assert (report["files"], report["failed"], report["skipped"]) == (3, 0, 1)
+    assert report["languages"] == {"javascript": {"files": 1, "lines_of_code": 4}, "python": {"files": 2, "lines_of_code": 12}}
+    assert report["issues"]["by_severity"] == {"low": 2, "high": 1}
+    assert report["high_severity_issues"][0]["path"].endswith("service.py")
+    assert report["worst_files"][0]["path"].endswith("service.py")
+    assert report["most_imported"][0] == {"module": "os", "files": 2}
+    assert report["most_complex_functions"][0]["name"] in ("run", "helper")
+
+
+@pytest.mark.asyncio
+async def test_zip_archive_in_worker_processes(tmp_path):
+    """Test an archive analyzed by worker processes gives the same report as inline analysis"""
+    _make_repository(tmp_path / "repo")
+    archive = tmp_path / "repo.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for path in sorted((tmp_path / "repo").rglob("*")):
+            if path.is_file():
+                zf.write(path, path.relative_to(tmp_path / "repo").as_posix())
+    
+    pool = ProcessPool(max_workers=2)
+    pooled = await RepositoryAnalysisJob(str(archive), pool=pool, chunk_size=1).run()
+    inline = await RepositoryAnalysisJob(str(archive)).run()
+    pool.shutdown()
+    for report in (pooled, inline):
+        report.pop("elapsed_seconds")
+    assert pooled == inline
+    assert pooled["files"] == 3
+    assert pool.get_statistics()["completed"] == 4
+
+
+@pytest.mark.asyncio
+async def test_symlinks_out_of_the_source_are_skipped(tmp_path):
+    """Test files reached through symlinks are only read when they stay inside the source"""
+    (tmp_path / "outside.py").write_text("secret = eval('1')\n")
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "real.py").write_text("x = 1\n")
+    (repo / "escape.py").symlink_to(tmp_path / "outside.py")
+    (repo / "alias.py").symlink_to(repo / "real.py")
+    
+    report = await RepositoryAnalysisJob(str(repo)).run()
+    assert (report["files"], report["skipped"]) == (2, 1)
+    assert report["issues"]["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_replaced_archive_is_read_again(tmp_path):
+    """Test archives are not kept open between runs, so a replaced archive is analyzed afresh"""
+    archive = tmp_path / "repo.zip"
+    for source in ("x = 1\n", "x = eval('1')\n"):
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("module.py", source)
+        report = await RepositoryAnalysisJob(str(archive)).run()
+    assert report["issues"]["by_severity"] == {"high": 1}
+
+
+@pytest.mark.asyncio
+async def test_agent_analyze_repository_message(tmp_path):
+    """Test the agent reports on a repository and rejects missing sources"""
+    _make_repository(tmp_path)
+    agent = CodeGenerationAgent("test_code_gen", {"process_pool": False})
+    response = await agent.process_message({"type": "analyze_repository", "path": str(tmp_path)})
+    assert response["status"] == "success"
+    assert response["report"]["files"] == 3
+    
+    missing = await agent.process_message({"type": "analyze_repository", "path": str(tmp_path / "missing")})
+    assert missing["status"] == "error"
@@ -0,0 +1,43 @@
+"""
+Tests for the shared serialization codec registry
+"""
+import pytest
+import json
+
+import serialization
+
+
+def test_json_roundtrip_matches_stdlib():
+    """Test the default JSON codec produces standard JSON"""
+    payload = {"message_id": "msg_1", "payload": {"code": "def f():\n    return 1\n", "n": [1, 2.5, None, True]}}
+    
+    text = serialization.dumps(payload)
+    assert isinstance(text, str)
+    assert json.loads(text) == payload
+    assert serialization.loads(text) == payload
+    assert serialization.loads(serialization.dumpb(payload)) == payload
+    assert json.loads(serialization.dumps(payload, indent=True)) == payload
+
+
+def test_json_codec_falls_back_for_unsupported_values():
+    """Test values the fast codec refuses still serialize"""
+    payload = {"big": 2 ** 80, 1: "non-string key"}
+    assert json.loads(serialization.dumps(payload)) == {"big": 2 ** 80, "1": "non-string key"}
+
+
+def test_codec_lookup():
+    """Test codec lookup by name and content type"""
+    assert serialization.get_codec() is serialization.json_codec
+    assert serialization.get_codec("json-stdlib").name == "json-stdlib"
+    # Unknown (or uninstalled) codecs fall back to JSON
+    assert serialization.get_codec("does-not-exist") is serialization.json_codec
+    assert serialization.get_codec_for_content_type(None) is serialization.json_codec
+    with pytest.raises(ValueError):
+        serialization.get_codec_for_content_type("application/x-unknown")
+    
+    for codec in serialization.available_codecs().values():
+        assert codec.decode(codec.encode({"a": [1, "b"]})) == {"a": [1, "b"]}
+    
+    # Codecs must implement both directions
+    with pytest.raises(TypeError):
+        serialization.Codec()
@@ -0,0 +1,119 @@
+"""
+Tests for the consistent-hash ring and the sharded broker
+"""
+import pytest
+import asyncio
+from collections import Counter
+
+from agent_communication import CommunicationAgent
+from sharding import HashRing, ShardedBroker, ShardProcess
+
+
+def test_hash_ring_balance_and_minimal_remapping():
+    """Test keys spread evenly and only about 1/N of them move when a node joins"""
+    keys = [f"agent_{i}" for i in range(4000)]
+    ring = HashRing(["s0", "s1", "s2", "s3"])
+    before = {key: ring.get_node(key) for key in keys}
+    
+    counts = Counter(before.values())
+    assert min(counts.values()) > 0.15 * len(keys)
+    
+    ring.add_node("s4")
+    after = {key: ring.get_node(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert 0.1 * len(keys) < len(moved) < 0.3 * len(keys)
+    # Keys only ever move to the new node
+    assert all(after[key] == "s4" for key in moved)
+    
+    ring.remove_node("s4")
+    assert {key: ring.get_node(key) for key in keys} == before
+
+
+def test_hash_ring_caches_lookups():
+    """Test repeated lookups hit the cache and ring changes invalidate it"""
+    ring = HashRing(["a", "b"])
+    ring.get_node("agent_1")
+    ring.get_node("agent_1")
+    assert ring.stats["cache_hits"] == 1
+    
+    ring.add_node("c")
+    ring.get_node("agent_1")
+    assert ring.stats["cache_hits"] == 1
+    
+    with pytest.raises(ValueError):
+        HashRing().get_node("agent_1")
+
+
+@pytest.mark.asyncio
+async def test_sharded_broker_routes_and_rebalances(tmp_path):
+    """Test messages reach agents on their owning shard and follow them when shards change"""
+    async def make_shard(name):
+        shard = CommunicationAgent(name, {"use_jetstream": False, "dlq_path": str(tmp_path / f"{name}.jsonl")})
+        await shard.initialize()
+        return shard
+    
+    broker = ShardedBroker({name: await make_shard(name) for name in ("shard_0", "shard_1")})
+    agent_ids = [f"agent_{i}" for i in range(40)]
+    for agent_id in agent_ids:
+        await broker.register_agent(agent_id, agent_type="Worker")
+    
+    for agent_id in agent_ids:
+        result = await broker.process_message({"from": "client", "to": agent_id, "payload": {"n": 1}})
+        assert result["status"] == "delivered"
+    assert all(len(shard.agent.message_broker) < len(agent_ids) for shard in broker.shards.values())
+    
+    result = await broker.process_message({"from": "client", "to_type": "Worker", "payload": {}})
+    assert result["status"] == "delivered"
+    result = await broker.process_message({"from": "client", "payload": {}})
+    assert result["recipients"] == len(agent_ids)
+    
+    moved = await broker.add_shard("shard_2", await make_shard("shard_2"))
+    assert 0 < moved < len(agent_ids)
+    moved_back = await broker.remove_shard("shard_0")
+    assert moved_back > 0
+    
+    # Queued messages moved with their agents
+    assert sum([await broker.queue_size(agent_id) for agent_id in agent_ids]) == 2 * len(agent_ids) + 1
+    assert all(broker.shard_for(agent_id).agent.agent_types[agent_id] == "Worker" for agent_id in agent_ids)
+    
+    await broker.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_sharded_broker_over_shard_processes():
+    """Test routing, receiving and rebalancing when every shard runs in its own process"""
+    def make_shard(name):
+        return ShardProcess(name, {"use_jetstream": False})
+    
+    broker = ShardedBroker({name: make_shard(name) for name in ("shard_0", "shard_1")})
+    await broker.start()
+    try:
+        agent_ids = [f"agent_{i}" for i in range(20)]
+        for agent_id in agent_ids:
+            await broker.register_agent(agent_id, agent_type="Worker")
+        
+        # Concurrent calls to a shard share pipe writes
+        results = await asyncio.gather(*(
+            broker.process_message({"from": "client", "to": agent_id, "payload": {"n": n}})
+            for n in range(5) for agent_id in agent_ids
+        ))
+        assert all(result["status"] == "delivered" for result in results)
+        stats = await broker.get_statistics()
+        assert sum(shard["registered_agents"] for shard in stats["shards"].values()) == len(agent_ids)
+        assert all(shard["batches"] < shard["calls"] for shard in stats["shards"].values())
+        
+        result = await broker.process_message({"from": "client", "to_type": "Worker", "payload": {}})
+        assert result["status"] == "delivered"
+        
+        moved = await broker.add_shard("shard_2", make_shard("shard_2"))
+        assert 0 < moved < len(agent_ids)
+        # Messages queued before the move arrive in order on the new shard
+        moved_id = next(agent_id for agent_id in agent_ids if broker.ring.get_node(agent_id) == "shard_2")
+        messages = await broker.receive(moved_id)
+        assert [message["payload"].get("n") for message in messages][:5] == list(range(5))
+        assert sum([await broker.queue_size(agent_id) for agent_id in agent_ids]) == 5 * len(agent_ids) + 1 - len(messages)
+        # Errors raised in a shard process reach the caller unchanged
+        with pytest.raises(KeyError):
+            await broker.receive("unknown_agent")
+    finally:
+        await broker.cleanup()
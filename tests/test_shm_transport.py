@@ -0,0 +1,158 @@
+"""
+Tests for the shared memory ring buffer transport
+"""
+import pytest
+import asyncio
+import multiprocessing
+import uuid
+
+from agent_communication import CommunicationAgent
+from shm_transport import SharedMemoryRing, SharedMemoryTransport
+
+
+def _produce(name: str, count: int) -> None:
+    ring = SharedMemoryRing(name, capacity=256)
+    sent = 0
+    while sent < count:
+        if ring.write(f"message {sent}".encode()):
+            sent += 1
+    ring.close()
+
+
+def test_ring_wraps_and_rejects_when_full():
+    """Test records wrap around the end of the ring and a full ring refuses writes"""
+    ring = SharedMemoryRing(f"test_{uuid.uuid4().hex[:8]}", capacity=64)
+    try:
+        for i in range(10):
+            assert ring.write(b"x" * 20 + bytes([i]))
+            view = ring.read()
+            assert bytes(view) == b"x" * 20 + bytes([i])
+            view.release()
+            ring.release()
+        assert ring.read() is None
+        
+        assert ring.write(b"a" * 28)
+        assert not ring.write(b"b" * 40)
+        assert ring.depth() == 32
+    finally:
+        ring.close(unlink=True)
+
+
+
+def test_attached_ring_uses_the_creator_capacity():
+    """Test the attaching side reads the data area size from the segment header"""
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    ring = SharedMemoryRing(name, capacity=64)
+    peer = SharedMemoryRing(name, capacity=4096)
+    try:
+        assert peer.capacity == 64
+        assert peer.write(b"x" * 28)
+        assert not peer.write(b"y" * 40)
+        view = ring.read()
+        assert bytes(view) == b"x" * 28
+        view.release()
+        ring.release()
+    finally:
+        peer.close()
+        ring.close(unlink=True)
+
+
+def test_ring_rejects_unaligned_capacity_and_detects_removal():
+    """Test capacities must keep records 8-byte aligned and a removed ring turns stale"""
+    with pytest.raises(ValueError):
+        SharedMemoryRing(f"test_{uuid.uuid4().hex[:8]}", capacity=100)
+    
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    ring = SharedMemoryRing(name, capacity=64)
+    peer = SharedMemoryRing(name, capacity=64)
+    assert peer.epoch == ring.epoch and not peer.stale
+    ring.close(unlink=True)
+    assert peer.stale
+    assert not peer.write(b"lost")
+    peer.close()
+
+def test_ring_between_processes():
+    """Test a producer process and a consumer process exchange records in order"""
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    ring = SharedMemoryRing(name, capacity=256)
+    producer = multiprocessing.get_context("fork").Process(target=_produce, args=(name, 200))
+    producer.start()
+    
+    received = []
+    while len(received) < 200:
+        view = ring.read()
+        if view is not None:
+            received.append(bytes(view).decode())
+            view.release()
+            ring.release()
+    producer.join(timeout=5)
+    ring.close(unlink=True)
+    
+    assert received == [f"message {i}" for i in range(200)]
+
+
+@pytest.mark.asyncio
+async def test_communication_agents_exchange_over_shared_memory(tmp_path):
+    """Test agents hosted by different communication agents talk over shared memory"""
+    namespace = uuid.uuid4().hex[:8]
+    hosts = {"coder": f"{namespace}a", "reviewer": f"{namespace}b"}
+    
+    def make_agent(process_name):
+        return CommunicationAgent(process_name, {
+            "use_jetstream": False,
+            "transport": "shm",
+            "shm_process_name": process_name,
+            "shm_agent_hosts": hosts,
+            "shm_ring_capacity": 4096,
+            "dlq_path": str(tmp_path / f"{process_name}.jsonl")
+        })
+    
+    host_a, host_b = make_agent(hosts["coder"]), make_agent(hosts["reviewer"])
+    await host_a.initialize()
+    await host_b.initialize()
+    await host_b.register_agent("reviewer")
+    
+    result = await host_a.process_message({"from": "coder", "to": "reviewer", "payload": {"diff": "+1"}})
+    assert result["status"] == "sent"
+    assert result["transport"] == "shm"
+    
+    delivered = await asyncio.wait_for(host_b.message_broker["reviewer"].get(), timeout=1.0)
+    assert delivered["payload"] == {"diff": "+1"}
+    assert host_b.get_statistics()["shm_transport"]["received"] == 1
+    
+    await host_a.cleanup()
+    await host_b.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_sender_reattaches_after_the_peer_restarts():
+    """Test messages reach a restarted peer instead of its removed ring"""
+    namespace = uuid.uuid4().hex[:8]
+    hosts = {"client": "a", "worker": "b"}
+    received = []
+    
+    async def deliver(message):
+        received.append(message["n"])
+    
+    async def wait_for(count):
+        for _ in range(100):
+            if len(received) >= count:
+                return
+            await asyncio.sleep(0.01)
+    
+    sender = SharedMemoryTransport("a", hosts, deliver, capacity=256, namespace=namespace)
+    receiver = SharedMemoryTransport("b", hosts, deliver, capacity=256, namespace=namespace)
+    receiver.start()
+    assert sender.send({"to": "worker", "n": 1})
+    await wait_for(1)
+    
+    await receiver.close()
+    restarted = SharedMemoryTransport("b", hosts, deliver, capacity=256, namespace=namespace)
+    restarted.start()
+    assert sender.send({"to": "worker", "n": 2})
+    await wait_for(2)
+    
+    assert received == [1, 2]
+    assert sender.stats["reattached"] == 1
+    await sender.close()
+    await restarted.close()
@@ -0,0 +1,97 @@
+"""
+Tests for communication traffic statistics
+"""
+import pytest
+
+from agent_communication import CommunicationAgent
+import traffic_stats
+from traffic_stats import CountMinSketch, LatencyHistogram, SlidingWindowCounter, TrafficStats
+
+
+def test_sliding_window_counter_expires_old_buckets():
+    """Test only events inside the window count towards the rate"""
+    counter = SlidingWindowCounter(window=10)
+    counter.add(5, now=100.0)
+    counter.add(5, now=105.5)
+    assert counter.count(now=106.0) == 10
+    # Seven seconds into the window, the rate covers those seconds only
+    assert counter.rate(now=106.0) == pytest.approx(10 / 7)
+    assert counter.rate(now=109.0) == 1.0
+    assert counter.count(now=112.0) == 5
+    assert counter.count(now=200.0) == 0
+    assert counter.total == 10
+    assert counter.idle(now=115.0) and not counter.idle(now=114.0)
+
+
+def test_traffic_stats_drop_idle_targets(monkeypatch):
+    """Test targets without traffic for a whole window lose their rate counter"""
+    clock = [1000.0]
+    monkeypatch.setattr(traffic_stats.time, "monotonic", lambda: clock[0])
+    stats = TrafficStats(window=10)
+    stats.record({"from": "a", "to": "old"}, "delivered", 0.001)
+    clock[0] += 1
+    assert stats.snapshot()["rate_per_target"] == {"old": 0.5}
+    
+    clock[0] += 20
+    stats.record({"from": "a", "to": "new"}, "delivered", 0.001)
+    snapshot = stats.snapshot()
+    assert snapshot["rate_per_target"] == {"new": 0.1}
+    assert list(stats.rates) == ["new"]
+
+
+def test_latency_histogram_quantiles():
+    """Test quantiles are within the bucket resolution"""
+    histogram = LatencyHistogram(window=60)
+    for i in range(1, 1001):
+        histogram.record(i / 1e6, now=0.0)
+    
+    assert 450e-6 < histogram.quantile(0.5) < 560e-6
+    assert 950e-6 < histogram.quantile(0.99) < 1100e-6
+    
+    assert histogram.window_max() == histogram.max == 1000 / 1e6
+    
+    # Two windows later the old samples are gone
+    histogram.record(0.5, now=130.0)
+    assert histogram.quantile(0.5) > 0.4
+    histogram.record(0.001, now=200.0)
+    histogram.record(0.001, now=260.0)
+    assert histogram.window_max() == 0.001
+    assert histogram.max == 0.5
+
+
+def test_count_min_sketch_finds_top_talkers():
+    """Test heavy senders are reported with estimates that never undercount"""
+    sketch = CountMinSketch(width=256, depth=4, top_k=3)
+    for i in range(2000):
+        sketch.add(f"noise_{i}")
+    for _ in range(500):
+        sketch.add("chatty")
+    for _ in range(300):
+        sketch.add("busy")
+    
+    top = dict(sketch.top())
+    assert list(top)[:2] == ["chatty", "busy"]
+    assert top["chatty"] >= 500
+    assert top["busy"] >= 300
+
+
+@pytest.mark.asyncio
+async def test_communication_agent_traffic_statistics(tmp_path):
+    """Test routed messages show up in rates, latency, queue depth and top talkers"""
+    comm_agent = CommunicationAgent(config={"use_jetstream": False, "dlq_path": str(tmp_path / "dlq.jsonl")})
+    await comm_agent.initialize()
+    await comm_agent.register_agent("worker")
+    
+    for i in range(30):
+        await comm_agent.process_message({"from": "planner" if i % 3 else "monitor", "to": "worker", "payload": {}})
+    
+    stats = comm_agent.get_statistics()
+    traffic = stats["traffic"]
+    assert traffic["counters"]["delivered"] == 30
+    # The agent started within the last second or two
+    assert traffic["rate_per_target"]["worker"] in (30.0, 15.0)
+    assert 0 < traffic["latency_ms"]["p50"] <= traffic["latency_ms"]["p99"]
+    assert traffic["top_talkers"][0] == ("planner", 20)
+    assert stats["queue_depth"] == {"worker": 30}
+    
+    await comm_agent.cleanup()
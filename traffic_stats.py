@@ -0,0 +1,266 @@
+"""
+Traffic Statistics - Constant-time counters, sliding-window rates, latency quantiles and top talkers
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import Counter
+import math
+import time
+
+
+class SlidingWindowCounter:
+    """
+    Event counter over the last `window` seconds.
+    
+    Events are counted in one-second buckets kept in a ring, so recording
+    is O(1) and the rate is the sum of at most `window` buckets. Until a
+    full window has passed since `started` (the first event by default),
+    the rate is taken over the seconds elapsed so far.
+    """
+    
+    def __init__(self, window: int = 60, started: Optional[float] = None):
+        self.window = window
+        self._buckets = [0] * window
+        self._seconds = [0] * window
+        self.started = None if started is None else int(started)
+        self.last: Optional[int] = None
+        self.total = 0
+    
+    def add(self, count: int = 1, now: Optional[float] = None) -> None:
+        """Record events"""
+        second = int(time.monotonic() if now is None else now)
+        if self.started is None:
+            self.started = second
+        self.last = second if self.last is None else max(self.last, second)
+        index = second % self.window
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._buckets[index] = 0
+        self._buckets[index] += count
+        self.total += count
+    
+    def count(self, now: Optional[float] = None) -> int:
+        """Events within the window"""
+        second = int(time.monotonic() if now is None else now)
+        return sum(
+            bucket for bucket, bucket_second in zip(self._buckets, self._seconds)
+            if second - self.window < bucket_second <= second
+        )
+    
+    def rate(self, now: Optional[float] = None) -> float:
+        """Events per second over the window (or the time since the start, if shorter)"""
+        if self.started is None:
+            return 0.0
+        second = int(time.monotonic() if now is None else now)
+        elapsed = max(1, min(self.window, second - self.started + 1))
+        return self.count(second) / elapsed
+    
+    def idle(self, now: Optional[float] = None) -> bool:
+        """Whether no event is left in the window"""
+        second = int(time.monotonic() if now is None else now)
+        return self.last is None or self.last <= second - self.window
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram over a sliding window.
+    
+    Every power of two from 1 us is split into 8 linear sub-buckets (at most
+    12.5% relative error), so recording is O(1) and quantiles read a fixed
+    number of buckets. Two histograms are rotated every `window` seconds;
+    quantiles and `window_max()` cover the current and previous one, while
+    `max` is the lifetime maximum.
+    """
+    
+    MIN_SECONDS = 1e-6
+    BUCKETS_PER_DOUBLING = 8
+    BUCKET_COUNT = 8 * 27  # up to ~134 s
+    
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._current = [0] * self.BUCKET_COUNT
+        self._previous = [0] * self.BUCKET_COUNT
+        self._current_max = 0.0
+        self._previous_max = 0.0
+        self._rotated_at: Optional[float] = None
+        self.count = 0
+        self.max = 0.0
+    
+    def record(self, seconds: float, now: Optional[float] = None) -> None:
+        """Record one latency"""
+        self.record_many([seconds], now)
+    
+    def record_many(self, samples: List[float], now: Optional[float] = None) -> None:
+        """Record a batch of latencies observed up to `now`"""
+        now = time.monotonic() if now is None else now
+        if self._rotated_at is None:
+            self._rotated_at = now
+        elif now - self._rotated_at >= self.window:
+            recent = now - self._rotated_at < 2 * self.window
+            self._previous = self._current if recent else [0] * self.BUCKET_COUNT
+            self._previous_max = self._current_max if recent else 0.0
+            self._current = [0] * self.BUCKET_COUNT
+            self._current_max = 0.0
+            self._rotated_at = now
+        
+        current, bucket = self._current, self._bucket
+        for seconds in samples:
+            current[bucket(seconds)] += 1
+        self.count += len(samples)
+        largest = max(samples, default=0.0)
+        self._current_max = max(self._current_max, largest)
+        self.max = max(self.max, largest)
+    
+    def window_max(self) -> float:
+        """Largest latency in the current and previous histogram in seconds"""
+        return max(self._current_max, self._previous_max)
+    
+    def quantile(self, q: float) -> float:
+        """Approximate latency at quantile q (0..1) in seconds"""
+        counts = [current + previous for current, previous in zip(self._current, self._previous)]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, bucket in enumerate(counts):
+            seen += bucket
+            if seen >= rank:
+                return self._upper_bound(index)
+        return self._upper_bound(len(counts) - 1)
+    
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.MIN_SECONDS:
+            return 0
+        # seconds / MIN_SECONDS = mantissa * 2^exponent with mantissa in [0.5, 1)
+        mantissa, exponent = math.frexp(seconds / self.MIN_SECONDS)
+        index = (exponent - 1) * self.BUCKETS_PER_DOUBLING + int((2 * mantissa - 1) * self.BUCKETS_PER_DOUBLING) + 1
+        return min(index, self.BUCKET_COUNT - 1)
+    
+    def _upper_bound(self, index: int) -> float:
+        if index == 0:
+            return self.MIN_SECONDS
+        exponent, step = divmod(index - 1, self.BUCKETS_PER_DOUBLING)
+        return self.MIN_SECONDS * 2 ** exponent * (1 + (step + 1) / self.BUCKETS_PER_DOUBLING)
+
+
+class CountMinSketch:
+    """
+    Count-min sketch with a small heavy-hitter table.
+    
+    Counts are over-estimated by at most e/width of the total with
+    probability 1 - e^-depth, in fixed memory whatever the number of keys.
+    """
+    
+    def __init__(self, width: int = 2048, depth: int = 4, top_k: int = 10):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self._rows = [[0] * width for _ in range(depth)]
+        self._top: Dict[str, int] = {}
+        self.total = 0
+    
+    def add(self, key: str, count: int = 1) -> int:
+        """
+        Count a key.
+        
+        Returns:
+            Estimated count of the key
+        """
+        # Double hashing: row i uses h1 + i * h2 (the sketch lives in one process,
+        # so the built-in hash is stable enough and much cheaper than a digest)
+        h1 = hash(key)
+        h2 = (h1 >> 32) | 1
+        estimate = None
+        for row, counts in enumerate(self._rows):
+            column = (h1 + row * h2) % self.width
+            counts[column] += count
+            value = counts[column]
+            estimate = value if estimate is None or value < estimate else estimate
+        self.total += count
+        
+        if key in self._top or len(self._top) < self.top_k:
+            self._top[key] = estimate
+        else:
+            smallest = min(self._top, key=self._top.get)
+            if estimate > self._top[smallest]:
+                del self._top[smallest]
+                self._top[key] = estimate
+        return estimate
+    
+    def top(self) -> List[Tuple[str, int]]:
+        """Heaviest keys with their estimated counts"""
+        return sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+
+
+class TrafficStats:
+    """
+    Routing statistics of a communication agent, cheap to record and to scrape.
+    
+    Recording only appends to a list. Every FOLD_BATCH messages (and on each
+    snapshot) the batch is folded into the counters, grouped by target, sender
+    and status first, so the structures are updated once per distinct key
+    rather than once per message. Rate counters of targets that saw no
+    traffic for a whole window are dropped, at most once per window.
+    """
+    
+    DEFAULT_WINDOW = 60  # seconds
+    FOLD_BATCH = 256
+    
+    def __init__(self, window: int = DEFAULT_WINDOW, top_k: int = 10):
+        self.window = window
+        self.counters: Dict[str, int] = {}
+        self.rates: Dict[str, SlidingWindowCounter] = {}
+        self._started = time.monotonic()
+        self._swept_at = self._started
+        self.latency = LatencyHistogram(window)
+        self.talkers = CountMinSketch(top_k=top_k)
+        self._pending: List[Tuple[Any, Any, str, float, float]] = []
+    
+    def record(self, message: Dict[str, Any], status: str, latency: float) -> None:
+        """Record one routed message"""
+        self._pending.append((
+            message.get("to") or message.get("to_type") or "broadcast",
+            message.get("from") or "unknown",
+            status,
+            latency,
+            time.monotonic()
+        ))
+        if len(self._pending) >= self.FOLD_BATCH:
+            self._fold()
+    
+    def _fold(self) -> None:
+        pending, self._pending = self._pending, []
+        for (target, second), count in Counter((entry[0], int(entry[4])) for entry in pending).items():
+            counter = self.rates.get(target)
+            if counter is None:
+                counter = self.rates[target] = SlidingWindowCounter(self.window, self._started)
+            counter.add(count, second)
+        now = time.monotonic()
+        if now - self._swept_at >= self.window:
+            self._swept_at = now
+            for target in [target for target, counter in self.rates.items() if counter.idle(now)]:
+                del self.rates[target]
+        for status, count in Counter(entry[2] for entry in pending).items():
+            self.counters[status] = self.counters.get(status, 0) + count
+        for sender, count in Counter(entry[1] for entry in pending).items():
+            self.talkers.add(str(sender), count)
+        if pending:
+            self.latency.record_many([entry[3] for entry in pending], pending[-1][4])
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Get current counters, rates, latency quantiles and top talkers"""
+        self._fold()
+        now = time.monotonic()
+        rates = {target: counter.rate(now) for target, counter in self.rates.items()}
+        return {
+            "window_seconds": self.window,
+            "counters": dict(self.counters),
+            "messages_per_second": round(sum(rates.values()), 3),
+            "rate_per_target": {target: round(rate, 3) for target, rate in rates.items()},
+            "latency_ms": {
+                "p50": round(1000 * self.latency.quantile(0.5), 4),
+                "p99": round(1000 * self.latency.quantile(0.99), 4),
+                "max": round(1000 * self.latency.window_max(), 4)
+            },
+            "top_talkers": self.talkers.top()
+        }